@@ -0,0 +1,175 @@
+# Agregação espacial das escolas em uma grade quadrada hierárquica (Web Mercator), por nível de zoom.
+# Cada célula tem o tamanho aproximado de CELULA_PX pixels na tela naquele zoom e guarda o número de
+# escolas, a velocidade média e o IDEB médio: o volume enviado ao navegador passa a depender da
+# resolução da tela, e não do tamanho da base. As células de um zoom são subdivisões exatas das do
+# zoom anterior (quadtree), então os níveis são coerentes entre si.
+import numpy as np  # Projeção e agregação vetorizadas.
+import pandas as pd  # Resultado tabular por célula.
+
+RAIO_TERRA = 6378137.0  # Metros (Web Mercator)
+CIRCUNFERENCIA = 2 * np.pi * RAIO_TERRA
+CELULA_PX = 64  # Lado da célula na tela, em pixels
+ZOOM_MIN = 9
+ZOOM_ESCOLAS = 15  # A partir deste zoom, as escolas são mostradas individualmente
+NIVEIS_ZOOM = list(range(ZOOM_MIN, ZOOM_ESCOLAS))
+
+
+def projetar_mercator(latitudes, longitudes):
+    """Coordenadas Web Mercator (metros) a partir de latitude/longitude em graus."""
+    lat = np.radians(np.clip(np.asarray(latitudes, dtype=float), -85.05112878, 85.05112878))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return RAIO_TERRA * lon, RAIO_TERRA * np.log(np.tan(np.pi / 4 + lat / 2))
+
+
+def tamanho_celula(zoom, celula_px=CELULA_PX):
+    """Lado da célula, em metros Web Mercator, no nível de zoom informado."""
+    return CIRCUNFERENCIA / (256 * 2 ** zoom) * celula_px
+
+
+class AgregadorEscolas:
+    """Agrega um conjunto de escolas em células por zoom. A projeção é feita uma única vez;
+       cada nível é calculado sob demanda e guardado."""
+
+    def __init__(self, escolas, celula_px=CELULA_PX):
+        escolas = escolas.dropna(subset=["LATITUDE", "LONGITUDE"])
+        self.celula_px = celula_px
+        self.latitudes = escolas["LATITUDE"].to_numpy(dtype=float)
+        self.longitudes = escolas["LONGITUDE"].to_numpy(dtype=float)
+        self.velocidades = escolas["Velocidade_Internet"].to_numpy(dtype=float)
+        self.idebs = escolas["IDEB"].to_numpy(dtype=float)
+        self._x, self._y = projetar_mercator(self.latitudes, self.longitudes)
+        self._niveis = {}
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def nivel(self, zoom):
+        """DataFrame com uma linha por célula ocupada: chave (ix, iy), centróide das escolas
+           (latitude/longitude), escolas, velocidade média e IDEB médio."""
+        if zoom not in self._niveis:
+            self._niveis[zoom] = self._agregar(zoom)
+        return self._niveis[zoom]
+
+    def _agregar(self, zoom):
+        colunas = ["ix", "iy", "latitude", "longitude", "escolas", "velocidade_media", "ideb_media"]
+        if len(self) == 0:
+            return pd.DataFrame(columns=colunas)
+        lado = tamanho_celula(zoom, self.celula_px)
+        ix = np.floor(self._x / lado).astype(np.int64)
+        iy = np.floor(self._y / lado).astype(np.int64)
+        # Chave inteira única por célula (bem mais rápido que np.unique sobre pares)
+        ix -= ix.min()
+        iy -= iy.min()
+        chaves, primeiro, inverso = np.unique(ix * (iy.max() + 1) + iy, return_index=True, return_inverse=True)
+        contagem = np.bincount(inverso, minlength=len(chaves))
+
+        def media(valores):
+            # Ignora valores ausentes (ex.: escolas sem IDEB); célula sem nenhum valor fica NaN
+            validos = ~np.isnan(valores)
+            soma = np.bincount(inverso, weights=np.where(validos, valores, 0.0), minlength=len(chaves))
+            quantidade = np.bincount(inverso, weights=validos, minlength=len(chaves))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return soma / quantidade
+
+        return pd.DataFrame({
+            "ix": np.floor(self._x[primeiro] / lado).astype(np.int64),
+            "iy": np.floor(self._y[primeiro] / lado).astype(np.int64),
+            "latitude": media(self.latitudes),
+            "longitude": media(self.longitudes),
+            "escolas": contagem,
+            "velocidade_media": media(self.velocidades),
+            "ideb_media": media(self.idebs),
+        }, columns=colunas)
+
+    def niveis(self, zooms=NIVEIS_ZOOM):
+        """{zoom: células} para os níveis informados."""
+        return {zoom: self.nivel(zoom) for zoom in zooms}
+
+
+# ================== Consultas por área visível ==================
+def limites_visao(centro, zoom, largura_px=700, altura_px=600):
+    """(sul, oeste, norte, leste) aproximados da área exibida por um mapa com esse centro e zoom."""
+    x, y = projetar_mercator([centro[0]], [centro[1]])
+    metros_px = CIRCUNFERENCIA / (256 * 2 ** zoom)
+    meia_largura, meia_altura = largura_px / 2 * metros_px, altura_px / 2 * metros_px
+    oeste, leste = np.degrees((x[0] + np.array([-meia_largura, meia_largura])) / RAIO_TERRA)
+    sul, norte = np.degrees(2 * np.arctan(np.exp((y[0] + np.array([-meia_altura, meia_altura])) / RAIO_TERRA)) - np.pi / 2)
+    return float(sul), float(oeste), float(norte), float(leste)
+
+
+def enquadrar(latitudes, longitudes, largura_px=700, altura_px=600, zoom_max=16):
+    """Centro e zoom (inteiro) que mostram todos os pontos informados, ou None se não houver pontos."""
+    latitudes, longitudes = np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float)
+    if latitudes.size == 0:
+        return None
+    x, y = projetar_mercator(latitudes, longitudes)
+    extensao = max((x.max() - x.min()) / largura_px, (y.max() - y.min()) / altura_px, 1e-9)  # Metros por pixel
+    zoom = int(np.clip(np.floor(np.log2(CIRCUNFERENCIA / (256 * extensao))), 0, zoom_max))
+    centro = (float(latitudes.min() + latitudes.max()) / 2, float(longitudes.min() + longitudes.max()) / 2)
+    return centro, zoom
+
+
+def expandir(limites, fracao=0.25):
+    """Limites aumentados em `fracao` de cada lado (evita buracos na borda durante o arraste)."""
+    sul, oeste, norte, leste = limites
+    dlat, dlon = (norte - sul) * fracao, (leste - oeste) * fracao
+    return sul - dlat, oeste - dlon, norte + dlat, leste + dlon
+
+
+def alinhar_limites(limites, zoom):
+    """Limites arredondados para fora até a grade de tiles do zoom: pequenos arrastes caem nos
+       mesmos limites (e na mesma entrada dos caches por área)."""
+    passo = 360 / 2 ** zoom  # Lado de um tile em graus de longitude (também usado na latitude)
+    sul, oeste, norte, leste = limites
+    return (float(np.floor(sul / passo) * passo), float(np.floor(oeste / passo) * passo),
+            float(np.ceil(norte / passo) * passo), float(np.ceil(leste / passo) * passo))
+
+
+class IndiceEspacial:
+    """Índice em grade regular (graus) sobre LATITUDE/LONGITUDE, montado uma vez por snapshot.
+       Os pontos ficam ordenados pela chave da célula; cada coluna de células dentro de um
+       retângulo é uma faixa contígua do vetor ordenado, localizada por busca binária."""
+
+    def __init__(self, escolas, celula_graus=0.01):
+        self.celula = celula_graus
+        latitudes = escolas["LATITUDE"].to_numpy(dtype=float)
+        longitudes = escolas["LONGITUDE"].to_numpy(dtype=float)
+        validos = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        self.tamanho = len(escolas)
+        self._lat0 = latitudes[validos].min() if validos.size else 0.0
+        self._lon0 = longitudes[validos].min() if validos.size else 0.0
+        iy = self._linha(latitudes[validos])
+        ix = self._coluna(longitudes[validos])
+        self._linhas = int(iy.max()) + 1 if validos.size else 1
+        self._colunas = int(ix.max()) + 1 if validos.size else 1
+        chaves = ix * self._linhas + iy
+        ordem = np.argsort(chaves, kind="stable")
+        self._chaves = chaves[ordem]
+        self._posicoes = validos[ordem]            # Posições (iloc) no DataFrame original
+        self._latitudes = latitudes[self._posicoes]
+        self._longitudes = longitudes[self._posicoes]
+
+    def _linha(self, latitudes):
+        return np.floor((latitudes - self._lat0) / self.celula).astype(np.int64)
+
+    def _coluna(self, longitudes):
+        return np.floor((longitudes - self._lon0) / self.celula).astype(np.int64)
+
+    def consultar(self, limites, mascara=None):
+        """Posições (iloc, em ordem crescente) dos pontos dentro de (sul, oeste, norte, leste).
+           `mascara` (booleana, alinhada ao DataFrame) restringe o resultado, ex.: aos filtros aplicados."""
+        sul, oeste, norte, leste = limites
+        y0, y1 = np.clip(self._linha(np.array([sul, norte])), 0, self._linhas - 1)
+        x0, x1 = np.clip(self._coluna(np.array([oeste, leste])), 0, self._colunas - 1)
+        colunas = np.arange(x0, x1 + 1, dtype=np.int64)
+        inicios = np.searchsorted(self._chaves, colunas * self._linhas + y0, side="left")
+        fins = np.searchsorted(self._chaves, colunas * self._linhas + y1, side="right")
+        if not len(colunas) or not (fins > inicios).any():
+            return np.empty(0, dtype=np.int64)
+        candidatos = np.concatenate([np.arange(i, f) for i, f in zip(inicios, fins) if f > i])
+        lat, lon = self._latitudes[candidatos], self._longitudes[candidatos]
+        dentro = (lat >= sul) & (lat <= norte) & (lon >= oeste) & (lon <= leste)
+        posicoes = self._posicoes[candidatos[dentro]]
+        if mascara is not None:
+            posicoes = posicoes[np.asarray(mascara, dtype=bool)[posicoes]]
+        return np.sort(posicoes)
@@ -0,0 +1,167 @@
+# Base de perguntas e respostas do FAQ compartilhada entre todas as sessões.
+# As colunas de texto ficam em um arquivo Arrow IPC mapeado em memória (somente leitura),
+# de modo que cada nova sessão do Streamlit não duplica o FAQ inteiro. Os embeddings
+# ficam em uma matriz float32 contígua (.npy) ao lado do índice FAISS.
+#
+# Uso (gera os artefatos binários a partir dos arquivos originais):
+#     python base_faq.py
+import argparse  # Interface de linha de comando do conversor.
+import json  # Leitura do arquivo legado de embeddings.
+import os  # Manipulação de caminhos e troca atômica de arquivos.
+import tempfile  # Arquivo temporário da conversão.
+
+import numpy as np  # Matriz de embeddings.
+import pyarrow as pa  # Formato colunar Arrow.
+import pyarrow.compute as pc  # Operações vetorizadas sobre colunas Arrow.
+import pyarrow.parquet as pq  # Leitura de arquivos Parquet.
+
+CAMINHO_FAQ_PARQUET = "data/faq_data.parquet"  # Caminho relativo
+CAMINHO_FAQ_ARROW = "data/cache/faq_data.arrow"  # Caminho relativo
+CAMINHO_EMBEDDINGS_JSON = "data/faq_embeddings.json"  # Caminho relativo (formato legado)
+CAMINHO_EMBEDDINGS_NPY = "data/faq_embeddings.npy"  # Ao lado de data/faq_index.faiss
+
+# Colunas de texto mantidas na base compartilhada (os embeddings ficam no índice FAISS)
+COLUNAS_TEXTO = ["pergunta", "resposta"]
+
+
+# ================== Conversão ==================
+def escrever_atomico(caminho, escrever):
+    """Escreve em um arquivo temporário e o move para o destino (os.replace);
+       em caso de falha, o temporário é removido."""
+    pasta = os.path.dirname(caminho) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, caminho_tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(caminho_tmp)
+        os.replace(caminho_tmp, caminho)
+    except BaseException:
+        os.remove(caminho_tmp)
+        raise
+
+
+def converter_faq_para_arrow(caminho_parquet=CAMINHO_FAQ_PARQUET, caminho_arrow=CAMINHO_FAQ_ARROW):
+    """Converte o Parquet do FAQ em um arquivo Arrow IPC sem compressão (mapeável em memória)."""
+    esquema = pq.read_schema(caminho_parquet)
+    colunas = [c for c in esquema.names if c != "embedding"]
+    tabela = pq.read_table(caminho_parquet, columns=colunas)
+
+    def escrever(caminho_tmp):
+        with pa.OSFile(caminho_tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+
+    escrever_atomico(caminho_arrow, escrever)
+
+
+# ================== Conversão dos Embeddings ==================
+def _matriz_de_coluna(coluna):
+    """Converte uma coluna Arrow de embeddings (lista numérica ou texto) em matriz float32."""
+    if pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type):
+        # Formato legado "[0.1, 0.2, ...]": json.loads é muito mais rápido que ast.literal_eval
+        return np.asarray([json.loads(v) for v in coluna.to_pylist()], dtype=np.float32)
+    valores = pc.list_flatten(coluna).to_numpy(zero_copy_only=False)
+    return valores.astype(np.float32, copy=False).reshape(len(coluna), -1)
+
+
+def _ler_embeddings_json(caminho_json):
+    with open(caminho_json, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    if isinstance(dados, dict):
+        dados = dados.get("embeddings", list(dados.values()))
+    return np.asarray(dados, dtype=np.float32)
+
+
+def converter_embeddings(caminho_saida=CAMINHO_EMBEDDINGS_NPY,
+                         caminho_parquet=CAMINHO_FAQ_PARQUET,
+                         caminho_json=CAMINHO_EMBEDDINGS_JSON):
+    """Gera a matriz de embeddings (float32, C-contígua) em formato .npy.
+       Usa a coluna 'embedding' do Parquet do FAQ ou, na falta dela, o JSON legado."""
+    matriz = None
+    if os.path.exists(caminho_parquet) and "embedding" in pq.read_schema(caminho_parquet).names:
+        coluna = pq.read_table(caminho_parquet, columns=["embedding"]).column("embedding")
+        matriz = _matriz_de_coluna(coluna.combine_chunks())
+    elif os.path.exists(caminho_json):
+        matriz = _ler_embeddings_json(caminho_json)
+    else:
+        raise FileNotFoundError(f"{caminho_parquet} / {caminho_json}")
+
+    def escrever(caminho_tmp):
+        with open(caminho_tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(matriz, dtype=np.float32))
+
+    escrever_atomico(caminho_saida, escrever)
+    return matriz.shape
+
+
+def carregar_matriz_embeddings(caminho=CAMINHO_EMBEDDINGS_NPY):
+    """Mapeia a matriz de embeddings em memória (somente leitura, sem cópia).
+       Retorna None se o arquivo não existir."""
+    if not os.path.exists(caminho):
+        return None
+    return np.load(caminho, mmap_mode="r")
+
+
+# ================== Base Compartilhada ==================
+class BaseFAQ:
+    """Visão somente leitura das perguntas e respostas do FAQ, apoiada em memória mapeada.
+       A linha i da base corresponde ao vetor de id i no índice FAISS."""
+
+    def __init__(self, tabela):
+        self._tabela = tabela
+        self._perguntas = tabela.column("pergunta")
+        self._respostas = tabela.column("resposta")
+
+    @classmethod
+    def abrir(cls, caminho_arrow=CAMINHO_FAQ_ARROW, caminho_parquet=CAMINHO_FAQ_PARQUET):
+        """Abre a base do FAQ, gerando o arquivo Arrow a partir do Parquet se necessário.
+           Lança FileNotFoundError se nenhuma das fontes existir."""
+        if not os.path.exists(caminho_arrow) or (
+            os.path.exists(caminho_parquet)
+            and os.path.getmtime(caminho_parquet) > os.path.getmtime(caminho_arrow)
+        ):
+            if not os.path.exists(caminho_parquet):
+                raise FileNotFoundError(caminho_parquet)
+            converter_faq_para_arrow(caminho_parquet, caminho_arrow)
+
+        fonte = pa.memory_map(caminho_arrow, "r")
+        tabela = pa.ipc.open_file(fonte).read_all()  # Zero-cópia: buffers apontam para o mmap
+        return cls(tabela)
+
+    def __len__(self):
+        return self._tabela.num_rows
+
+    @property
+    def tabela(self):
+        """Tabela Arrow subjacente (não deve ser modificada)."""
+        return self._tabela
+
+    def pergunta(self, id_faiss):
+        """Retorna a pergunta associada ao id do índice FAISS (linha da base)."""
+        return self._perguntas[int(id_faiss)].as_py()
+
+    def resposta(self, id_faiss):
+        """Retorna a resposta associada ao id do índice FAISS, em O(1) (acesso posicional)."""
+        return self._respostas[int(id_faiss)].as_py()
+
+    def registro(self, id_faiss):
+        """Retorna todas as colunas (resposta e metadados) da linha `id_faiss` como dicionário."""
+        return {nome: valores[0] for nome, valores in self._tabela.slice(int(id_faiss), 1).to_pydict().items()}
+
+    def alinhada_com(self, index):
+        """Indica se o índice FAISS foi construído sobre esta base (um vetor por linha, na mesma ordem)."""
+        return index is not None and index.ntotal == len(self)
+
+# ================== Linha de Comando ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera os artefatos binários do FAQ (Arrow e .npy).")
+    parser.add_argument("--parquet", default=CAMINHO_FAQ_PARQUET, help="Parquet de origem do FAQ")
+    parser.add_argument("--json", default=CAMINHO_EMBEDDINGS_JSON, help="JSON legado de embeddings")
+    parser.add_argument("--arrow", default=CAMINHO_FAQ_ARROW, help="Arquivo Arrow de saída")
+    parser.add_argument("--npy", default=CAMINHO_EMBEDDINGS_NPY, help="Matriz .npy de saída")
+    args = parser.parse_args()
+
+    converter_faq_para_arrow(args.parquet, args.arrow)
+    print(f"FAQ convertido: {args.arrow}")
+    linhas, dimensao = converter_embeddings(args.npy, args.parquet, args.json)
+    print(f"Embeddings convertidos: {args.npy} ({linhas} x {dimensao}, float32)")
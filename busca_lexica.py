@@ -0,0 +1,138 @@
+# Busca léxica (BM25) sobre as perguntas do FAQ, executada em processo e sem chamadas de rede.
+# Perguntas quase idênticas às do FAQ são respondidas sem gerar embedding; nos demais casos
+# o ranking léxico pode ser combinado com o vetorial (Reciprocal Rank Fusion).
+import re  # Tokenização.
+import unicodedata  # Remoção de acentos.
+from collections import Counter, defaultdict
+
+import numpy as np  # Acumulação vetorizada dos escores.
+
+# Palavras muito frequentes em português, ignoradas na indexação
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em", "entre",
+    "esta", "este", "eu", "ha", "isso", "ja", "mais", "mas", "me", "na", "nas", "no", "nos",
+    "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos", "por", "qual", "quais", "que",
+    "se", "sem", "ser", "sao", "seu", "sua", "tem", "um", "uma", "voce",
+}
+
+LIMIAR_CONFIANCA = 0.8  # Cobertura mínima (nos dois sentidos) para responder só pela busca léxica
+LIMIAR_FALHA = 0.5  # Abaixo desta cobertura da consulta, a pergunta provavelmente não está no FAQ
+
+
+# ================== Normalização ==================
+def remover_acentos(texto):
+    """Remove acentos e cedilhas (ex.: 'conexões' -> 'conexoes')."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _radical(termo):
+    """Redução simples de plural em português."""
+    if len(termo) > 4 and termo.endswith(("oes", "aes")):
+        return termo[:-3] + "ao"
+    if len(termo) > 3 and termo.endswith("s"):
+        return termo[:-1]
+    return termo
+
+
+def normalizar_termos(texto):
+    """Minúsculas, sem acentos e pontuação, sem stopwords e com plural reduzido."""
+    tokens = re.findall(r"[a-z0-9]+", remover_acentos(texto.lower()))
+    return [_radical(t) for t in tokens if t not in STOPWORDS]
+
+
+# ================== Índice BM25 ==================
+class IndiceBM25:
+    """Índice invertido BM25 sobre uma lista de textos (a posição é o id da linha do FAQ)."""
+
+    def __init__(self, textos, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(list)
+        comprimentos = []
+        distintos = []
+        for doc_id, texto in enumerate(textos):
+            termos = Counter(normalizar_termos(texto or ""))
+            comprimentos.append(sum(termos.values()))
+            distintos.append(len(termos))
+            for termo, tf in termos.items():
+                postings[termo].append((doc_id, tf))
+
+        self.n_docs = len(comprimentos)
+        self._comprimentos = np.array(comprimentos, dtype=np.float32)
+        self._distintos = np.array(distintos, dtype=np.int32)
+        media = float(self._comprimentos.mean()) if self.n_docs else 0.0
+        self._media_comprimento = media or 1.0
+
+        # Cada termo guarda arrays (ids, tf) e o idf pré-calculado
+        self._postings = {}
+        for termo, lista in postings.items():
+            ids = np.fromiter((d for d, _ in lista), dtype=np.int32, count=len(lista))
+            tfs = np.fromiter((t for _, t in lista), dtype=np.float32, count=len(lista))
+            idf = np.log(1 + (self.n_docs - len(lista) + 0.5) / (len(lista) + 0.5))
+            self._postings[termo] = (ids, tfs, idf)
+
+    def __len__(self):
+        return self.n_docs
+
+    def _pontuar(self, consulta):
+        termos = set(normalizar_termos(consulta))
+        escores = np.zeros(self.n_docs, dtype=np.float32)
+        coincidencias = np.zeros(self.n_docs, dtype=np.int32)
+        for termo in termos:
+            if termo not in self._postings:
+                continue
+            ids, tfs, idf = self._postings[termo]
+            norma = self.k1 * (1 - self.b + self.b * self._comprimentos[ids] / self._media_comprimento)
+            escores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norma)
+            coincidencias[ids] += 1
+        return termos, escores, coincidencias
+
+    def buscar(self, consulta, k=5):
+        """Retorna até k pares (id, escore) com escore positivo, do maior para o menor."""
+        _, escores, _ = self._pontuar(consulta)
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return []
+        candidatos = np.argpartition(-escores, k - 1)[:k]
+        candidatos = candidatos[np.argsort(-escores[candidatos])]
+        return [(int(i), float(escores[i])) for i in candidatos if escores[i] > 0]
+
+    def _melhor_documento(self, consulta):
+        """Retorna (id, cobertura da consulta, cobertura do documento) do melhor documento, ou None."""
+        termos, escores, coincidencias = self._pontuar(consulta)
+        if not termos or self.n_docs == 0:
+            return None
+        melhor = int(np.argmax(escores))
+        if escores[melhor] <= 0:
+            return None
+        cobertura_consulta = coincidencias[melhor] / len(termos)
+        cobertura_doc = coincidencias[melhor] / max(1, self._distintos[melhor])
+        return melhor, cobertura_consulta, cobertura_doc
+
+    def correspondencia_confiante(self, consulta, limiar=LIMIAR_CONFIANCA):
+        """Retorna o id da pergunta do FAQ quase idêntica à consulta, ou None.
+           Exige que a maior parte dos termos da consulta esteja na pergunta e vice-versa."""
+        melhor = self._melhor_documento(consulta)
+        if melhor is None:
+            return None
+        doc_id, cobertura_consulta, cobertura_doc = melhor
+        if cobertura_consulta >= limiar and cobertura_doc >= limiar:
+            return doc_id
+        return None
+
+    def falha_lexica(self, consulta, limiar=LIMIAR_FALHA):
+        """Sinal de que a consulta provavelmente não está no FAQ: nenhuma pergunta cobre
+           ao menos `limiar` dos termos da consulta."""
+        melhor = self._melhor_documento(consulta)
+        return melhor is None or melhor[1] < limiar
+
+
+# ================== Fusão de Rankings ==================
+def fundir_rrf(*rankings, k=60):
+    """Reciprocal Rank Fusion: combina listas de ids ordenadas em um único ranking de ids."""
+    pontos = defaultdict(float)
+    for ranking in rankings:
+        for posicao, doc_id in enumerate(ranking):
+            pontos[doc_id] += 1.0 / (k + posicao + 1)
+    return sorted(pontos, key=pontos.get, reverse=True)
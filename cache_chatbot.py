@@ -0,0 +1,158 @@
+# Cache persistente do chatbot (SQLite), compartilhado por todas as sessões e mantido entre reinícios.
+# Guarda embeddings e respostas finais indexados pela forma normalizada da pergunta
+# (sem diferença de maiúsculas, espaços ou acentos), com expiração (TTL) e remoção LRU por tamanho.
+import math  # Tamanho do lote de remoção.
+import os  # Manipulação de caminhos.
+import re  # Normalização da pergunta.
+import sqlite3  # Armazenamento em disco.
+import threading  # Acesso concorrente das sessões.
+import time  # Controle de TTL e LRU.
+
+import numpy as np  # Serialização dos embeddings.
+
+from busca_lexica import remover_acentos
+
+CAMINHO_CACHE = "data/cache/chatbot.sqlite"  # Caminho relativo
+TTL_PADRAO = 7 * 24 * 60 * 60  # Uma semana
+TAMANHO_MAXIMO = 256 * 1024 * 1024  # 256 MB
+
+TIPO_EMBEDDING = "embedding"
+TIPO_RESPOSTA = "resposta"
+
+
+# ================== Normalização ==================
+def normalizar_pergunta(texto):
+    """Forma canônica da pergunta: minúsculas, sem acentos, espaços colapsados e sem pontuação final."""
+    texto = remover_acentos(texto.lower())
+    texto = " ".join(texto.split())
+    return re.sub(r"[\s?!.;,]+$", "", texto)
+
+
+# ================== Cache ==================
+class CacheChatbot:
+    """Cache chave-valor em SQLite com TTL, remoção LRU limitada por bytes e contadores de acerto."""
+
+    def __init__(self, caminho=CAMINHO_CACHE, ttl=TTL_PADRAO, tamanho_maximo=TAMANHO_MAXIMO):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                   tipo TEXT NOT NULL,
+                   chave TEXT NOT NULL,
+                   valor BLOB NOT NULL,
+                   tamanho INTEGER NOT NULL,
+                   criado_em REAL NOT NULL,
+                   acessado_em REAL NOT NULL,
+                   PRIMARY KEY (tipo, chave)
+               )"""
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_cache_acesso ON cache (acessado_em)")
+        self._contadores = {}
+        self._total = self._somar_tamanhos()  # Bytes armazenados, atualizado a cada gravação/remoção
+
+    def _somar_tamanhos(self):
+        return self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM cache").fetchone()[0]
+
+    # ---------- Operações genéricas ----------
+    def _contar(self, tipo, evento):
+        chave = (tipo, evento)
+        self._contadores[chave] = self._contadores.get(chave, 0) + 1
+
+    def obter(self, tipo, chave):
+        """Retorna o valor (bytes) armazenado ou None se ausente ou expirado."""
+        agora = time.time()
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT valor, criado_em FROM cache WHERE tipo = ? AND chave = ?", (tipo, chave)
+            ).fetchone()
+            if linha is None or agora - linha[1] > self.ttl:
+                if linha is not None:
+                    self._conexao.execute("DELETE FROM cache WHERE tipo = ? AND chave = ?", (tipo, chave))
+                    self._total -= len(linha[0])
+                self._contar(tipo, "erros")
+                return None
+            self._conexao.execute(
+                "UPDATE cache SET acessado_em = ? WHERE tipo = ? AND chave = ?", (agora, tipo, chave)
+            )
+            self._contar(tipo, "acertos")
+            return linha[0]
+
+    def salvar(self, tipo, chave, valor):
+        """Armazena `valor` (bytes) e aplica a remoção LRU se o cache passar do tamanho máximo."""
+        agora = time.time()
+        with self._lock:
+            anterior = self._conexao.execute(
+                "SELECT tamanho FROM cache WHERE tipo = ? AND chave = ?", (tipo, chave)
+            ).fetchone()
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO cache (tipo, chave, valor, tamanho, criado_em, acessado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tipo, chave, valor, len(valor), agora, agora),
+            )
+            self._total += len(valor) - (anterior[0] if anterior else 0)
+            self._remover_excedente()
+
+    def _remover_excedente(self):
+        """Remove os menos usados recentemente até ficar abaixo de 90% do limite.
+           O banco só é consultado quando o total mantido em memória passa do limite."""
+        if self._total <= self.tamanho_maximo:
+            return
+        quantidade, self._total = self._conexao.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache"
+        ).fetchone()  # Recalcula: outro processo pode ter gravado ou removido entradas
+        alvo = int(self.tamanho_maximo * 0.9)
+        while self._total > alvo and quantidade:
+            lote = max(1, math.ceil((self._total - alvo) / (self._total / quantidade)))  # Pelo tamanho médio
+            removidas = self._conexao.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY acessado_em LIMIT ?) "
+                "RETURNING tipo, tamanho",
+                (lote,),
+            ).fetchall()
+            quantidade -= len(removidas)
+            for tipo, tamanho in removidas:
+                self._total -= tamanho
+                self._contar(tipo, "remocoes")
+
+    def invalidar(self, tipo=None):
+        """Remove todas as entradas (ou apenas as do tipo indicado)."""
+        with self._lock:
+            if tipo is None:
+                self._conexao.execute("DELETE FROM cache")
+            else:
+                self._conexao.execute("DELETE FROM cache WHERE tipo = ?", (tipo,))
+            self._total = self._somar_tamanhos()
+
+    def estatisticas(self):
+        """Contadores de acertos, erros e remoções por tipo, com a taxa de acerto."""
+        estatisticas = {}
+        for tipo in (TIPO_EMBEDDING, TIPO_RESPOSTA):
+            acertos = self._contadores.get((tipo, "acertos"), 0)
+            erros = self._contadores.get((tipo, "erros"), 0)
+            estatisticas[tipo] = {
+                "acertos": acertos,
+                "erros": erros,
+                "remocoes": self._contadores.get((tipo, "remocoes"), 0),
+                "taxa_acerto": acertos / (acertos + erros) if acertos + erros else 0.0,
+            }
+        return estatisticas
+
+    # ---------- Embeddings ----------
+    def obter_embedding(self, pergunta, provedor):
+        valor = self.obter(TIPO_EMBEDDING, f"{provedor}:{normalizar_pergunta(pergunta)}")
+        return None if valor is None else np.frombuffer(valor, dtype=np.float32)
+
+    def salvar_embedding(self, pergunta, provedor, embedding):
+        valor = np.asarray(embedding, dtype=np.float32).tobytes()
+        self.salvar(TIPO_EMBEDDING, f"{provedor}:{normalizar_pergunta(pergunta)}", valor)
+
+    # ---------- Respostas ----------
+    def obter_resposta(self, pergunta, max_palavras):
+        valor = self.obter(TIPO_RESPOSTA, f"{max_palavras}:{normalizar_pergunta(pergunta)}")
+        return None if valor is None else valor.decode("utf-8")
+
+    def salvar_resposta(self, pergunta, max_palavras, resposta):
+        self.salvar(TIPO_RESPOSTA, f"{max_palavras}:{normalizar_pergunta(pergunta)}", resposta.encode("utf-8"))
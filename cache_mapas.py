@@ -0,0 +1,112 @@
+# Cache do HTML já renderizado dos mapas, compartilhado entre as sessões. A chave é uma assinatura
+# canônica de tudo o que altera o mapa (filtros ativos, categorias, faixa de velocidade, tema, versão
+# dos dados...), então visões comuns ("sem filtros, tema escuro") são exibidas sem montar o mapa.
+# Fica em memória, com remoção LRU limitada pelo total de bytes e contadores de acerto.
+import hashlib  # Assinatura das visões.
+import json  # Forma canônica da assinatura.
+import os  # Variáveis de ambiente.
+import threading  # Acesso concorrente das sessões.
+from collections import OrderedDict
+
+import folium  # Renderização do mapa em HTML.
+
+TAMANHO_MAXIMO = int(os.getenv("CACHE_MAPAS_BYTES", str(64 * 1024 * 1024)))  # 64 MB
+
+
+def _canonico(valor):
+    """Forma canônica: listas de seleção ordenadas, seleções vazias omitidas e números como float."""
+    if isinstance(valor, dict):
+        return {str(k): _canonico(v) for k, v in sorted(valor.items(), key=lambda kv: str(kv[0]))
+                if not (isinstance(v, (list, set, frozenset)) and not v)}
+    if isinstance(valor, (set, frozenset)):
+        return sorted(_canonico(v) for v in valor)
+    if isinstance(valor, list):
+        return sorted((_canonico(v) for v in valor), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(valor, tuple):  # Faixas (ex.: speed_range): a ordem importa
+        return [_canonico(v) for v in valor]
+    if hasattr(valor, "item"):  # Escalares do numpy
+        valor = valor.item()
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    return valor
+
+
+def assinatura(**partes):
+    """Hash estável (SHA-256) das partes que definem uma visão do mapa."""
+    texto = json.dumps(_canonico(partes), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def renderizar_mapa(mapa):
+    """HTML completo do mapa, como o que o folium_static envia ao navegador."""
+    return folium.Figure().add_child(mapa).render()
+
+
+class CacheMapas:
+    """HTML renderizado por assinatura, com remoção LRU limitada por bytes e contadores de acerto."""
+
+    def __init__(self, tamanho_maximo=TAMANHO_MAXIMO):
+        self.tamanho_maximo = tamanho_maximo
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (html, tamanho), da menos para a mais recente
+        self._bytes = 0
+        self._acertos = 0
+        self._erros = 0
+        self._remocoes = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, chave):
+        """HTML guardado para a assinatura, ou None."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self._erros += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self._acertos += 1
+            return entrada[0]
+
+    def salvar(self, chave, html):
+        """Guarda o HTML e remove os menos usados recentemente se passar do limite de bytes.
+           Mapas maiores que o próprio limite não são guardados."""
+        tamanho = len(html.encode("utf-8"))
+        if tamanho > self.tamanho_maximo:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._entradas[chave] = (html, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.tamanho_maximo:
+                _, (_, removido) = self._entradas.popitem(last=False)
+                self._bytes -= removido
+                self._remocoes += 1
+
+    def obter_ou_renderizar(self, chave, construir):
+        """HTML da assinatura; em caso de falta, monta o mapa com `construir()` e guarda o resultado."""
+        html = self.obter(chave)
+        if html is None:
+            html = renderizar_mapa(construir())
+            self.salvar(chave, html)
+        return html
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Acertos, erros, remoções, ocupação e taxa de acerto."""
+        with self._lock:
+            consultas = self._acertos + self._erros
+            return {
+                "acertos": self._acertos,
+                "erros": self._erros,
+                "remocoes": self._remocoes,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "taxa_acerto": self._acertos / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,176 @@
+# Cache semântico de respostas do GPT: um índice vetorial (FAISS) das perguntas já respondidas,
+# compartilhado entre as sessões e persistido em SQLite. Perguntas parafraseadas reutilizam a
+# resposta anterior quando a similaridade de cosseno passa do limiar do provedor e a pergunta cita
+# os mesmos números e lugares, evitando uma nova chamada ao LLM.
+import os  # Manipulação de caminhos.
+import re  # Extração dos números e lugares citados.
+import sqlite3  # Persistência das entradas.
+import threading  # Acesso concorrente das sessões.
+import time  # Controle de TTL e LRU.
+
+import faiss  # Índice vetorial das perguntas respondidas.
+import numpy as np  # Computação numérica.
+
+from cache_chatbot import CAMINHO_CACHE
+from consulta_painel import normalizar
+
+# Cosseno mínimo para reutilizar uma resposta, por provedor: o local (hashing de palavras e n-gramas)
+# dá notas altas a perguntas com as mesmas palavras e baixas a paráfrases, então precisa de um limiar maior
+LIMIARES_SIMILARIDADE = {"openai": 0.92, "local": 0.97}
+LIMIAR_SIMILARIDADE = 0.92  # Provedores sem limiar próprio
+CANDIDATOS = 5  # Vizinhos avaliados (o mais próximo pode citar outro número ou lugar)
+COLUNAS_LUGAR = ["DRE", "SUBPREF", "DISTRITO", "BAIRRO"]
+_ZONAS = re.compile(r"\b(norte|sul|leste|oeste|centro|central)\b")
+_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def nomes_lugares(escolas, colunas=COLUNAS_LUGAR):
+    """Nomes normalizados de DRE, subprefeitura, distrito e bairro presentes no cadastro de escolas."""
+    nomes = set()
+    for coluna in colunas:
+        if coluna in escolas.columns:
+            for valor in escolas[coluna].dropna().unique():
+                nome = re.sub(r"^(?:diretoria regional de educacao|dre)\s+", "", normalizar(valor))
+                if len(nome) >= 3:
+                    nomes.add(nome)
+    return frozenset(nomes)
+
+
+def entidades_pergunta(pergunta, nomes=frozenset()):
+    """Números, zonas e lugares (dentre `nomes`) citados na pergunta. Duas perguntas só
+       compartilham a resposta se citarem exatamente as mesmas entidades."""
+    texto = normalizar(pergunta)
+    com_espacos = f" {texto} "
+    return (frozenset(_NUMEROS.findall(texto)),
+            frozenset("centro" if z == "central" else z for z in _ZONAS.findall(texto)),
+            frozenset(n for n in nomes if f" {n} " in com_espacos))
+CAPACIDADE_PADRAO = 5000  # Máximo de respostas mantidas (remoção LRU)
+TTL_PADRAO = 7 * 24 * 60 * 60  # Uma semana
+
+
+class CacheSemantico:
+    """Índice vetorial crescente de perguntas respondidas pelo GPT, com limiar próprio,
+       TTL, remoção LRU por capacidade e invalidação explícita."""
+
+    def __init__(self, provedor, caminho=CAMINHO_CACHE, limiar=None,
+                 capacidade=CAPACIDADE_PADRAO, ttl=TTL_PADRAO):
+        self.provedor = provedor
+        self.limiar = limiar if limiar is not None else LIMIARES_SIMILARIDADE.get(provedor, LIMIAR_SIMILARIDADE)
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None  # Criado na primeira inserção (dimensão do provedor)
+        self._entradas = {}  # id -> {"pergunta", "resposta", "criado_em", "acessado_em"}
+
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute(
+            """CREATE TABLE IF NOT EXISTS cache_semantico (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   provedor TEXT NOT NULL,
+                   pergunta TEXT NOT NULL,
+                   resposta TEXT NOT NULL,
+                   embedding BLOB NOT NULL,
+                   criado_em REAL NOT NULL,
+                   acessado_em REAL NOT NULL
+               )"""
+        )
+        self._carregar()
+
+    # ---------- Persistência ----------
+    def _carregar(self):
+        limite = time.time() - self.ttl
+        self._conexao.execute("DELETE FROM cache_semantico WHERE criado_em < ?", (limite,))
+        linhas = self._conexao.execute(
+            "SELECT id, pergunta, resposta, embedding, criado_em, acessado_em FROM cache_semantico "
+            "WHERE provedor = ? ORDER BY id",
+            (self.provedor,),
+        ).fetchall()
+        for id_, pergunta, resposta, embedding, criado_em, acessado_em in linhas:
+            self._inserir_no_indice(id_, np.frombuffer(embedding, dtype=np.float32))
+            self._entradas[id_] = {"pergunta": pergunta, "resposta": resposta,
+                                   "criado_em": criado_em, "acessado_em": acessado_em}
+
+    def _inserir_no_indice(self, id_, vetor):
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vetor)))
+        self._index.add_with_ids(vetor.reshape(1, -1), np.array([id_], dtype=np.int64))
+
+    @staticmethod
+    def _normalizar(embedding):
+        vetor = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vetor)
+        return vetor[0]
+
+    # ---------- Consulta ----------
+    def buscar(self, embedding, pergunta=None, nomes=frozenset()):
+        """Retorna a resposta de uma pergunta semelhante já respondida, ou None. Com `pergunta`,
+           a resposta só é reutilizada se as duas citarem os mesmos números, zonas e lugares (`nomes`)."""
+        vetor = self._normalizar(embedding)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0 or self._index.d != len(vetor):
+                return None
+            similaridades, ids = self._index.search(vetor.reshape(1, -1), min(CANDIDATOS, self._index.ntotal))
+            entidades = entidades_pergunta(pergunta, nomes) if pergunta is not None else None
+            id_ = next((int(i) for i, s in zip(ids[0], similaridades[0])
+                        if i >= 0 and s >= self.limiar and (entidades is None or entidades_pergunta(
+                            self._entradas[int(i)]["pergunta"], nomes) == entidades)), None)
+            if id_ is None:
+                return None
+
+            entrada = self._entradas[id_]
+            agora = time.time()
+            if agora - entrada["criado_em"] > self.ttl:
+                self._remover([id_])
+                return None
+            entrada["acessado_em"] = agora
+            self._conexao.execute("UPDATE cache_semantico SET acessado_em = ? WHERE id = ?", (agora, id_))
+            return entrada["resposta"]
+
+    # ---------- Inserção ----------
+    def adicionar(self, pergunta, embedding, resposta):
+        """Registra a resposta gerada para a pergunta e aplica a remoção LRU se necessário."""
+        vetor = self._normalizar(embedding)
+        agora = time.time()
+        with self._lock:
+            if self._index is not None and self._index.d != len(vetor):
+                return  # Embedding de outra dimensão (provedor trocado): ignora
+            cursor = self._conexao.execute(
+                "INSERT INTO cache_semantico (provedor, pergunta, resposta, embedding, criado_em, acessado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.provedor, pergunta, resposta, vetor.tobytes(), agora, agora),
+            )
+            id_ = cursor.lastrowid
+            self._inserir_no_indice(id_, vetor)
+            self._entradas[id_] = {"pergunta": pergunta, "resposta": resposta,
+                                   "criado_em": agora, "acessado_em": agora}
+
+            excedente = len(self._entradas) - self.capacidade
+            if excedente > 0:
+                antigos = sorted(self._entradas, key=lambda i: self._entradas[i]["acessado_em"])[:excedente]
+                self._remover(antigos)
+
+    # ---------- Invalidação ----------
+    def _remover(self, ids):
+        if not ids:
+            return
+        self._index.remove_ids(np.array(ids, dtype=np.int64))
+        for id_ in ids:
+            self._entradas.pop(id_, None)
+        self._conexao.executemany("DELETE FROM cache_semantico WHERE id = ?", [(i,) for i in ids])
+
+    def invalidar(self, contendo=None):
+        """Remove as entradas cuja pergunta ou resposta contém o texto indicado
+           (ou todas, se `contendo` for None). Retorna o número de entradas removidas."""
+        with self._lock:
+            if contendo is None:
+                ids = list(self._entradas)
+            else:
+                termo = contendo.lower()
+                ids = [i for i, e in self._entradas.items()
+                       if termo in e["pergunta"].lower() or termo in e["resposta"].lower()]
+            self._remover(ids)
+            return len(ids)
+
+    def __len__(self):
+        return len(self._entradas)
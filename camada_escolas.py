@@ -0,0 +1,172 @@
+# Camadas de marcadores das escolas no mapa (folium), montadas a partir das colunas do DataFrame.
+# Cada categoria de velocidade vira uma única FeatureCollection GeoJSON: o raio e o popup de cada
+# escola são derivados das propriedades no navegador por um único trecho de JavaScript, em vez de
+# um objeto CircleMarker + Popup (e um bloco de JS) por escola. No modo agregado, cada nível de zoom
+# tem a sua camada de células (agregacao_espacial) e o navegador mostra só a do zoom atual.
+import folium  # Mapas interativos.
+import numpy as np  # Arredondamento vetorizado das colunas.
+from branca.element import MacroElement
+from folium.template import Template
+from folium.utilities import JsCode
+
+# Cores dos marcadores por categoria de velocidade
+CORES_CATEGORIA = {
+    "Muito Baixa": "#fa4c4d",
+    "Baixa": "#ff7f0e",
+    "Média": "#2ca02c",
+    "Alta": "#1f77b4",
+}
+
+# Raio proporcional à velocidade (mesma escala dos marcadores originais) e popup criado sob demanda
+_POR_ESCOLA_JS = JsCode("""
+function(feature, layer) {
+    var p = feature.properties;
+    layer.setRadius((p.v / 10) * 1.01);
+    layer.bindPopup(function() {
+        var div = document.createElement("div");
+        var nome = document.createElement("b");
+        nome.textContent = p.n;
+        div.appendChild(nome);
+        div.appendChild(document.createElement("br"));
+        div.appendChild(document.createTextNode("IDEB: " + p.i.toFixed(2)));
+        div.appendChild(document.createElement("br"));
+        div.appendChild(document.createTextNode("Velocidade: " + p.v.toFixed(2) + " Mbps"));
+        return div;
+    }, {maxWidth: 300});
+}
+""")
+
+
+def feature_collection_escolas(escolas):
+    """FeatureCollection de pontos com as propriedades mínimas (nome, IDEB e velocidade),
+       construída em uma única passada sobre as colunas."""
+    longitudes = np.round(escolas["LONGITUDE"].to_numpy(dtype=float), 6).tolist()
+    latitudes = np.round(escolas["LATITUDE"].to_numpy(dtype=float), 6).tolist()
+    idebs = np.round(escolas["IDEB"].to_numpy(dtype=float), 2).tolist()
+    velocidades = np.round(escolas["Velocidade_Internet"].to_numpy(dtype=float), 2).tolist()
+    nomes = escolas["NOMES"].astype(str).tolist()
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"n": nome, "i": ideb, "v": vel},
+            }
+            for lon, lat, nome, ideb, vel in zip(longitudes, latitudes, nomes, idebs, velocidades)
+        ],
+    }
+
+
+def camada_velocidade(escolas, categoria, cor=None, control=True):
+    """Camada (GeoJson) com as escolas de uma categoria de velocidade, pronta para o LayerControl
+       (ou, com `control=False`, para ter a visibilidade controlada pelo zoom). `escolas` é o
+       DataFrame ou a FeatureCollection já montada por feature_collection_escolas."""
+    marcador = folium.CircleMarker(
+        radius=1,                # Substituído pelo raio de cada escola (_POR_ESCOLA_JS)
+        weight=0,                # Sem borda
+        fill=True,
+        fill_color=cor or CORES_CATEGORIA[categoria],
+        fill_opacity=0.5,        # 50% de transparência
+    )
+    return folium.GeoJson(
+        escolas if isinstance(escolas, dict) else feature_collection_escolas(escolas),
+        name=f"Velocidade {categoria}",
+        marker=marcador,
+        on_each_feature=_POR_ESCOLA_JS,
+        control=control,
+    )
+
+
+# ================== Modo agregado (grade por zoom) ==================
+# Raio proporcional à raiz do número de escolas e resumo da célula no tooltip
+_POR_CELULA_JS = JsCode("""
+function(feature, layer) {
+    var p = feature.properties;
+    layer.setRadius(Math.min(6 + 3 * Math.sqrt(p.e), 28));
+    layer.setStyle({fillColor: p.c});
+    layer.bindTooltip(
+        p.e + (p.e === 1 ? " escola" : " escolas") +
+        "<br>Velocidade média: " + p.v.toFixed(2) + " Mbps" +
+        "<br>IDEB médio: " + (p.i === null ? "-" : p.i.toFixed(2))
+    );
+}
+""")
+
+
+def cor_velocidade(velocidades, quartis):
+    """Cor da categoria de velocidade (mesmos cortes por quartil do painel) para cada valor."""
+    cores = np.array(list(CORES_CATEGORIA.values()))
+    return cores[np.searchsorted(np.asarray(quartis, dtype=float), velocidades, side="left")].tolist()
+
+
+def feature_collection_grade(celulas, quartis):
+    """FeatureCollection com um ponto por célula (centróide das escolas) e o resumo da célula."""
+    velocidades = np.round(celulas["velocidade_media"].to_numpy(dtype=float), 2)
+    idebs = np.round(celulas["ideb_media"].to_numpy(dtype=float), 2)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"e": n, "v": vel, "i": None if np.isnan(ideb) else ideb, "c": cor},
+            }
+            for lon, lat, n, vel, ideb, cor in zip(
+                np.round(celulas["longitude"].to_numpy(dtype=float), 5).tolist(),
+                np.round(celulas["latitude"].to_numpy(dtype=float), 5).tolist(),
+                celulas["escolas"].astype(int).tolist(),
+                velocidades.tolist(),
+                idebs.tolist(),
+                cor_velocidade(velocidades, quartis),
+            )
+        ],
+    }
+
+
+def camada_grade(celulas, zoom, quartis):
+    """Camada (GeoJson) com as células de um nível de zoom: um círculo no centróide das escolas de
+       cada célula, colorido pela categoria da velocidade média. `celulas` é o DataFrame do nível
+       ou a FeatureCollection já montada por feature_collection_grade."""
+    colecao = celulas if isinstance(celulas, dict) else feature_collection_grade(celulas, quartis)
+    marcador = folium.CircleMarker(radius=6, weight=1, color="#ffffff", fill=True, fill_opacity=0.7)
+    return folium.GeoJson(
+        colecao,
+        name=f"Grade (zoom {zoom})",
+        marker=marcador,
+        on_each_feature=_POR_CELULA_JS,
+        control=False,  # Visibilidade controlada pelo zoom (AlternanciaPorZoom), não pelo LayerControl
+    )
+
+
+class AlternanciaPorZoom(MacroElement):
+    """Mantém no mapa apenas as camadas cujo intervalo [zoom_min, zoom_max] contém o zoom atual."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var mapa = {{ this._parent.get_name() }};
+            var niveis = [
+                {%- for zoom_min, zoom_max, camada in this.niveis %}
+                [{{ zoom_min }}, {{ zoom_max }}, {{ camada.get_name() }}],
+                {%- endfor %}
+            ];
+            function atualizar() {
+                var zoom = mapa.getZoom();
+                niveis.forEach(function(nivel) {
+                    var visivel = zoom >= nivel[0] && zoom <= nivel[1];
+                    if (visivel && !mapa.hasLayer(nivel[2])) { mapa.addLayer(nivel[2]); }
+                    if (!visivel && mapa.hasLayer(nivel[2])) { mapa.removeLayer(nivel[2]); }
+                });
+            }
+            mapa.on("zoomend", atualizar);
+            atualizar();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, niveis):
+        """`niveis`: lista de (zoom_min, zoom_max, camada) com camadas já adicionadas ao mapa."""
+        super().__init__()
+        self._name = "AlternanciaPorZoom"
+        self.niveis = niveis
@@ -0,0 +1,307 @@
+# Cliente resiliente para a API da OpenAI, usado pelos embeddings e pelo chat do assistente.
+# Reaproveita conexões (um único cliente HTTP por processo), aplica prazo por chamada, limita a
+# concorrência com um semáforo, repete falhas transitórias com backoff e jitter e abre um
+# disjuntor (circuit breaker) após falhas seguidas, para que o chatbot passe a responder só com o FAQ.
+# A URL base é configurável (OPENAI_BASE_URL), o que permite testar contra um servidor local.
+import logging
+import os  # Variáveis de ambiente.
+import random  # Jitter do backoff.
+import threading  # Semáforo, disjuntor e métricas compartilhados entre sessões.
+import time  # Prazos e latências.
+from bisect import bisect_left
+
+import openai  # Integração com a API da OpenAI.
+
+from recuperacao_faq import estimar_tokens
+
+PRAZO_EMBEDDING = 10.0  # Segundos, somando as tentativas
+PRAZO_CHAT = 30.0  # Segundos até o primeiro fragmento (e entre fragmentos)
+MAX_CONCORRENCIA = int(os.getenv("LLM_MAX_CONCORRENCIA", "8"))
+TENTATIVAS = 3
+BACKOFF_BASE = 0.5  # Segundos
+FALHAS_PARA_ABRIR = 5  # Falhas seguidas que abrem o disjuntor
+TEMPO_ABERTO = 30.0  # Segundos até uma nova tentativa (meio-aberto)
+INTERVALO_LOG = float(os.getenv("LLM_INTERVALO_LOG", "300"))  # Segundos entre logs das métricas
+
+# Limites superiores (ms) dos baldes do histograma de latência
+BALDES_LATENCIA_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+# Falhas transitórias que justificam nova tentativa
+ERROS_TRANSITORIOS = (
+    openai.APIConnectionError,  # Inclui APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ErroLLM(Exception):
+    """Falha definitiva de uma chamada ao LLM (após as tentativas ou com o disjuntor aberto)."""
+
+
+class CircuitoAberto(ErroLLM):
+    """O disjuntor está aberto: a chamada nem chega a ser feita."""
+
+
+# ================== Disjuntor ==================
+class Disjuntor:
+    """Circuit breaker: abre após `falhas_para_abrir` falhas seguidas e libera uma chamada
+       de teste (meio-aberto) depois de `tempo_aberto` segundos."""
+
+    def __init__(self, falhas_para_abrir=FALHAS_PARA_ABRIR, tempo_aberto=TEMPO_ABERTO):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_aberto = tempo_aberto
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_em = None
+
+    @property
+    def aberto(self):
+        with self._lock:
+            return self._aberto_em is not None and time.monotonic() - self._aberto_em < self.tempo_aberto
+
+    def estado(self):
+        """'fechado', 'aberto' ou 'meio-aberto' (aguardando a chamada de teste), e as falhas seguidas."""
+        with self._lock:
+            if self._aberto_em is None:
+                situacao = "fechado"
+            elif time.monotonic() - self._aberto_em < self.tempo_aberto:
+                situacao = "aberto"
+            else:
+                situacao = "meio-aberto"
+            return {"situacao": situacao, "falhas_seguidas": self._falhas}
+
+    def verificar(self):
+        """Lança CircuitoAberto se as chamadas estiverem suspensas."""
+        with self._lock:
+            if self._aberto_em is None:
+                return
+            if time.monotonic() - self._aberto_em < self.tempo_aberto:
+                raise CircuitoAberto("Serviço de LLM temporariamente indisponível.")
+            self._aberto_em = time.monotonic()  # Meio-aberto: deixa passar uma chamada de teste
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_em = None
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= self.falhas_para_abrir:
+                if self._aberto_em is None:
+                    logger.warning("Disjuntor do LLM aberto após %d falhas seguidas.", self._falhas)
+                self._aberto_em = time.monotonic()
+
+
+# ================== Métricas ==================
+class MetricasLLM:
+    """Histogramas de latência e contagem de tokens por operação ('embeddings', 'chat').
+       O resumo vai para o log a cada `intervalo_log` segundos (e é exibido no painel de desempenho)."""
+
+    def __init__(self, intervalo_log=INTERVALO_LOG):
+        self._lock = threading.Lock()
+        self._operacoes = {}
+        self.intervalo_log = intervalo_log
+        self._ultimo_log = time.monotonic()
+
+    def _operacao(self, nome):
+        if nome not in self._operacoes:
+            self._operacoes[nome] = {
+                "chamadas": 0, "erros": 0, "tentativas_extras": 0,
+                "tokens_prompt": 0, "tokens_resposta": 0,
+                "histograma_ms": [0] * len(BALDES_LATENCIA_MS),
+            }
+        return self._operacoes[nome]
+
+    def registrar(self, nome, latencia, tokens_prompt=0, tokens_resposta=0, erro=False):
+        with self._lock:
+            op = self._operacao(nome)
+            op["chamadas"] += 1
+            op["erros"] += int(erro)
+            op["tokens_prompt"] += tokens_prompt or 0
+            op["tokens_resposta"] += tokens_resposta or 0
+            op["histograma_ms"][bisect_left(BALDES_LATENCIA_MS, latencia * 1000)] += 1
+            registrar_log = time.monotonic() - self._ultimo_log >= self.intervalo_log
+            if registrar_log:
+                self._ultimo_log = time.monotonic()
+        if registrar_log:
+            for operacao, dados in self.resumo().items():
+                logger.info("LLM %s: %d chamadas, %d erros, %d tentativas extras, %d+%d tokens, p95 <= %s ms.",
+                            operacao, dados["chamadas"], dados["erros"], dados["tentativas_extras"],
+                            dados["tokens_prompt"], dados["tokens_resposta"], dados["p95_ms"])
+
+    def registrar_tentativa_extra(self, nome):
+        with self._lock:
+            self._operacao(nome)["tentativas_extras"] += 1
+
+    def resumo(self):
+        """Cópia das métricas, com o histograma rotulado pelos limites dos baldes e o limite
+           do balde que contém o percentil 95 da latência (`p95_ms`)."""
+        with self._lock:
+            resumo = {}
+            for nome, op in self._operacoes.items():
+                resumo[nome] = dict(op)
+                resumo[nome]["histograma_ms"] = {
+                    ("+inf" if limite == float("inf") else f"<={limite}"): n
+                    for limite, n in zip(BALDES_LATENCIA_MS, op["histograma_ms"])
+                }
+                acumulado = 0
+                for limite, n in zip(BALDES_LATENCIA_MS, op["histograma_ms"]):
+                    acumulado += n
+                    if acumulado >= 0.95 * op["chamadas"]:
+                        break
+                resumo[nome]["p95_ms"] = ("+inf" if limite == float("inf") else limite) if op["chamadas"] else None
+            return resumo
+
+
+# ================== Stream Medido ==================
+class StreamMedido:
+    """Envolve o stream do chat: libera o semáforo ao terminar e registra latência e tokens."""
+
+    def __init__(self, stream, cliente, inicio, tokens_prompt_estimados):
+        self._stream = stream
+        self._cliente = cliente
+        self._inicio = inicio
+        self._tokens_prompt = tokens_prompt_estimados
+        self._fragmentos = 0
+        self._uso = None
+        self._fechado = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    self._uso = chunk.usage  # Último chunk (stream_options.include_usage)
+                if chunk.choices:
+                    self._fragmentos += 1
+                yield chunk
+        except Exception as erro:  # Conexão caiu ou prazo entre fragmentos estourou
+            self._cliente.disjuntor.registrar_falha()
+            self.close(erro=True)
+            raise ErroLLM(f"Falha durante o streaming do chat: {erro}") from erro
+        self.close()
+
+    def close(self, erro=False):
+        if self._fechado:
+            return
+        self._fechado = True
+        try:
+            self._stream.close()
+        finally:
+            self._cliente._semaforo.release()
+            prompt = self._uso.prompt_tokens if self._uso else self._tokens_prompt
+            resposta = self._uso.completion_tokens if self._uso else self._fragmentos
+            self._cliente.metricas.registrar("chat", time.monotonic() - self._inicio, prompt, resposta, erro)
+
+
+# ================== Cliente ==================
+class ClienteLLM:
+    """Ponto único de acesso à API da OpenAI para o processo (compartilhado entre as sessões)."""
+
+    def __init__(self, api_key=None, base_url=None, max_concorrencia=MAX_CONCORRENCIA,
+                 tentativas=TENTATIVAS, disjuntor=None):
+        # O cliente da OpenAI só é criado na primeira chamada: sem chave, o app continua de pé
+        self._api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self._max_concorrencia = max_concorrencia
+        self._cliente = None
+        self._lock_cliente = threading.Lock()
+        self._semaforo = threading.BoundedSemaphore(max_concorrencia)
+        self.tentativas = tentativas
+        self.disjuntor = disjuntor or Disjuntor()
+        self.metricas = MetricasLLM()
+
+    @property
+    def indisponivel(self):
+        """True se as chamadas falhariam de imediato (sem chave da API ou com o disjuntor aberto)."""
+        return not self._api_key or self.disjuntor.aberto
+
+    def _obter_cliente(self):
+        """Cliente da OpenAI, criado uma única vez, na primeira chamada."""
+        if not self._api_key:
+            raise CircuitoAberto("Chave da OpenAI (OPENAI_API_KEY) não configurada.")
+        with self._lock_cliente:
+            if self._cliente is None:
+                # Pool de conexões HTTP do próprio pacote openai (mantidas abertas entre as chamadas)
+                limites = type(openai.DEFAULT_CONNECTION_LIMITS)(
+                    max_connections=self._max_concorrencia, max_keepalive_connections=self._max_concorrencia
+                )
+                self._cliente = openai.OpenAI(
+                    api_key=self._api_key,
+                    base_url=self._base_url,
+                    max_retries=0,  # As tentativas são controladas aqui (com prazo e disjuntor)
+                    http_client=openai.DefaultHttpxClient(limits=limites),
+                )
+            return self._cliente
+
+    def _chamar(self, operacao, prazo, funcao, cancelado=None):
+        """Executa `funcao(cliente, timeout)` com semáforo, prazo total, tentativas com jitter e disjuntor.
+           Em caso de sucesso, retorna (resultado, instante de início) com o semáforo ainda ocupado.
+           `cancelado` (threading.Event), sinalizado por quem desistiu da chamada, interrompe as tentativas e o backoff."""
+        cliente = self._obter_cliente()  # Sem chave: tratado como disjuntor aberto
+        self.disjuntor.verificar()
+        fim = time.monotonic() + prazo
+        if not self._semaforo.acquire(timeout=prazo):
+            raise ErroLLM(f"Limite de {operacao} simultâneos atingido.")
+
+        inicio = time.monotonic()
+        ultimo_erro = None
+        try:
+            for tentativa in range(self.tentativas):
+                restante = fim - time.monotonic()
+                if restante <= 0:
+                    break
+                if cancelado is not None and cancelado.is_set():
+                    raise ErroLLM(f"Chamada de {operacao} cancelada.")  # Não conta como falha do serviço
+                try:
+                    resultado = funcao(cliente, restante)
+                    self.disjuntor.registrar_sucesso()
+                    return resultado, inicio
+                except ERROS_TRANSITORIOS as erro:
+                    ultimo_erro = erro
+                    if tentativa + 1 < self.tentativas:
+                        self.metricas.registrar_tentativa_extra(operacao)
+                        espera = random.uniform(0, BACKOFF_BASE * 2 ** tentativa)  # Full jitter
+                        espera = min(espera, max(0.0, fim - time.monotonic()))
+                        if cancelado is not None:
+                            cancelado.wait(espera)
+                        else:
+                            time.sleep(espera)
+                except openai.APIStatusError as erro:  # 4xx: não adianta repetir
+                    ultimo_erro = erro
+                    break
+        except BaseException:
+            self._semaforo.release()
+            raise
+
+        self._semaforo.release()
+        if ultimo_erro is None or isinstance(ultimo_erro, ERROS_TRANSITORIOS):  # Prazo esgotado ou falha transitória
+            self.disjuntor.registrar_falha()  # Uma falha por chamada, só depois de esgotar as tentativas
+        self.metricas.registrar(operacao, time.monotonic() - inicio, erro=True)
+        raise ErroLLM(f"Falha na chamada de {operacao}: {ultimo_erro}") from ultimo_erro
+
+    def criar_embeddings(self, textos, modelo="text-embedding-3-small", prazo=PRAZO_EMBEDDING):
+        """Gera embeddings (resposta no formato da API da OpenAI)."""
+        response, inicio = self._chamar(
+            "embeddings", prazo,
+            lambda cliente, timeout: cliente.embeddings.create(input=textos, model=modelo, timeout=timeout),
+        )
+        self._semaforo.release()
+        uso = getattr(response, "usage", None)
+        self.metricas.registrar("embeddings", time.monotonic() - inicio, uso.prompt_tokens if uso else 0)
+        return response
+
+    def criar_chat_stream(self, mensagens, modelo="gpt-3.5-turbo", max_tokens=None, prazo=PRAZO_CHAT, cancelado=None):
+        """Abre um chat em streaming. O semáforo fica ocupado até o stream terminar ou ser fechado."""
+        stream, inicio = self._chamar(
+            "chat", prazo,
+            lambda cliente, timeout: cliente.chat.completions.create(
+                model=modelo, messages=mensagens, max_tokens=max_tokens, stream=True,
+                stream_options={"include_usage": True}, timeout=timeout,
+            ),
+            cancelado,
+        )
+        tokens_prompt = sum(estimar_tokens(m["content"]) for m in mensagens)  # Usada se o stream for cancelado
+        return StreamMedido(stream, self, inicio, tokens_prompt)
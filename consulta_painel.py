@@ -0,0 +1,539 @@
+# Motor de consultas local para as perguntas sobre os dados do painel (velocidade de internet,
+# IDEB, zonas, DRE, subprefeituras, distritos e tipos de escola). A pergunta é interpretada por
+# regras simples e convertida em filtros e agregações sobre o DataFrame `escolas` em memória:
+# a resposta sai em milissegundos, com os números exatos, sem embedding e sem GPT.
+import copy  # Consultas de continuação partem de uma cópia da anterior.
+import re  # Interpretação da pergunta.
+
+import numpy as np  # Quartis das categorias de velocidade.
+import pandas as pd  # Filtros e agregações.
+
+from busca_lexica import STOPWORDS, remover_acentos
+
+# Subprefeituras (e DREs de mesmo nome) por zona da cidade
+ZONAS = {
+    "norte": ["perus", "pirituba", "jaragua", "freguesia", "brasilandia", "casa verde", "cachoeirinha",
+              "santana", "tucuruvi", "jacana", "tremembe", "vila maria", "vila guilherme"],
+    "sul": ["vila mariana", "ipiranga", "santo amaro", "jabaquara", "cidade ademar", "campo limpo",
+            "m boi mirim", "capela do socorro", "parelheiros"],
+    "leste": ["mooca", "aricanduva", "formosa", "carrao", "vila prudente", "sapopemba", "penha",
+              "ermelino matarazzo", "sao miguel", "itaim paulista", "itaquera", "guaianases",
+              "sao mateus", "cidade tiradentes"],
+    "oeste": ["lapa", "butanta", "pinheiros"],
+    "centro": ["se"],
+}
+
+ROTULOS_ZONA = {"norte": "Zona Norte", "sul": "Zona Sul", "leste": "Zona Leste", "oeste": "Zona Oeste",
+                "centro": "Região Central"}
+
+CATEGORIAS = ["Muito Baixa", "Baixa", "Média", "Alta"]  # Quartis de velocidade, como nos filtros do painel
+
+# Colunas de localização/tipo reconhecidas na pergunta e as palavras que as identificam
+COLUNAS_FILTRO = {
+    "DRE": ("dre", "diretoria"),
+    "SUBPREF": ("subprefeitura", "subpref"),
+    "DISTRITO": ("distrito",),
+    "BAIRRO": ("bairro",),
+    "TIPOESC": ("tipo",),
+    "NOMES": ("escola",),
+}
+PREFERENCIA_COLUNA = ["TIPOESC", "SUBPREF", "DISTRITO", "DRE", "BAIRRO", "NOMES"]  # Nome presente em várias colunas
+NOMES_COLUNA = {
+    "DRE": "na DRE", "SUBPREF": "na subprefeitura", "DISTRITO": "no distrito",
+    "BAIRRO": "no bairro", "TIPOESC": "do tipo", "NOMES": "na escola",
+}
+
+# Agrupamentos ("quais distritos...", "média por DRE")
+AGRUPAMENTOS = {
+    "distritos": "DISTRITO", "distrito": "DISTRITO",
+    "subprefeituras": "SUBPREF", "subprefeitura": "SUBPREF",
+    "dres": "DRE", "diretorias": "DRE", "dre": "DRE",
+    "bairros": "BAIRRO", "bairro": "BAIRRO",
+    "zonas": "ZONA", "zona": "ZONA", "regioes": "ZONA",
+    "tipos": "TIPOESC", "tipo": "TIPOESC",
+}
+ROTULOS_AGRUPAMENTO = {
+    "DISTRITO": "distritos", "SUBPREF": "subprefeituras", "DRE": "DREs",
+    "BAIRRO": "bairros", "ZONA": "zonas", "TIPOESC": "tipos de escola",
+}
+
+METRICAS = {
+    "velocidade": ("Velocidade_Internet", "velocidade"),
+    "ideb": ("IDEB", "IDEB"),
+}
+PALAVRAS_VELOCIDADE = ("velocidade", "internet", "mbps", "mega", "megas", "conexao", "conectividade",
+                       "banda", "infraestrutura digital", "rapida", "lenta")
+
+N_PADRAO = 10  # Itens listados na resposta
+JANELA_METRICA = 2  # Palavras antes do comparador em que a métrica do limite deve aparecer ("IDEB acima de 5")
+
+# Substantivos que o motor sabe tratar; uma contagem ou um limite sobre outro substantivo
+# ("quantos alunos", "mais de 2 laboratórios") fica com o FAQ/GPT
+SUBSTANTIVOS = ({"escola", "escolas", "unidade", "unidades", "zona", "regiao", "categoria", "ideb", "mb"}
+                | set(AGRUPAMENTOS) | {p for palavras in COLUNAS_FILTRO.values() for p in palavras}
+                | {p for palavras in PALAVRAS_VELOCIDADE for p in palavras.split()})
+
+_NUMERO = r"(\d+(?:\.\d+)?)"
+_UNIDADE = r"(?: (mbps|mb|megas?))?"
+COMPARADORES = [
+    (r"(?:abaixo de|menor(?:es)? (?:que|do que|de)|inferior(?:es)? a|menos de)", "<"),
+    (r"(?:ate|no maximo)", "<="),
+    (r"(?:acima de|maior(?:es)? (?:que|do que|de)|superior(?:es)? a|mais de)", ">"),
+    (r"(?:pelo menos|no minimo|a partir de)", ">="),
+]
+DESCRICAO_OPERADOR = {"<": "abaixo de", "<=": "até", ">": "acima de", ">=": "de pelo menos", "entre": "entre"}
+_ENTRE = rf"entre {_NUMERO}{_UNIDADE} e {_NUMERO}{_UNIDADE}"
+
+# Perguntas conceituais ficam com o FAQ/GPT mesmo citando as métricas
+_CONCEITUAL = re.compile(
+    r"\b(por que|porque|o que (?:e|sao|significa)|politicas?|como (?:melhorar|posso|podemos|devo|funciona)|"
+    r"significa|explique|defin\w*|recomendad\w*|ideal|deveria|necessari\w*|importancia|impacto)\b"
+)
+_CONTAGEM = re.compile(r"\b(quant[oa]s|numero de|total de|contagem)\b")
+_MEDIA = re.compile(r"\bmedi[ao]s?\b")
+_CORRELACAO = re.compile(r"\b(correla\w*|relacao|relaciona\w*|relacionam)\b")
+_METRICA_EXPLICITA = re.compile(r"\b(ideb|velocidade|internet|conexao) medi[ao]s?\b|"
+                                r"\bmedi[ao]s? (?:de |do |da )?(ideb|velocidade|internet|conexao)\b")
+_DECRESCENTE = re.compile(r"\b(melhor(?:es)?|maior(?:es)?|mais (?:rapid\w*|alt\w*)|top|lideres)\b")
+_CRESCENTE = re.compile(r"\b(pior(?:es)?|menor(?:es)?|mais (?:lent\w*|baix\w*)|lent[ao]s?|baix[ao]s?|devagar|ultimos)\b")
+_QUANTIDADE = re.compile(r"\b(?:top )?(\d+) (?:melhores|piores|maiores|menores|primeir[oa]s|ultim[oa]s|escolas|"
+                         r"distritos|subprefeituras|dres|bairros)\b|\btop (\d+)\b")
+
+
+# ================== Normalização ==================
+def normalizar(texto):
+    """Minúsculas, sem acentos e pontuação; números decimais com ponto ('10,5' -> '10.5')."""
+    tokens = re.findall(r"\d+(?:[.,]\d+)?|[a-z0-9]+", remover_acentos(str(texto).lower()))
+    return " ".join(t.replace(",", ".") for t in tokens)
+
+
+def _alias(coluna, valor):
+    """Forma normalizada de um valor de coluna, como ele apareceria na pergunta."""
+    alias = normalizar(valor)
+    if coluna == "DRE":
+        alias = re.sub(r"^(?:diretoria regional de educacao|dre)\s+", "", alias)
+    return alias
+
+
+def _casas(valor):
+    """Casas decimais para exibir um limite digitado pelo usuário (10 -> 0, 10.5 -> 1)."""
+    return 0 if float(valor).is_integer() else 1
+
+
+def _num(valor, casas=1):
+    """Número no formato brasileiro (vírgula decimal, ponto de milhar)."""
+    texto = f"{valor:,.{casas}f}"
+    return texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _escolas(quantidade):
+    """'1 escola', '12 escolas'."""
+    return f"{_num(quantidade, 0)} escola{'' if quantidade == 1 else 's'}"
+
+
+# ================== Consulta ==================
+class ConsultaPainel:
+    """Intenção extraída da pergunta: filtros, limites numéricos, agrupamento e operação."""
+
+    def __init__(self):
+        self.filtros = {}  # coluna -> [valores]
+        self.zonas = []
+        self.limites = []  # [(coluna da métrica, operador, valor)]
+        self.categorias = []
+        self.agrupar = None
+        self.metrica = None  # 'velocidade' ou 'ideb' (None: não citada)
+        self.ordem = None  # 'desc', 'asc' ou None
+        self.operacao = "listar"  # 'listar', 'contar', 'media', 'ranking', 'correlacao'
+        self.n = N_PADRAO
+
+    @property
+    def tem_recorte(self):
+        return bool(self.filtros or self.zonas or self.limites or self.categorias)
+
+    def descrever(self):
+        """Recorte em texto (" do tipo EMEF na zona leste com velocidade abaixo de 10 Mbps"), ou ''."""
+        partes = []
+        for coluna in ("TIPOESC", "NOMES", "DRE", "SUBPREF", "DISTRITO", "BAIRRO"):
+            for valor in self.filtros.get(coluna, []):
+                prefixo = NOMES_COLUNA[coluna]
+                if _alias(coluna, valor) != normalizar(valor):  # O valor já traz o nome ("DRE - PENHA")
+                    prefixo = prefixo.split()[0]
+                partes.append(f"{prefixo} {valor}")
+        if self.zonas:
+            partes.append("na " + " e ".join(ROTULOS_ZONA[z].lower() for z in self.zonas))
+        if self.categorias:
+            partes.append("com velocidade na categoria " + " ou ".join(self.categorias))
+        for nome, operador, valor in self.limites:
+            unidade = " Mbps" if nome == "velocidade" else ""
+            valores = valor if operador == "entre" else (valor,)
+            numeros = " e ".join(_num(v, _casas(v)) for v in valores)
+            partes.append(f"com {METRICAS[nome][1]} {DESCRICAO_OPERADOR[operador]} {numeros}{unidade}")
+        return "".join(" " + parte for parte in partes)
+
+
+# ================== Motor ==================
+class MotorConsultas:
+    """Responde perguntas sobre as métricas do painel a partir do DataFrame de escolas.
+       Os vocabulários e as categorias são calculados uma vez por snapshot."""
+
+    def __init__(self, escolas):
+        self.escolas = escolas
+        velocidade = escolas["Velocidade_Internet"]
+        self.quartis = np.percentile(velocidade, [25, 50, 75])
+        self.categoria = pd.cut(velocidade, [-np.inf, *self.quartis, np.inf], labels=CATEGORIAS)
+        self.zona = self._zonas_das_escolas()
+
+        # Valor normalizado -> {coluna: valor original}, dos nomes mais longos para os mais curtos
+        vocabulario = {}
+        for coluna in COLUNAS_FILTRO:
+            if coluna not in escolas.columns:
+                continue
+            for valor in pd.unique(escolas[coluna].dropna()):
+                alias = _alias(coluna, valor)
+                if not alias or (coluna == "NOMES" and len(alias.split()) < 3):
+                    continue  # Nomes de escola só com o nome completo
+                vocabulario.setdefault(alias, {})[coluna] = valor
+                if coluna == "TIPOESC":
+                    vocabulario.setdefault(alias + "s", {})[coluna] = valor  # "EMEFs"
+        self._vocabulario = sorted(vocabulario.items(), key=lambda item: -len(item[0]))
+        self._palavras_conhecidas = SUBSTANTIVOS | {p for alias in vocabulario for p in alias.split()}
+
+    def _desconhecida(self, palavra):
+        """True se a palavra é um substantivo fora do que o motor trata (ex.: 'alunos', 'laboratorios')."""
+        return bool(palavra) and palavra not in STOPWORDS and palavra not in self._palavras_conhecidas \
+            and not palavra[0].isdigit()
+
+    def _zonas_das_escolas(self):
+        """Zona de cada escola, pela subprefeitura (ou, na falta dela, pela DRE)."""
+        zona = pd.Series(np.nan, index=self.escolas.index, dtype=object)
+        for coluna in ("SUBPREF", "DRE"):
+            if coluna not in self.escolas.columns:
+                continue
+            mapa = {}
+            for valor in pd.unique(self.escolas[coluna].dropna()):
+                texto = f" {_alias(coluna, valor)} "
+                for nome, prefixos in ZONAS.items():
+                    if any(texto.startswith(f" {p} ") for p in prefixos):
+                        mapa[valor] = nome
+                        break
+            faltantes = zona.isna()
+            zona[faltantes] = self.escolas.loc[faltantes, coluna].astype(object).map(mapa)
+        return zona
+
+    # ---------- Interpretação ----------
+    def interpretar(self, pergunta, base=None):
+        """Converte a pergunta em uma ConsultaPainel, ou None se não for uma pergunta sobre os dados.
+           Com `base` (a consulta da pergunta anterior), interpreta uma continuação ("e na zona sul?"):
+           o que a nova pergunta cita substitui o item correspondente da consulta anterior."""
+        texto = normalizar(pergunta)
+        if not texto or _CONCEITUAL.search(texto):
+            return None
+        contado = re.search(r"\b(?:quant[oa]s|numero de|total de) (\w+)", texto)
+        if contado and self._desconhecida(contado.group(1)):
+            return None  # "quantos alunos...": contagem de algo que não está nos dados do painel
+        consulta = ConsultaPainel()
+        restante = f" {texto} "
+
+        cita_ideb = " ideb " in restante
+        cita_velocidade = any(f" {p}" in restante for p in PALAVRAS_VELOCIDADE)
+        if cita_ideb and not cita_velocidade:
+            consulta.metrica = "ideb"
+        elif cita_velocidade:
+            consulta.metrica = "velocidade"
+
+        # Métrica explícita da média ("IDEB médio", "média de velocidade") prevalece
+        explicita = _METRICA_EXPLICITA.search(restante)
+        if explicita:
+            consulta.metrica = "ideb" if "ideb" in (explicita.group(1), explicita.group(2)) else "velocidade"
+
+        restante = self._extrair_limites(consulta, restante)
+        if restante is None:
+            return None
+        restante = self._extrair_categorias(consulta, restante)
+        restante = self._extrair_zonas(consulta, restante)
+        restante = self._extrair_valores(consulta, restante)
+
+        # Agrupamento: plural da dimensão ("quais distritos"), "qual <dimensão>" ou "por <dimensão>"
+        for palavra, coluna in AGRUPAMENTOS.items():
+            plural = palavra.endswith("s")
+            if ((plural and f" {palavra} " in restante)
+                    or any(f" {p} {palavra} " in restante for p in ("por", "qual", "que"))):
+                if coluna == "TIPOESC" and " escola" not in restante:
+                    continue
+                consulta.agrupar = coluna
+                break
+
+        quantidade = _QUANTIDADE.search(restante)
+        if quantidade:
+            consulta.n = max(1, min(int(quantidade.group(1) or quantidade.group(2)), 50))
+        if _CRESCENTE.search(restante):
+            consulta.ordem = "asc"
+        elif _DECRESCENTE.search(restante):
+            consulta.ordem = "desc"
+
+        if _CORRELACAO.search(restante) and cita_ideb and cita_velocidade:
+            consulta.operacao = "correlacao"
+        elif _CONTAGEM.search(restante):
+            consulta.operacao = "contar"
+        elif _MEDIA.search(restante) and consulta.metrica:
+            consulta.operacao = "media"
+        elif consulta.ordem and (consulta.metrica or consulta.agrupar):
+            consulta.operacao = "ranking"
+
+        if base is not None:
+            return self._continuar(base, consulta, quantidade is not None)
+        # Só responde localmente quando a pergunta cita os dados e pede algum recorte ou cálculo
+        tem_assunto = consulta.metrica or consulta.agrupar or " escola" in restante or "TIPOESC" in consulta.filtros
+        tem_operacao = consulta.tem_recorte or consulta.agrupar or consulta.operacao != "listar"
+        if not (tem_assunto and tem_operacao):
+            return None
+        if consulta.operacao == "listar" and not (consulta.metrica or consulta.tem_recorte):
+            return None
+        return consulta
+
+    @staticmethod
+    def _continuar(base, nova, trocou_quantidade):
+        """Consulta anterior com os itens citados na continuação; None se ela não cita nada dos dados."""
+        if not (nova.tem_recorte or nova.metrica or nova.agrupar or nova.ordem
+                or nova.operacao != "listar" or trocou_quantidade):
+            return None
+        consulta = copy.deepcopy(base)
+        if nova.zonas or any(coluna != "TIPOESC" for coluna in nova.filtros):
+            # Novo local ("e na zona sul?", "e no distrito Sé?") substitui o anterior
+            consulta.zonas = list(nova.zonas)
+            consulta.filtros = {c: v for c, v in consulta.filtros.items() if c == "TIPOESC"}
+        consulta.filtros.update(nova.filtros)
+        if nova.categorias:
+            consulta.categorias = list(nova.categorias)
+        if nova.limites:
+            trocadas = {nome for nome, _, _ in nova.limites}
+            consulta.limites = [l for l in consulta.limites if l[0] not in trocadas] + nova.limites
+        consulta.metrica = nova.metrica or consulta.metrica
+        consulta.agrupar = nova.agrupar or consulta.agrupar
+        consulta.ordem = nova.ordem or consulta.ordem
+        if trocou_quantidade:
+            consulta.n = nova.n
+        if nova.operacao != "listar":
+            consulta.operacao = nova.operacao
+        elif consulta.operacao == "listar" and consulta.ordem and (consulta.metrica or consulta.agrupar):
+            consulta.operacao = "ranking"
+        return consulta
+
+    def _extrair_limites(self, consulta, texto):
+        """Extrai os limites numéricos. Retorna None se algum limite não tiver métrica ao lado
+           (unidade ou palavra da métrica) ou se referir a um substantivo que o motor não trata."""
+        def metrica_de(palavras):
+            for palavra in reversed(palavras):  # A mais próxima do número
+                if palavra == "ideb":
+                    return "ideb"
+                if any(palavra == p or p.startswith(palavra + " ") for p in PALAVRAS_VELOCIDADE):
+                    return "velocidade"
+            return None
+
+        def metrica_do_limite(inicio, fim, unidade):
+            seguintes = texto[fim:].split()[:2]
+            if seguintes and self._desconhecida(seguintes[0]):
+                return None  # "mais de 2 laboratorios"
+            if unidade:
+                return "velocidade"
+            anteriores = [p for p in texto[:inicio].split() if p not in STOPWORDS and not p[0].isdigit()]
+            if seguintes and seguintes[0] in ("de", "do", "da", "no", "na"):
+                seguintes = seguintes[1:]  # "acima de 5 no IDEB"
+            return metrica_de(seguintes[:1]) or metrica_de(anteriores[-JANELA_METRICA:])
+
+        for m in re.finditer(_ENTRE, texto):
+            nome = metrica_do_limite(m.start(), m.end(), m.group(2) or m.group(4))
+            if nome is None:
+                return None
+            minimo, maximo = sorted((float(m.group(1)), float(m.group(3))))
+            consulta.limites.append((nome, "entre", (minimo, maximo)))
+        texto = re.sub(_ENTRE, " ", texto)
+
+        for padrao, operador in COMPARADORES:
+            regex = rf" {padrao} {_NUMERO}{_UNIDADE}\b"
+            for m in re.finditer(regex, texto):
+                nome = metrica_do_limite(m.start(), m.end(), m.group(2))
+                if nome is None:
+                    return None
+                valor = float(m.group(1))
+                consulta.limites.append((nome, operador, valor))
+            texto = re.sub(regex, " ", texto)
+        if consulta.limites and consulta.metrica is None:
+            consulta.metrica = consulta.limites[0][0]
+        return texto
+
+    def _extrair_categorias(self, consulta, texto):
+        regex = r" (?:categoria|velocidade|internet|conexao|conectividade)(?: de internet)? (muito baixa|baixa|alta)\b"
+        regex_categoria = r" categoria (media)\b"
+        for padrao in (regex, regex_categoria):
+            for m in re.finditer(padrao, texto):
+                nome = {"muito baixa": "Muito Baixa", "baixa": "Baixa", "media": "Média", "alta": "Alta"}[m.group(1)]
+                if nome not in consulta.categorias:
+                    consulta.categorias.append(nome)
+            texto = re.sub(padrao, " ", texto)
+        return texto
+
+    def _extrair_zonas(self, consulta, texto):
+        regex = r" (?:zona|regiao) (norte|sul|leste|oeste|central|centro)\b"
+        for m in re.finditer(regex, texto):
+            zona = "centro" if m.group(1) == "central" else m.group(1)
+            if zona not in consulta.zonas:
+                consulta.zonas.append(zona)
+        return re.sub(regex, " ", texto)
+
+    def _extrair_valores(self, consulta, texto):
+        for alias, colunas in self._vocabulario:
+            alvo = f" {alias} "
+            posicao = texto.find(alvo)
+            if posicao < 0:
+                continue
+            anteriores = [p for p in texto[:posicao].split() if p not in ("de", "da", "do", "na", "no")][-1:]
+            qualificada = [c for c in colunas if any(a.startswith(p) for p in COLUNAS_FILTRO[c] for a in anteriores)]
+            if qualificada:
+                coluna = qualificada[0]
+            elif alias in STOPWORDS or len(alias) < 3 or alias in ("sao paulo", "centro", "capital"):
+                continue  # Palavras comuns só valem como filtro com a dimensão explícita ("distrito Sé")
+            else:
+                coluna = next(c for c in PREFERENCIA_COLUNA if c in colunas)
+            valor = colunas[coluna]
+            consulta.filtros.setdefault(coluna, [])
+            if valor not in consulta.filtros[coluna]:
+                consulta.filtros[coluna].append(valor)
+            texto = texto.replace(alvo, " ", 1)
+        return texto
+
+    # ---------- Execução ----------
+    def filtrar(self, consulta, mascara=None):
+        """Aplica os filtros da consulta (sobre as escolas de `mascara`, se dada) e retorna o recorte."""
+        escolas = self.escolas
+        if mascara is None:
+            mascara = pd.Series(True, index=escolas.index)
+        else:
+            mascara = pd.Series(np.asarray(mascara, dtype=bool), index=escolas.index)
+        for coluna, valores in consulta.filtros.items():
+            mascara &= escolas[coluna].isin(valores)
+        if consulta.zonas:
+            mascara &= self.zona.isin(consulta.zonas)
+        if consulta.categorias:
+            mascara &= self.categoria.isin(consulta.categorias)
+        for nome, operador, valor in consulta.limites:
+            serie = escolas[METRICAS[nome][0]]
+            if operador == "entre":
+                mascara &= serie.between(*valor)
+            else:
+                mascara &= {"<": serie < valor, "<=": serie <= valor, ">": serie > valor, ">=": serie >= valor}[operador]
+        return escolas[mascara]
+
+    def responder(self, pergunta, base=None, mascara=None):
+        """Resposta em markdown, ou None se a pergunta não for sobre os dados do painel.
+           `base`: consulta da pergunta anterior, para perguntas de continuação."""
+        consulta = self.interpretar(pergunta, base)
+        if consulta is None:
+            return None
+        return self.responder_consulta(consulta, mascara)
+
+    def responder_consulta(self, consulta, mascara=None):
+        """Resposta em markdown para uma consulta já interpretada. Com `mascara` (booleana, alinhada a
+           `escolas`), responde só sobre essas escolas (os filtros aplicados no painel) e avisa disso."""
+        universo = self.escolas if mascara is None else self.escolas[np.asarray(mascara, dtype=bool)]
+        aviso = ""
+        if mascara is not None:
+            aviso = f"_Considerando só as {_escolas(len(universo))} dos filtros aplicados no painel._\n\n"
+        return aviso + self._responder(consulta, self.filtrar(consulta, mascara), universo, mascara is not None)
+
+    def _responder(self, consulta, recorte, universo, filtrado):
+        descricao = consulta.descrever()
+        if recorte.empty:
+            return f"Nenhuma escola encontrada{descricao}."
+
+        if consulta.operacao == "correlacao":
+            return self._responder_correlacao(recorte, descricao)
+        if consulta.agrupar:
+            return self._responder_agrupado(consulta, recorte, descricao)
+        if consulta.operacao == "contar":
+            return self._responder_contagem(recorte, descricao, universo, filtrado)
+        if consulta.operacao == "media":
+            return self._responder_media(consulta, recorte, descricao, universo, filtrado)
+        return self._responder_lista(consulta, recorte, descricao)
+
+    @staticmethod
+    def _resumo(recorte):
+        return (f"Velocidade média: {_num(recorte['Velocidade_Internet'].mean())} Mbps; "
+                f"IDEB médio: {_num(recorte['IDEB'].mean(), 2)}.")
+
+    def _responder_contagem(self, recorte, descricao, universo, filtrado):
+        total = len(universo)
+        return (f"Há **{_escolas(len(recorte))}**{descricao} "
+                f"({_num(100 * len(recorte) / total)}% das {_num(total, 0)} escolas "
+                f"{'filtradas' if filtrado else 'do painel'}).\n\n"
+                + self._resumo(recorte))
+
+    def _responder_media(self, consulta, recorte, descricao, universo, filtrado):
+        coluna, rotulo = METRICAS[consulta.metrica]
+        unidade = " Mbps" if consulta.metrica == "velocidade" else ""
+        casas = 1 if consulta.metrica == "velocidade" else 2
+        geral = universo[coluna].mean()
+        return (f"{rotulo[0].upper() + rotulo[1:]} {'médio' if consulta.metrica == 'ideb' else 'média'} das escolas{descricao}: "
+                f"**{_num(recorte[coluna].mean(), casas)}{unidade}** ({_escolas(len(recorte))}; "
+                f"média geral {'das escolas filtradas' if filtrado else 'do painel'}: {_num(geral, casas)}{unidade}).")
+
+    def _responder_correlacao(self, recorte, descricao):
+        if len(recorte) < 3:
+            return f"Há poucas escolas{descricao} para calcular a correlação."
+        r = recorte["IDEB"].corr(recorte["Velocidade_Internet"])
+        forca = abs(r)
+        intensidade = ("praticamente inexistente" if forca < 0.1 else "fraca" if forca < 0.3
+                       else "moderada" if forca < 0.5 else "forte")
+        sentido = "positiva" if r > 0 else "negativa"
+        linhas = [f"A correlação entre velocidade de internet e IDEB nas escolas{descricao} é **{_num(r, 2)}** "
+                  f"({intensidade}{'' if forca < 0.1 else ' e ' + sentido}; {_escolas(len(recorte))}).",
+                  "", "IDEB médio por categoria de velocidade:"]
+        medias = recorte.groupby(self.categoria.loc[recorte.index], observed=True)["IDEB"].agg(["mean", "size"])
+        for categoria, linha in medias.iterrows():
+            linhas.append(f"- {categoria}: {_num(linha['mean'], 2)} ({_escolas(linha['size'])})")
+        return "\n".join(linhas)
+
+    def _responder_agrupado(self, consulta, recorte, descricao):
+        if consulta.agrupar == "ZONA":
+            chave = self.zona.loc[recorte.index].map(ROTULOS_ZONA)
+        else:
+            chave = recorte[consulta.agrupar]
+        grupos = recorte.groupby(chave, observed=True).agg(
+            escolas=("IDEB", "size"), velocidade=("Velocidade_Internet", "mean"), ideb=("IDEB", "mean")
+        )
+        if consulta.operacao == "contar" and consulta.metrica is None:
+            coluna = "escolas"
+        else:
+            coluna = consulta.metrica or "velocidade"
+        grupos = grupos.sort_values(coluna, ascending=consulta.ordem == "asc").head(consulta.n)
+
+        rotulo = ROTULOS_AGRUPAMENTO[consulta.agrupar]
+        criterio = {"escolas": "número de escolas", "velocidade": "velocidade média", "ideb": "IDEB médio"}[coluna]
+        sentido = "menor" if consulta.ordem == "asc" else "maior"
+        recorte_texto = f" (escolas{descricao})" if descricao else ""
+        linhas = [f"{rotulo[0].upper() + rotulo[1:]} com {sentido} {criterio}{recorte_texto}:", ""]
+        for posicao, (nome, linha) in enumerate(grupos.iterrows(), start=1):
+            linhas.append(f"{posicao}. **{nome}** — {_num(linha['velocidade'])} Mbps, IDEB {_num(linha['ideb'], 2)} "
+                          f"({_escolas(linha['escolas'])})")
+        return "\n".join(linhas)
+
+    def _responder_lista(self, consulta, recorte, descricao):
+        coluna, rotulo = METRICAS[consulta.metrica or "velocidade"]
+        ascendente = consulta.ordem == "asc" or (
+            consulta.ordem is None and any(op in ("<", "<=") for _, op, _ in consulta.limites)
+        )
+        ordenadas = recorte.sort_values(coluna, ascending=ascendente).head(consulta.n)
+        total = len(recorte)
+        linhas = []
+        if consulta.tem_recorte:
+            linhas += [f"**{_escolas(total)}**{descricao}.", "", self._resumo(recorte), ""]
+        titulo = f"As {len(ordenadas)} escolas" if total > consulta.n else "Escolas"
+        linhas.append(f"{titulo} com {'menor' if ascendente else 'maior'} {rotulo}"
+                      f"{'' if consulta.tem_recorte else ' do painel'}:")
+        for _, escola in ordenadas.iterrows():
+            local = f" ({escola['DISTRITO']})" if "DISTRITO" in escola.index and pd.notna(escola["DISTRITO"]) else ""
+            linhas.append(f"- {escola['NOMES']}{local} — {_num(escola['Velocidade_Internet'])} Mbps, "
+                          f"IDEB {_num(escola['IDEB'], 2)}")
+        if consulta.tem_recorte and total > consulta.n:
+            linhas += ["", f"... e mais {_num(total - consulta.n, 0)}. Use os filtros do painel para vê-las no mapa."]
+        return "\n".join(linhas)
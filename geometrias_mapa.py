@@ -0,0 +1,125 @@
+# Geometrias dos mapas (distritos e municípios) pré-processadas em níveis de detalhe por zoom.
+# A etapa de build lê os arquivos originais uma única vez, simplifica os polígonos como uma cobertura
+# (as divisas compartilhadas entre distritos vizinhos continuam idênticas, sem buracos nem
+# sobreposições), reprojeta para EPSG:4326, quantiza as coordenadas e grava um GeoParquet por nível.
+# Em tempo de execução, o app só lê o nível adequado ao zoom, já pronto para o folium.
+#
+# Uso (gera os artefatos a partir dos arquivos originais):
+#     python geometrias_mapa.py
+import argparse  # Interface de linha de comando do build.
+import logging
+import os  # Manipulação de caminhos e troca atômica de arquivos.
+
+import geopandas as gpd  # Leitura/escrita de dados geoespaciais (GeoParquet).
+import numpy as np  # Cálculo das tolerâncias por zoom.
+import shapely  # Simplificação de coberturas e quantização de coordenadas.
+
+CAMINHO_DISTRITOS_SHP = "data/DEINFO_DISTRITO.shp"  # Caminho relativo
+CAMINHO_MUNICIPIOS_GEOJSON = "data/geojs-35-mun.json"  # Caminho relativo
+PASTA_GEOMETRIAS = "data/cache/geometrias"  # Artefatos gerados (um GeoParquet por camada e nível)
+EPSG_ORIGEM_DISTRITOS = 29193  # SAD69 / UTM 23S, projeção do shapefile da prefeitura
+EPSG_METRICO = 29193  # Projeção em metros usada para simplificar
+LATITUDE_REFERENCIA = -23.55  # São Paulo: escala (metros por pixel) usada nas tolerâncias
+
+# Zooms para os quais há um nível de detalhe; cada nível atende aos zooms até o seu valor
+ZOOMS_DETALHE = [10, 12, 14, 16]
+PIXELS_TOLERANCIA = 1.0  # Desvio máximo da simplificação, em pixels de tela
+PIXELS_QUANTIZACAO = 0.25  # Passo da grade de coordenadas, em pixels de tela
+
+logger = logging.getLogger(__name__)
+
+
+def metros_por_pixel(zoom, latitude=LATITUDE_REFERENCIA):
+    """Metros representados por um pixel de tela (tile de 256 px) no zoom e latitude informados."""
+    return 156543.03392 * np.cos(np.radians(latitude)) / 2 ** zoom
+
+
+def nivel_para_zoom(zoom):
+    """Nível de detalhe a usar no zoom: o mais simples que ainda não perde resolução na tela."""
+    for nivel in ZOOMS_DETALHE:
+        if zoom <= nivel:
+            return nivel
+    return ZOOMS_DETALHE[-1]
+
+
+def caminho_nivel(camada, nivel, pasta=PASTA_GEOMETRIAS):
+    return os.path.join(pasta, f"{camada}_z{nivel}.parquet")
+
+
+# ================== Leitura dos originais ==================
+def ler_distritos_originais(caminho=CAMINHO_DISTRITOS_SHP):
+    gdf = gpd.read_file(caminho)
+    if gdf.crs is None or gdf.crs.to_epsg() != EPSG_ORIGEM_DISTRITOS:
+        gdf = gdf.set_crs(epsg=EPSG_ORIGEM_DISTRITOS, allow_override=True)
+    # Converte colunas de data para string (serializáveis no GeoJSON do folium)
+    for col in gdf.select_dtypes(include=["datetime", "datetimetz"]).columns:
+        gdf[col] = gdf[col].dt.strftime("%Y-%m-%d")
+    return gdf
+
+
+def ler_municipios_originais(caminho=CAMINHO_MUNICIPIOS_GEOJSON):
+    return gpd.read_file(caminho, driver="GeoJSON")
+
+
+LEITORES = {
+    "distritos": ler_distritos_originais,
+    "municipios": ler_municipios_originais,
+}
+
+
+# ================== Build ==================
+def simplificar(gdf, zoom):
+    """Cópia em EPSG:4326 com a geometria simplificada (como cobertura) e quantizada para o zoom."""
+    metricos = gdf.to_crs(epsg=EPSG_METRICO)
+    tolerancia = metros_por_pixel(zoom) * PIXELS_TOLERANCIA
+    try:
+        geometrias = metricos.geometry.simplify_coverage(tolerancia)
+    except Exception:  # Polígonos que não formam uma cobertura válida: simplifica um a um
+        logger.warning("Cobertura inválida no zoom %s; simplificando cada polígono separadamente.", zoom)
+        geometrias = metricos.geometry.simplify(tolerancia, preserve_topology=True)
+    geometrias = geometrias.to_crs(epsg=4326)
+    # Graus por pixel (aprox. 111 km por grau) arredondados para uma potência de 10
+    grade = 10 ** np.floor(np.log10(metros_por_pixel(zoom) * PIXELS_QUANTIZACAO / 111_320))
+    resultado = gdf.to_crs(epsg=4326)
+    resultado.geometry = shapely.make_valid(shapely.set_precision(geometrias.values, grade))
+    return resultado
+
+
+def gerar_niveis(camada, gdf=None, pasta=PASTA_GEOMETRIAS, zooms=ZOOMS_DETALHE):
+    """Gera o GeoParquet de cada nível de detalhe da camada; devolve {nível: caminho}."""
+    gdf = LEITORES[camada]() if gdf is None else gdf
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = {}
+    for zoom in zooms:
+        caminho = caminho_nivel(camada, zoom, pasta)
+        caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+        simplificar(gdf, zoom).to_parquet(caminho_tmp)
+        os.replace(caminho_tmp, caminho)
+        caminhos[zoom] = caminho
+    return caminhos
+
+
+# ================== Leitura dos artefatos ==================
+def carregar_nivel(camada, zoom, pasta=PASTA_GEOMETRIAS):
+    """GeoDataFrame (EPSG:4326) da camada no nível de detalhe do zoom.
+       Se os artefatos ainda não existem, gera todos os níveis da camada (uma vez) antes de ler."""
+    caminho = caminho_nivel(camada, nivel_para_zoom(zoom), pasta)
+    if not os.path.exists(caminho):
+        logger.warning("Geometrias de '%s' não pré-processadas; gerando em %s.", camada, pasta)
+        gerar_niveis(camada, pasta=pasta)
+    return gpd.read_parquet(caminho)
+
+
+# ================== Linha de Comando ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera as geometrias simplificadas dos mapas (GeoParquet por zoom).")
+    parser.add_argument("--distritos", default=CAMINHO_DISTRITOS_SHP, help="Shapefile de distritos de origem")
+    parser.add_argument("--municipios", default=CAMINHO_MUNICIPIOS_GEOJSON, help="GeoJSON de municípios de origem")
+    parser.add_argument("--pasta", default=PASTA_GEOMETRIAS, help="Pasta de saída")
+    args = parser.parse_args()
+
+    for camada, gdf in (("distritos", ler_distritos_originais(args.distritos)),
+                        ("municipios", ler_municipios_originais(args.municipios))):
+        for nivel, caminho in gerar_niveis(camada, gdf, args.pasta).items():
+            coordenadas = shapely.get_num_coordinates(gpd.read_parquet(caminho).geometry.values).sum()
+            print(f"{camada} z{nivel}: {caminho} ({coordenadas} coordenadas)")
@@ -0,0 +1,69 @@
+# Histórico do chat limitado por número de turnos e por bytes, para sessões longas (ex.: quiosques
+# nas escolas). Os turnos mais antigos saem do histórico e, opcionalmente, ficam registrados em um
+# resumo arquivado compacto; a interface exibe só a página mais recente e carrega as anteriores sob demanda.
+import os  # Variáveis de ambiente.
+from collections import deque
+
+MAX_TURNOS = int(os.getenv("CHAT_MAX_TURNOS", "50"))
+MAX_BYTES = int(os.getenv("CHAT_MAX_BYTES", str(200 * 1024)))  # Perguntas + respostas, em UTF-8
+TURNOS_POR_PAGINA = 10
+MAX_PERGUNTAS_ARQUIVADAS = 10  # Perguntas citadas no resumo arquivado
+MAX_CARACTERES_PERGUNTA = 80
+
+
+def _tamanho(pergunta, resposta):
+    return len(pergunta.encode("utf-8")) + len(resposta.encode("utf-8"))
+
+
+class HistoricoChat:
+    """Turnos (pergunta, resposta) mais recentes da sessão, dentro dos limites de quantidade e bytes."""
+
+    def __init__(self, max_turnos=MAX_TURNOS, max_bytes=MAX_BYTES, arquivar_resumo=True):
+        self.max_turnos = max_turnos
+        self.max_bytes = max_bytes
+        self.arquivar_resumo = arquivar_resumo
+        self._turnos = deque()
+        self._bytes = 0
+        self.total_turnos = 0  # Inclui os turnos já descartados
+        self.arquivados = 0
+        self._perguntas_arquivadas = deque(maxlen=MAX_PERGUNTAS_ARQUIVADAS)
+
+    def __len__(self):
+        return len(self._turnos)
+
+    def __iter__(self):
+        return iter(self._turnos)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def adicionar(self, pergunta, resposta):
+        """Acrescenta um turno e descarta os mais antigos que excederem os limites."""
+        self._turnos.append((pergunta, resposta))
+        self._bytes += _tamanho(pergunta, resposta)
+        self.total_turnos += 1
+        # Mantém sempre o turno recém-adicionado, mesmo que sozinho passe do limite de bytes
+        while len(self._turnos) > 1 and (len(self._turnos) > self.max_turnos or self._bytes > self.max_bytes):
+            antiga, resposta_antiga = self._turnos.popleft()
+            self._bytes -= _tamanho(antiga, resposta_antiga)
+            self.arquivados += 1
+            if self.arquivar_resumo:
+                if len(antiga) > MAX_CARACTERES_PERGUNTA:
+                    antiga = antiga[:MAX_CARACTERES_PERGUNTA].rstrip() + "..."
+                self._perguntas_arquivadas.append(antiga)
+
+    def pagina(self, paginas=1, por_pagina=TURNOS_POR_PAGINA):
+        """Os `paginas * por_pagina` turnos mais recentes (em ordem cronológica) e quantos ficaram ocultos."""
+        visiveis = min(len(self._turnos), paginas * por_pagina)
+        inicio = len(self._turnos) - visiveis
+        return [self._turnos[i] for i in range(inicio, len(self._turnos))], inicio
+
+    def resumo_arquivado(self):
+        """Texto curto sobre os turnos descartados, ou None se nada foi arquivado."""
+        if not self.arquivados or not self.arquivar_resumo:
+            return None
+        texto = f"{self.arquivados} pergunta(s) anterior(es) arquivada(s) para manter o chat leve."
+        if self._perguntas_arquivadas:
+            texto += " Últimas: " + "; ".join(f"“{p}”" for p in self._perguntas_arquivadas)
+        return texto
@@ -2,20 +2,47 @@
 import streamlit as st  # Framework para criar aplicações web interativas de forma rápida.
 import pandas as pd  # Manipulação e análise de dados tabulares (DataFrames).
 import numpy as np  # Computação numérica eficiente com arrays multidimensionais.
-import geopandas as gpd  # Extensão do pandas para manipulação de dados geoespaciais.
 import folium  # Biblioteca para criar mapas interativos.
-from streamlit_folium import folium_static  # Integra mapas do folium com o Streamlit.
+import streamlit.components.v1 as components  # Exibe o HTML (em cache) dos mapas estáticos.
+from streamlit_folium import st_folium  # Integra mapas do folium com o Streamlit.
 from branca.colormap import linear  # Gera colormaps para visualizações em mapas.
 import plotly.express as px  # Cria gráficos interativos de forma simples e rápida.
 import plotly.graph_objects as go  # Cria gráficos personalizados e complexos com Plotly.
-import openai # Integração com a API da OpenAI para uso de modelos de IA
 import faiss  # Biblioteca para busca eficiente de vetores (útil para embeddings).
 import json  # Manipulação de dados no formato JSON.
 import os  # Interação com o sistema operacional (leitura de arquivos, variáveis de ambiente, etc.).
+import re  # Expressões regulares (contagem de palavras no streaming).
 from dotenv import load_dotenv  # Carrega variáveis de ambiente de um arquivo .env.
-import ast  # Converte strings para objetos Python (útil para embeddings armazenados como strings).
-import requests
-from io import StringIO
+from snapshot_escolas import AtualizadorEscolas, FonteIndisponivel  # Snapshot local do cadastro de escolas.
+from base_faq import BaseFAQ  # Base do FAQ compartilhada entre as sessões (Arrow mapeado em memória).
+from indice_faq import aplicar_parametros_busca, ler_metadados_indice  # Metadados do índice FAISS do FAQ.
+from recuperacao_faq import (  # Recuperação de passagens do FAQ (RAG).
+    K_PADRAO, ORCAMENTO_TOKENS_PADRAO, buscar_passagens, deduplicar_passagens, montar_contexto,
+)
+from busca_lexica import IndiceBM25, fundir_rrf  # Busca léxica (BM25) nas perguntas do FAQ.
+from provedores_embedding import PROVEDOR_PADRAO, caminho_por_provedor, obter_provedor  # Provedores de embedding.
+from cache_chatbot import CacheChatbot  # Cache persistente (SQLite) de embeddings e respostas.
+from cache_semantico import CacheSemantico, nomes_lugares  # Cache semântico das respostas do GPT.
+from lote_embeddings import AgrupadorEmbeddings  # Agrupamento de pedidos de embedding entre sessões.
+from cliente_llm import ClienteLLM, ErroLLM  # Cliente resiliente da OpenAI (prazos, tentativas, disjuntor, métricas).
+from consulta_painel import MotorConsultas  # Respostas sobre os dados do painel sem chamar o LLM.
+from cache_mapas import CacheMapas, assinatura  # Cache do HTML renderizado dos mapas, por visão.
+from camada_escolas import (  # Camadas GeoJSON do mapa das escolas.
+    AlternanciaPorZoom, camada_grade, camada_velocidade, feature_collection_escolas, feature_collection_grade
+)
+from geometrias_mapa import ZOOMS_DETALHE, carregar_nivel, nivel_para_zoom  # Geometrias simplificadas por nível de zoom.
+from tiles_vetoriais import (  # Tiles vetoriais (MVT) de distritos e escolas, servidos localmente.
+    TILES_VETORIAIS, camada_tiles_distritos, camada_tiles_escolas, gerar_tiles_distritos, gerar_tiles_escolas,
+    iniciar_servidor, popup_tiles_distritos, popup_tiles_escolas, url_tiles
+)
+from agregacao_espacial import (  # Grade agregada por zoom e índice espacial para a área visível do mapa.
+    NIVEIS_ZOOM, ZOOM_ESCOLAS, AgregadorEscolas, IndiceEspacial, alinhar_limites, enquadrar, expandir, limites_visao
+)
+from historico_chat import HistoricoChat  # Histórico do chat limitado (turnos/bytes) e paginado.
+from memoria_conversa import RESUMO_LLM, MemoriaConversa, criar_resumidor_llm, eh_continuacao  # Memória da conversa.
+from pipeline_especulativo import (  # GPT especulativo.
+    POLITICA_PADRAO, GeracaoEspeculativa, deve_especular, estatisticas as estatisticas_especulacao,
+)
 
 # Configurar o layout da página
 st.set_page_config(layout="wide", page_title="Conectividade das Escolas de São Paulo capital")
@@ -176,65 +203,37 @@ st.caption("Nota: Os dados aqui utilizados foram simulados. Não correspondem a
 # FUNÇÕES DE CARREGAMENTO DE DADOS  #
 #####################################
 
-@st.cache_data
+@st.cache_resource
+def obter_atualizador_escolas():
+    """Cria (uma vez por processo) o atualizador em segundo plano do snapshot de escolas."""
+    return AtualizadorEscolas().iniciar()
+
 def load_escolas():
-    url = ("http://dados.prefeitura.sp.gov.br/dataset/8da55b0e-b385-4b54-9296-d0000014ddd5/"
-           "resource/533188c6-1949-4976-ac4e-acd313415cd1/download/escolas122024.csv")
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                      "AppleWebKit/537.36 (KHTML, like Gecko) "
-                      "Chrome/114.0.0.0 Safari/537.36"
-    }
-    
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()  # Caso haja erro HTTP, lança exceção
-    
-    # Lê o CSV diretamente do conteúdo da resposta
-    df = pd.read_csv(StringIO(response.text), sep=";", encoding="ISO-8859-1", on_bad_lines='skip')
-    df.columns = df.columns.str.strip()
-    
-    # Ajustes adicionais que você já tinha
-    df['LATITUDE'] /= 1_000_000
-    df['LONGITUDE'] /= 1_000_000
-    
-    np.random.seed(42)
-    df['IDEB'] = np.random.uniform(3.0, 7.0, len(df))
-    df['Velocidade_Internet'] = np.random.uniform(1.0, 100.0, len(df))
-    
-    return df
+    """Retorna o último snapshot válido (escolas, versão), baixando o CSV apenas na primeira vez.
+       É lido uma única vez por execução: todos os caches usam a versão do próprio DataFrame."""
+    try:
+        return obter_atualizador_escolas().snapshot
+    except FonteIndisponivel as erro:
+        st.error(str(erro))
+        st.stop()
 
 @st.cache_data
-def load_distritos_shapefile():
-    shp_path = "data/DEINFO_DISTRITO.shp"  # Caminho relativo
-    gdf = gpd.read_file(shp_path)
-    if gdf.crs is None or gdf.crs.to_epsg() != 29193:
-        gdf.set_crs(epsg=29193, inplace=True)
-    gdf = gdf.to_crs(epsg=4326)
-    # Converte colunas de data para string
-    for col in gdf.select_dtypes(include=['datetime64']).columns:
-        gdf[col] = gdf[col].dt.strftime('%Y-%m-%d')
-    return gdf
-
-# Carregar os dados
-# Carregar o arquivo GeoJSON do Distrito de Sao Paulo
-sao_paulo_gdf = gpd.read_file("data/geojs-35-mun.json", driver="GeoJSON")
-escolas = load_escolas()
-distritos_gdf = load_distritos_shapefile()
+def load_distritos(zoom):
+    """Distritos (EPSG:4326) simplificados para o zoom, lidos dos artefatos de geometrias_mapa."""
+    return carregar_nivel("distritos", zoom)
+
+@st.cache_data
+def load_municipios(zoom):
+    """Limites municipais (GeoJSON do IBGE) simplificados para o zoom."""
+    return carregar_nivel("municipios", zoom)
+
+# Carregar os dados (DataFrame e versão do mesmo snapshot)
+escolas, versao_escolas = load_escolas()
 
 ####################################
 # FILTRAGEM E WIDGETS NA BARRA LATERAL
 ####################################
-st.sidebar.header("Filtros de Velocidade de Internet")
-
-# 1. Filtro de Velocidade (Slider)
-min_speed, max_speed = escolas['Velocidade_Internet'].min(), escolas['Velocidade_Internet'].max()
-speed_range = st.sidebar.slider(
-    "Selecione a faixa de Velocidade (Mbps)",
-    min_speed, max_speed, (min_speed, max_speed), step=0.5
-)
-
-# 2. Categorias de Velocidade (Calculadas a partir dos dados originais)
+# Categorias de Velocidade (Calculadas a partir dos dados originais)
 q1, q2, q3 = np.percentile(escolas['Velocidade_Internet'], [25, 50, 75]) #quartis
 # Cada categoria é definida com base na condição
 categoria_velocidade = {
@@ -244,98 +243,132 @@ categoria_velocidade = {
     "Alta": escolas['Velocidade_Internet'] > q3
 }
 
-selected_categories = st.sidebar.multiselect(
-    "Selecione as categorias de velocidade",
-    options=["Muito Baixa", "Baixa", "Média", "Alta"],
-    default=["Muito Baixa", "Baixa", "Média", "Alta"],
-)
+# Filtros interativos (colunas do DataFrame de escolas)
+filtros_disponiveis = ["DRE", "SUBPREF", "TIPOESC", "BAIRRO", "DISTRITO", "NOMES"]
 
-# Máscara global (aplicando velocidade e categorias) – esta máscara será usada para restringir todas as opções
-mask_speed = escolas['Velocidade_Internet'].between(speed_range[0], speed_range[1])
+def mascara_global(speed_range, selected_categories):
+    """Máscara de velocidade e categorias – restringe todas as opções dos demais filtros."""
+    mask_speed = escolas['Velocidade_Internet'].between(speed_range[0], speed_range[1])
 
-# Máscara de categorias de velocidade
-if not selected_categories:
-    # Se nenhuma categoria for selecionada, não aplicar filtro (todos os registros passam)
-    mask_cat = pd.Series(True, index=escolas.index)
-else:
-    mask_cat = pd.Series(False, index=escolas.index)
-    for cat in selected_categories:
-        if cat == "Muito Baixa":
-            mask_cat |= (escolas['Velocidade_Internet'] <= q1)
-        elif cat == "Baixa":
-            mask_cat |= ((escolas['Velocidade_Internet'] > q1) & (escolas['Velocidade_Internet'] <= q2))
-        elif cat == "Média":
-            mask_cat |= ((escolas['Velocidade_Internet'] > q2) & (escolas['Velocidade_Internet'] <= q3))
-        elif cat == "Alta":
-            mask_cat |= (escolas['Velocidade_Internet'] > q3)
-
-global_mask = mask_speed & mask_cat
-
-# Função auxiliar: retorna as opções disponíveis para a coluna 'col'
-# Aplicando a máscara global e, adicionalmente, filtrando pelos outros filtros já selecionados.
-def available_options(col, exclude_filter, current_filters):
-    mask = global_mask.copy()
-    # Para cada filtro (exceto o atual), se houver seleção, aplicar essa condição
-    for key, sel in current_filters.items():
-        if key != exclude_filter and sel:
-            mask &= escolas[key].isin(sel)
-    return sorted(escolas.loc[mask, col].unique())
-
-# Inicializar (ou obter) os valores atuais dos filtros interativos do session_state.
-# Se ainda não estiverem definidos, eles serão listas vazias.
-current_filters = {
-    "DRE": st.session_state.get("DRE", []),
-    "SUBPREF": st.session_state.get("SUBPREF", []),
-    "TIPOESC": st.session_state.get("TIPOESC", []),
-    "BAIRRO": st.session_state.get("BAIRRO", []),
-    "DISTRITO": st.session_state.get("DISTRITO", []),
-    "NOMES": st.session_state.get("NOMES", [])
-}
+    # Máscara de categorias de velocidade
+    if not selected_categories:
+        # Se nenhuma categoria for selecionada, não aplicar filtro (todos os registros passam)
+        mask_cat = pd.Series(True, index=escolas.index)
+    else:
+        mask_cat = pd.Series(False, index=escolas.index)
+        for cat in selected_categories:
+            mask_cat |= categoria_velocidade[cat]
+    return mask_speed & mask_cat
+
+def mascara_filtros(filtros):
+    """Máscara final combinando velocidade, categorias e os filtros interativos."""
+    mask = mascara_global(filtros["speed_range"], filtros["selected_categories"])
+    for col in filtros_disponiveis:
+        if filtros[col]:
+            mask &= escolas[col].isin(filtros[col])
+    return mask
+
+@st.cache_data(max_entries=32)
+def agregar_escolas_por_zoom(filtros, versao):
+    """Células da grade agregada, por nível de zoom, das escolas que passam pelos filtros.
+       Compartilhado entre as sessões; `versao` invalida o cache quando o snapshot muda."""
+    return AgregadorEscolas(escolas[mascara_filtros(filtros)]).niveis(NIVEIS_ZOOM)
+
+# Modo automático: os filtros rodam na execução completa do app e são aplicados nela mesma (uma
+# única execução por mudança). Modo manual: os filtros ficam em um fragmento – mexer neles reexecuta
+# só a barra lateral (opções em cascata e total de escolas) – e o painel só é redesenhado pelo botão
+# "Aplicar filtros". O painel sempre lê `filtros_aplicados`.
+def filtros_barra_lateral(em_fragmento=False):
+    st.header("Filtros de Velocidade de Internet")
+
+    # 1. Filtro de Velocidade (Slider)
+    min_speed, max_speed = escolas['Velocidade_Internet'].min(), escolas['Velocidade_Internet'].max()
+    speed_range = st.slider(
+        "Selecione a faixa de Velocidade (Mbps)",
+        min_speed, max_speed, (min_speed, max_speed), step=0.5, key="speed_range"
+    )
 
-# Calcular as opções disponíveis para cada filtro com base no global_mask e nos outros filtros:
-available_dre      = available_options("DRE", "DRE", current_filters)
-available_subpref  = available_options("SUBPREF", "SUBPREF", current_filters)
-available_tipoesc  = available_options("TIPOESC", "TIPOESC", current_filters)
-available_bairro   = available_options("BAIRRO", "BAIRRO", current_filters)
-available_distrito = available_options("DISTRITO", "DISTRITO", current_filters)
-available_nome     = available_options("NOMES", "NOMES", current_filters)
-
-# Criar os widgets de filtro com as opções calculadas e atualizar o session_state
-selected_dre = st.sidebar.multiselect("DRE", available_dre, default=current_filters["DRE"], key="DRE")
-selected_subpref = st.sidebar.multiselect("Subprefeitura", available_subpref, default=current_filters["SUBPREF"], key="SUBPREF")
-selected_tipoesc = st.sidebar.multiselect("Tipo de Escola", available_tipoesc, default=current_filters["TIPOESC"], key="TIPOESC")
-selected_bairro = st.sidebar.multiselect("Bairro", available_bairro, default=current_filters["BAIRRO"], key="BAIRRO")
-selected_distrito = st.sidebar.multiselect("Distrito", available_distrito, default=current_filters["DISTRITO"], key="DISTRITO")
-selected_nome = st.sidebar.multiselect("Nome da Escola", available_nome, default=current_filters["NOMES"], key="NOMES")
-
-# Atualiza o dicionário current_filters com as seleções atuais
-current_filters = {
-    "DRE": selected_dre,
-    "SUBPREF": selected_subpref,
-    "TIPOESC": selected_tipoesc,
-    "BAIRRO": selected_bairro,
-    "DISTRITO": selected_distrito,
-    "NOMES": selected_nome
-}
+    # 2. Categorias de Velocidade
+    selected_categories = st.multiselect(
+        "Selecione as categorias de velocidade",
+        options=["Muito Baixa", "Baixa", "Média", "Alta"],
+        default=["Muito Baixa", "Baixa", "Média", "Alta"],
+        key="selected_categories",
+    )
 
-# Construir a máscara final interativa combinando todos os filtros
-mask_interactive = global_mask.copy()
-if selected_dre:
-    mask_interactive &= escolas['DRE'].isin(selected_dre)
-if selected_subpref:
-    mask_interactive &= escolas['SUBPREF'].isin(selected_subpref)
-if selected_tipoesc:
-    mask_interactive &= escolas['TIPOESC'].isin(selected_tipoesc)
-if selected_bairro:
-    mask_interactive &= escolas['BAIRRO'].isin(selected_bairro)
-if selected_distrito:
-    mask_interactive &= escolas['DISTRITO'].isin(selected_distrito)
-if selected_nome:
-    mask_interactive &= escolas['NOMES'].isin(selected_nome)
-
-filtered_escolas = escolas[mask_interactive]
-
-st.sidebar.markdown(f"### Total de escolas filtradas: {len(filtered_escolas)}")
+    # Máscara global (aplicando velocidade e categorias) – esta máscara será usada para restringir todas as opções
+    global_mask = mascara_global(speed_range, selected_categories)
+
+    # Função auxiliar: retorna as opções disponíveis para a coluna 'col'
+    # Aplicando a máscara global e, adicionalmente, filtrando pelos outros filtros já selecionados.
+    def available_options(col, exclude_filter, current_filters):
+        mask = global_mask.copy()
+        # Para cada filtro (exceto o atual), se houver seleção, aplicar essa condição
+        for key, sel in current_filters.items():
+            if key != exclude_filter and sel:
+                mask &= escolas[key].isin(sel)
+        return sorted(escolas.loc[mask, col].unique())
+
+    # Inicializar (ou obter) os valores atuais dos filtros interativos do session_state.
+    # Se ainda não estiverem definidos, eles serão listas vazias.
+    current_filters = {filtro: st.session_state.get(filtro, []) for filtro in filtros_disponiveis}
+
+    # Calcular as opções disponíveis para cada filtro com base no global_mask e nos outros filtros:
+    available_dre      = available_options("DRE", "DRE", current_filters)
+    available_subpref  = available_options("SUBPREF", "SUBPREF", current_filters)
+    available_tipoesc  = available_options("TIPOESC", "TIPOESC", current_filters)
+    available_bairro   = available_options("BAIRRO", "BAIRRO", current_filters)
+    available_distrito = available_options("DISTRITO", "DISTRITO", current_filters)
+    available_nome     = available_options("NOMES", "NOMES", current_filters)
+
+    # Criar os widgets de filtro com as opções calculadas e atualizar o session_state
+    selected_dre = st.multiselect("DRE", available_dre, default=current_filters["DRE"], key="DRE")
+    selected_subpref = st.multiselect("Subprefeitura", available_subpref, default=current_filters["SUBPREF"], key="SUBPREF")
+    selected_tipoesc = st.multiselect("Tipo de Escola", available_tipoesc, default=current_filters["TIPOESC"], key="TIPOESC")
+    selected_bairro = st.multiselect("Bairro", available_bairro, default=current_filters["BAIRRO"], key="BAIRRO")
+    selected_distrito = st.multiselect("Distrito", available_distrito, default=current_filters["DISTRITO"], key="DISTRITO")
+    selected_nome = st.multiselect("Nome da Escola", available_nome, default=current_filters["NOMES"], key="NOMES")
+
+    # Filtros escolhidos nos widgets (ainda não necessariamente aplicados ao painel)
+    filtros = {
+        "speed_range": tuple(speed_range),
+        "selected_categories": list(selected_categories),
+        "DRE": selected_dre,
+        "SUBPREF": selected_subpref,
+        "TIPOESC": selected_tipoesc,
+        "BAIRRO": selected_bairro,
+        "DISTRITO": selected_distrito,
+        "NOMES": selected_nome
+    }
+
+    st.markdown(f"### Total de escolas filtradas: {int(mascara_filtros(filtros).sum())}")
+
+    automatico = st.toggle("Atualizar o painel a cada filtro", value=True, key="filtros_automaticos")
+    if "filtros_aplicados" not in st.session_state or (automatico and not em_fragmento):
+        st.session_state.filtros_aplicados = filtros  # O painel é desenhado em seguida, nesta execução
+    elif automatico:
+        # Modo automático ligado dentro do fragmento: passa para a execução completa
+        st.session_state.filtros_aplicados = filtros
+        st.rerun()
+    elif filtros != st.session_state.filtros_aplicados:
+        if st.button("Aplicar filtros", use_container_width=True):
+            st.session_state.filtros_aplicados = filtros
+            st.rerun()  # Redesenha o painel com os novos filtros
+        st.caption("Há filtros ainda não aplicados ao painel.")
+
+with st.sidebar:
+    if st.session_state.get("filtros_automaticos", True):
+        filtros_barra_lateral()
+    else:
+        st.fragment(filtros_barra_lateral)(em_fragmento=True)
+
+# Filtros efetivamente aplicados ao painel
+filtros_aplicados = st.session_state.filtros_aplicados
+speed_range = filtros_aplicados["speed_range"]
+selected_categories = filtros_aplicados["selected_categories"]
+filtros_ativos = any(filtros_aplicados[filtro] for filtro in filtros_disponiveis)
+mascara_aplicada = mascara_filtros(filtros_aplicados).to_numpy()
+filtered_escolas = escolas[mascara_aplicada]
 
 # CSS para ajustar os iframes dos mapas e os títulos
 st.markdown(
@@ -497,6 +530,233 @@ with col2:
 
 # =====================================================
 
+# --- Mapa das Escolas ---
+CENTRO_SP = (-23.5505, -46.6333)  # Coordenadas do centro de SP
+ZOOM_INICIAL = 11
+CHAVE_MAPA_ESCOLAS = "mapa_escolas"  # Chave do st_folium (limites e zoom devolvidos pelo navegador)
+
+@st.cache_resource(max_entries=2)
+def carregar_indice_espacial(_escolas, versao):
+    """Índice espacial das escolas, montado uma vez por snapshot e compartilhado entre as sessões."""
+    return IndiceEspacial(_escolas)
+
+indice_espacial = carregar_indice_espacial(escolas, versao_escolas)
+
+@st.cache_resource
+def iniciar_servidor_tiles():
+    """Servidor local dos tiles vetoriais (um por processo), ou None se não puder ser iniciado."""
+    try:
+        return iniciar_servidor()
+    except OSError:  # Porta ocupada (por outro processo do app ou por outro programa)
+        return None
+
+# Sem o servidor de tiles, os mapas voltam às camadas GeoJSON (e à grade/área visível)
+usar_tiles_vetoriais = TILES_VETORIAIS and iniciar_servidor_tiles() is not None
+if TILES_VETORIAIS and not usar_tiles_vetoriais:
+    st.warning("O servidor de tiles vetoriais não pôde ser iniciado (porta ocupada). "
+               "Os mapas usam as camadas GeoJSON.")
+
+@st.cache_resource(max_entries=2, show_spinner="Gerando os tiles vetoriais das escolas...")
+def url_tiles_escolas(_escolas, versao, quartis):
+    """URL dos tiles das escolas do snapshot (gerados uma vez por conteúdo de snapshot)."""
+    iniciar_servidor_tiles()
+    return url_tiles("escolas", gerar_tiles_escolas(_escolas, quartis))
+
+@st.cache_resource(show_spinner="Gerando os tiles vetoriais dos distritos...")
+def url_tiles_distritos():
+    iniciar_servidor_tiles()
+    return url_tiles("distritos", gerar_tiles_distritos())
+
+@st.cache_data
+def colecao_municipio(nivel):
+    """GeoJSON (dict) dos limites municipais, serializado uma vez por nível de detalhe."""
+    return load_municipios(nivel).to_geo_dict()
+
+def camada_municipio(zoom):
+    """Limites municipais no nível de detalhe do zoom."""
+    return folium.GeoJson(
+        colecao_municipio(nivel_para_zoom(zoom)),  # Limites do município (GeoJSON em cache)
+        name="Município de SP",
+        style_function=lambda x: {
+            'fillColor': '#808080',  # Cinza
+            'color': '#000000',      # Cor do contorno
+            'weight': 2,            # Espessura da linha
+            'fillOpacity': 0.2,      # 20% de transparência
+            'dashArray': '5, 5'      # Linha pontilhada
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=["name"],  # Campo com o nome do município
+            aliases=["Município:"],
+            localize=True
+        )
+    )
+
+def mapa_base_escolas(com_municipio=True):
+    """Mapa base (tema e, opcionalmente, limites do município no zoom inicial), sem as escolas."""
+    mapa = folium.Map(
+        location=list(CENTRO_SP),
+        zoom_start=ZOOM_INICIAL,         # Zoom inicial
+        tiles=tiles_map,                 # Estilo do mapa (definido pelo tema)
+        width='100%',                    # Largura total do container
+        height=600,                      # Altura fixa para alinhamento
+        prefer_canvas=True               # Desenha os círculos em canvas (mais leve que um SVG por escola)
+    )
+
+    # =====================================================
+    # CAMADA DO MUNICÍPIO DE SÃO PAULO
+    # =====================================================
+    if com_municipio:
+        camada_municipio(ZOOM_INICIAL).add_to(mapa)
+    return mapa
+
+def visao_mapa_escolas(mascara):
+    """Área a consultar: a devolvida pelo mapa após um arraste/zoom ou, quando os filtros mudam,
+       o enquadramento das escolas filtradas (uma subprefeitura não carrega a cidade inteira)."""
+    estado = st.session_state
+    retorno = estado.get(CHAVE_MAPA_ESCOLAS) or {}
+    limites_retorno = retorno.get("bounds") or {}
+    chave_filtros = json.dumps(filtros_aplicados, sort_keys=True, default=str)
+    if estado.get("visao_filtros") != chave_filtros:
+        pontos = escolas.loc[mascara, ["LATITUDE", "LONGITUDE"]].dropna()
+        centro, zoom = enquadrar(pontos["LATITUDE"], pontos["LONGITUDE"]) or (CENTRO_SP, ZOOM_INICIAL)
+        estado.visao_filtros = chave_filtros
+        estado.visao_retorno = limites_retorno  # O retorno anterior é de outro enquadramento: ignorado
+        estado.visao_mapa = {"centro": centro, "zoom_inicial": zoom, "zoom": zoom, "limites": limites_visao(centro, zoom)}
+    elif limites_retorno != estado.get("visao_retorno"):
+        estado.visao_retorno = limites_retorno
+        sudoeste, nordeste = limites_retorno.get("_southWest") or {}, limites_retorno.get("_northEast") or {}
+        limites = (sudoeste.get("lat"), sudoeste.get("lng"), nordeste.get("lat"), nordeste.get("lng"))
+        if None not in limites:
+            estado.visao_mapa = {**estado.visao_mapa, "zoom": int(retorno.get("zoom") or estado.visao_mapa["zoom"]),
+                                 "limites": limites}
+    return estado.visao_mapa
+
+@st.cache_data(max_entries=256)
+def dados_area_visivel(filtros, versao, modo_mapa, zoom, limites):
+    """Coleções GeoJSON da área visível (limites já alinhados à grade de tiles do zoom), compartilhadas
+       entre as sessões: arrastes e zooms que caem na mesma área reaproveitam as camadas já montadas.
+       Retorna {"grade": (nível, coleção) ou None, "categorias": {categoria: coleção}, "total": escolas}."""
+    sul, oeste, norte, leste = limites
+    if modo_mapa == "Grade agregada" and zoom < ZOOM_ESCOLAS:
+        nivel = min(max(zoom, NIVEIS_ZOOM[0]), NIVEIS_ZOOM[-1])
+        celulas = agregar_escolas_por_zoom(filtros, versao)[nivel]
+        celulas = celulas[celulas["latitude"].between(sul, norte) & celulas["longitude"].between(oeste, leste)]
+        return {"grade": (nivel, feature_collection_grade(celulas, (q1, q2, q3))), "categorias": {},
+                "total": int(celulas["escolas"].sum())}
+    posicoes = indice_espacial.consultar(limites, mascara_filtros(filtros))
+    escolas_visiveis = escolas.iloc[posicoes]
+    categorias = {}
+    for categoria, condicao in categoria_velocidade.items():
+        escolas_categoria = escolas_visiveis[condicao.to_numpy()[posicoes]]
+        if not escolas_categoria.empty:
+            categorias[categoria] = feature_collection_escolas(escolas_categoria)
+    return {"grade": None, "categorias": categorias, "total": len(posicoes)}
+
+# Modo "área visível": o navegador devolve os limites e o zoom a cada arraste, e só as escolas (ou células
+# da grade) dentro deles, com uma margem, são enviadas. Em um fragmento, para não reexecutar o painel todo.
+@st.fragment
+def mapa_escolas_area_visivel(mascara, modo_mapa):
+    visao = visao_mapa_escolas(mascara)
+    zoom = visao["zoom"]
+    limites = alinhar_limites(expandir(visao["limites"]), zoom)
+    dados = dados_area_visivel(filtros_aplicados, versao_escolas, modo_mapa, zoom, limites)
+
+    # Camadas atualizadas no mapa sem recriá-lo (feature_group_to_add), começando pelos limites
+    # municipais no nível de detalhe do zoom atual
+    grupo = folium.FeatureGroup(name="Município de SP")
+    camada_municipio(zoom).add_to(grupo)
+    grupos = [grupo]
+    if dados["grade"] is not None:
+        nivel, colecao = dados["grade"]
+        grupo = folium.FeatureGroup(name="Grade agregada")
+        camada_grade(colecao, nivel, (q1, q2, q3)).add_to(grupo)
+        grupos.append(grupo)
+    for categoria, colecao in dados["categorias"].items():
+        grupo = folium.FeatureGroup(name=f"Velocidade {categoria}")
+        camada_velocidade(colecao, categoria, control=False).add_to(grupo)
+        grupos.append(grupo)
+    total_visivel = dados["total"]
+
+    mapa = mapa_base_escolas(com_municipio=False)
+    st_folium(
+        mapa,
+        key=CHAVE_MAPA_ESCOLAS,
+        center=visao["centro"],
+        zoom=visao["zoom_inicial"],
+        feature_group_to_add=grupos,
+        layer_control=folium.LayerControl(position='topright'),
+        returned_objects=["bounds", "zoom"],  # Só arrastes e zoom reexecutam o fragmento
+        height=600,
+        use_container_width=True,
+    )
+    st.caption(f"{total_visivel} de {int(mascara.sum())} escolas filtradas carregadas (área visível).")
+    return mapa
+
+def construir_mapa_escolas(modo_mapa, tiles_escolas=None):
+    """Mapa estático das escolas filtradas: tiles vetoriais, grade agregada ou uma camada por categoria."""
+    # Cria o mapa base
+    mapa_escolas = mapa_base_escolas()
+
+    if tiles_escolas and modo_mapa == "Escolas":
+        # Tiles vetoriais: o navegador baixa só os tiles da área visível (com cache HTTP)
+        # e os filtros aplicados viram regras de estilo, sem reenviar os pontos
+        camada = camada_tiles_escolas(tiles_escolas, filtros_aplicados, filtros_disponiveis).add_to(mapa_escolas)
+        popup_tiles_escolas(camada).add_to(mapa_escolas)
+    elif modo_mapa == "Grade agregada":
+        # =====================================================
+        # GRADE AGREGADA (UMA CAMADA POR NÍVEL DE ZOOM)
+        # =====================================================
+        niveis = []
+        celulas_por_zoom = agregar_escolas_por_zoom(filtros_aplicados, versao_escolas)
+        for i, (zoom, celulas) in enumerate(celulas_por_zoom.items()):
+            zoom_min = 0 if i == 0 else zoom                    # O nível mais grosso vale para os zooms menores
+            camada = camada_grade(celulas, zoom, (q1, q2, q3)).add_to(mapa_escolas)
+            niveis.append((zoom_min, zoom, camada))
+        for categoria, condicao in categoria_velocidade.items():
+            # Escolas individuais só nos zooms altos (mesmas camadas por categoria do outro modo)
+            escolas_categoria = filtered_escolas[condicao.loc[filtered_escolas.index]]
+            if not escolas_categoria.empty:
+                camada = camada_velocidade(escolas_categoria, categoria, control=False).add_to(mapa_escolas)
+                niveis.append((ZOOM_ESCOLAS, 99, camada))
+        AlternanciaPorZoom(niveis).add_to(mapa_escolas)
+    else:
+        # =====================================================
+        # CAMADAS DE VELOCIDADE (UMA CAMADA GEOJSON POR CATEGORIA)
+        # =====================================================
+        for categoria, condicao in categoria_velocidade.items():
+            # Filtra escolas por categoria
+            escolas_categoria = filtered_escolas[condicao.loc[filtered_escolas.index]]
+
+            if not escolas_categoria.empty:
+                # Uma camada GeoJSON por categoria (raio e popup de cada escola definidos no navegador)
+                camada_velocidade(escolas_categoria, categoria).add_to(mapa_escolas)
+
+    # =====================================================
+    # CONTROLE DE CAMADAS
+    # =====================================================
+    folium.LayerControl(
+        position='topright'  # Posição do controle
+    ).add_to(mapa_escolas)
+    return mapa_escolas
+
+# --- Cache do HTML dos mapas estáticos ---
+@st.cache_resource
+def obter_cache_mapas():
+    """Cache do HTML renderizado dos mapas, compartilhado entre as sessões."""
+    return CacheMapas()
+
+cache_mapas = obter_cache_mapas()
+
+def exibir_mapa(nome, construir, **contexto):
+    """Exibe um mapa estático a partir do HTML em cache da visão atual (filtros aplicados, categorias,
+       faixa de velocidade, tema e versão dos dados, mais o `contexto`). `construir()` só é chamado
+       quando essa visão ainda não foi renderizada por nenhuma sessão."""
+    chave = assinatura(
+        mapa=nome, filtros=filtros_aplicados, tiles_map=tiles_map, versao=versao_escolas, **contexto
+    )
+    html = cache_mapas.obter_ou_renderizar(chave, construir)
+    components.html(html, height=510, width=700)  # Mesmas dimensões do folium_static
+
 # --- Layout dos Mapas ---
 # Organiza os mapas em duas colunas com proporção [2, 3]
 col_left, col_right = st.columns([2, 3])
@@ -507,82 +767,25 @@ with col_left:
     # Container principal para organização do layout
     with st.container():
         st.header("Localização das Escolas")
-        
-        # Cria o mapa base
-        mapa_escolas = folium.Map(
-            location=[-23.5505, -46.6333],  # Coordenadas do centro de SP
-            zoom_start=11,                   # Zoom inicial
-            tiles=tiles_map,                 # Estilo do mapa (definido pelo tema)
-            width='100%',                    # Largura total do container
-            height=600                       # Altura fixa para alinhamento
+        modo_mapa = st.radio(
+            "Exibição", ["Escolas", "Grade agregada"], horizontal=True, key="modo_mapa",
+            help=f"Na grade agregada, as escolas são agrupadas em células (quantidade, velocidade média e "
+                 f"IDEB médio) e só aparecem individualmente a partir do zoom {ZOOM_ESCOLAS}."
+        )
+        tiles_escolas = url_tiles_escolas(escolas, versao_escolas, (q1, q2, q3)) if usar_tiles_vetoriais else None
+        area_visivel = tiles_escolas is None and st.toggle(
+            "Carregar só a área visível", value=True, key="mapa_area_visivel",
+            help="Envia ao navegador apenas as escolas dentro da área exibida, atualizando ao arrastar ou dar zoom."
         )
 
-        # =====================================================
-        # CAMADA DO MUNICÍPIO DE SÃO PAULO
-        # =====================================================
-        folium.GeoJson(
-            sao_paulo_gdf,  # GeoDataFrame com os limites do município
-            name="Município de SP",
-            style_function=lambda x: {
-                'fillColor': '#808080',  # Cinza
-                'color': '#000000',      # Cor do contorno
-                'weight': 2,            # Espessura da linha
-                'fillOpacity': 0.2,      # 20% de transparência
-                'dashArray': '5, 5'      # Linha pontilhada
-            },
-            tooltip=folium.GeoJsonTooltip(
-                fields=["name"],  # Campo com o nome do município
-                aliases=["Município:"],
-                localize=True
+        if area_visivel:
+            mapa_escolas_area_visivel(mascara_aplicada, modo_mapa)
+        else:
+            # HTML em cache por visão: o mapa só é montado quando essa combinação ainda não foi renderizada
+            exibir_mapa(
+                "escolas", lambda: construir_mapa_escolas(modo_mapa, tiles_escolas),
+                modo_mapa=modo_mapa, tiles_escolas=tiles_escolas
             )
-        ).add_to(mapa_escolas)
-
-        # =====================================================
-        # CAMADAS DE VELOCIDADE (FEATURE GROUPS)
-        # =====================================================
-        for categoria, condicao in categoria_velocidade.items():
-            # Filtra escolas por categoria
-            escolas_categoria = filtered_escolas[condicao]
-            
-            if not escolas_categoria.empty:
-                # Cria grupo de camadas
-                feature_group = folium.FeatureGroup(name=f"Velocidade {categoria}")
-                
-                # Adiciona marcadores circulares
-                for _, row in escolas_categoria.iterrows():
-                    folium.CircleMarker(
-                        location=[row['LATITUDE'], row['LONGITUDE']],
-                        radius=(row['Velocidade_Internet'] / 10) * 1.01,  # Tamanho proporcional
-                        weight=0,               # Sem borda
-                        color=None,
-                        fill=True,
-                        fill_color='#fa4c4d' if categoria == "Muito Baixa" else 
-                                  '#ff7f0e' if categoria == "Baixa" else 
-                                  '#2ca02c' if categoria == "Média" else 
-                                  '#1f77b4',    # Cores por categoria
-                        fill_opacity=0.5,       # 50% de transparência
-                        popup=folium.Popup(     # Popup com informações
-                            f"""
-                            <b>{row['NOMES']}</b><br>
-                            IDEB: {row['IDEB']:.2f}<br>
-                            Velocidade: {row['Velocidade_Internet']:.2f} Mbps
-                            """,
-                            max_width=300
-                        ),
-                    ).add_to(feature_group)
-                
-                # Adiciona o grupo ao mapa
-                feature_group.add_to(mapa_escolas)
-
-        # =====================================================
-        # CONTROLE DE CAMADAS
-        # =====================================================
-        folium.LayerControl(
-            position='topright'  # Posição do controle
-        ).add_to(mapa_escolas)
-
-        # Renderiza o mapa
-        folium_static(mapa_escolas)
 
 # Coluna da direita: subdividida em duas (mapa de distritos e tabela de velocidade)
 with col_right:
@@ -593,80 +796,103 @@ with col_right:
 with mapa_col2:
     st.header("Velocidade de Internet por Distrito")
     
-    # 1. Processamento dos dados
-    velocidade_por_distrito = escolas.groupby('DISTRITO')['Velocidade_Internet'].mean().reset_index()
-    distritos_gdf = distritos_gdf.merge(
-        velocidade_por_distrito, left_on='NOME_DIST', right_on='DISTRITO', how='left'
-    )
-    distritos_gdf['Velocidade_Internet'].fillna(distritos_gdf['Velocidade_Internet'].mean(), inplace=True)
-
-    # 2. Criação do colormap
-    colormap = linear.Reds_09.scale(
-        distritos_gdf['Velocidade_Internet'].min(), 
-        distritos_gdf['Velocidade_Internet'].max()
-    )
-
-    # 3. Ajustes de tamanho do colormap
-    colormap.width = 350  # Largura da barra de cores
-    colormap.height = 40   # Altura da barra de cores
-
-    # 4. Criação do mapa
-    mapa_distritos = folium.Map(
-        location=[-23.5505, -46.6333],
-        zoom_start=10,
-        tiles=tiles_map,
-        width="100%",
-        height="600px"
-    )
-
-    # 5. Lógica de distritos destacados
-    filtros_disponiveis = ["DRE", "SUBPREF", "TIPOESC", "BAIRRO", "DISTRITO", "NOMES"]
-    filtros_ativos = any(st.session_state.get(filtro, []) for filtro in filtros_disponiveis)
+    # Distritos destacados (também usados na tabela ao lado)
     highlighted_distritos = (
         filtered_escolas['DISTRITO'].unique().tolist()
         if filtros_ativos and 'filtered_escolas' in globals()
         else []
     )
 
-    # 6. Estilo dos polígonos
-    def style_function(feature):
-        if feature['properties']['NOME_DIST'] in highlighted_distritos:
-            return {
-                'fillColor': colormap(feature['properties']['Velocidade_Internet']),
-                'color': 'black',
-                'weight': 2,
-                'fillOpacity': 0.9
-            }
-        else:
-            return {
-                'fillColor': colormap(feature['properties']['Velocidade_Internet']),
-                'color': 'black',
-                'weight': 0.5,
-                'fillOpacity': 0.5
-            }
+    def construir_mapa_distritos():
+        # 1. Processamento dos dados
+        velocidade_por_distrito = escolas.groupby('DISTRITO', observed=True)['Velocidade_Internet'].mean().reset_index()
 
-    # 7. Adiciona camada GeoJson
-    folium.GeoJson(
-        distritos_gdf,
-        name="Distritos",
-        tooltip=folium.GeoJsonTooltip(
-            fields=["NOME_DIST", "Velocidade_Internet"],
-            aliases=["Distrito:", "Velocidade Média (Mbps):"],
-           localize=True,
-            sticky=True,
-            labels=True,
-            style="background-color: white; color: black; font-size: 12px; padding: 5px;"
-        ),
-        style_function=style_function,
-        highlight_function=lambda x: {"fillColor": "yellow", "fillOpacity": 0.5},
-    ).add_to(mapa_distritos)
-
-    # 8. Configurações do colormap
-    colormap.caption = 'Velocidade Média de Internet (Mbps)'
-
-    # 9. Adiciona colormap ao mapa
-    colormap.add_to(mapa_distritos)
-    folium_static(mapa_distritos)
+        def com_velocidade(gdf):
+            gdf = gdf.merge(velocidade_por_distrito, left_on='NOME_DIST', right_on='DISTRITO', how='left')
+            gdf['Velocidade_Internet'] = gdf['Velocidade_Internet'].fillna(gdf['Velocidade_Internet'].mean())
+            return gdf
+
+        distritos = com_velocidade(load_distritos(10))  # Zoom inicial do mapa de distritos
+
+        # 2. Criação do colormap
+        colormap = linear.Reds_09.scale(
+            distritos['Velocidade_Internet'].min(), 
+            distritos['Velocidade_Internet'].max()
+        )
+
+        # 3. Ajustes de tamanho do colormap
+        colormap.width = 350  # Largura da barra de cores
+        colormap.height = 40   # Altura da barra de cores
+
+        # 4. Criação do mapa
+        mapa_distritos = folium.Map(
+            location=[-23.5505, -46.6333],
+            zoom_start=10,
+            tiles=tiles_map,
+            width="100%",
+            height="600px"
+        )
+
+        # 5. Estilo dos polígonos
+        def style_function(feature):
+            if feature['properties']['NOME_DIST'] in highlighted_distritos:
+                return {
+                    'fillColor': colormap(feature['properties']['Velocidade_Internet']),
+                    'color': 'black',
+                    'weight': 2,
+                    'fillOpacity': 0.9
+                }
+            else:
+                return {
+                    'fillColor': colormap(feature['properties']['Velocidade_Internet']),
+                    'color': 'black',
+                    'weight': 0.5,
+                    'fillOpacity': 0.5
+                }
+
+        # 6. Adiciona os distritos: tiles vetoriais, com cores e destaques aplicados no navegador, ou uma
+        #    camada GeoJson por nível de detalhe (o navegador mostra só a do zoom atual)
+        if usar_tiles_vetoriais:
+            camada = camada_tiles_distritos(
+                url_tiles_distritos(),
+                {nome: colormap(v) for nome, v in zip(distritos['NOME_DIST'], distritos['Velocidade_Internet'])},
+                highlighted_distritos,
+            ).add_to(mapa_distritos)
+            popup_tiles_distritos(
+                camada, dict(zip(distritos['NOME_DIST'], distritos['Velocidade_Internet']))
+            ).add_to(mapa_distritos)
+        else:
+            niveis_distritos = []
+            zooms_distritos = ZOOMS_DETALHE[:-1]  # O nível mais detalhado fica para o mapa com área visível
+            for i, nivel in enumerate(zooms_distritos):
+                camada = folium.GeoJson(
+                    com_velocidade(load_distritos(nivel)),
+                    name="Distritos",
+                    tooltip=folium.GeoJsonTooltip(
+                        fields=["NOME_DIST", "Velocidade_Internet"],
+                        aliases=["Distrito:", "Velocidade Média (Mbps):"],
+                       localize=True,
+                        sticky=True,
+                        labels=True,
+                        style="background-color: white; color: black; font-size: 12px; padding: 5px;"
+                    ),
+                    style_function=style_function,
+                    highlight_function=lambda x: {"fillColor": "yellow", "fillOpacity": 0.5},
+                ).add_to(mapa_distritos)
+                zoom_min = 0 if i == 0 else zooms_distritos[i - 1] + 1
+                zoom_max = 99 if i == len(zooms_distritos) - 1 else nivel
+                niveis_distritos.append((zoom_min, zoom_max, camada))
+            AlternanciaPorZoom(niveis_distritos).add_to(mapa_distritos)
+
+        # 7. Configurações do colormap
+        colormap.caption = 'Velocidade Média de Internet (Mbps)'
+
+        # 8. Adiciona colormap ao mapa
+        colormap.add_to(mapa_distritos)
+        return mapa_distritos
+
+    # HTML em cache por visão: o mapa só é montado quando essa combinação ainda não foi renderizada
+    exibir_mapa("distritos", construir_mapa_distritos, tiles_vetoriais=usar_tiles_vetoriais)
 
 # Tabela de Velocidade por Distrito (coluna da direita interna)
     with tabela_col:
@@ -697,7 +923,7 @@ with mapa_col2:
         st.markdown("**Velocidade Média por Distrito**")  # Usando markdown para o título
 
         # Agrupa os dados do DataFrame completo para calcular a média de velocidade por distrito
-        df_distritos = escolas.groupby('DISTRITO')['Velocidade_Internet'].mean().reset_index()
+        df_distritos = escolas.groupby('DISTRITO', observed=True)['Velocidade_Internet'].mean().reset_index()
 
         # Renomeia as colunas para facilitar a visualização na tabela
         df_distritos = df_distritos.rename(columns={'DISTRITO': 'Distrito', 'Velocidade_Internet': 'Velocidade'})
@@ -789,28 +1015,6 @@ fig.update_traces(
 # Exibir o gráfico no Streamlit
 st.plotly_chart(fig, use_container_width=True)
 
-####################################
-# INTERAÇÃO ENTRE MAPAS
-####################################
-def on_click_distrito(event):
-    distrito_selecionado = event['properties']['NOME_DIST']
-    st.session_state["selected_district"] = distrito_selecionado
-    st.write(f"Distrito Selecionado: {distrito_selecionado}")
-    escolas_no_distrito = filtered_escolas[filtered_escolas['DISTRITO'] == distrito_selecionado]
-    if not escolas_no_distrito.empty:
-        escola_selecionada = escolas_no_distrito.iloc[0]
-        folium.Marker([escola_selecionada['LATITUDE'], escola_selecionada['LONGITUDE']],
-                      popup="Escola Selecionada").add_to(mapa_escolas)
-        # folium_static(mapa_escolas)
-
-# Adicionar interação de clique nos distritos
-folium.GeoJson(
-    distritos_gdf,
-    name="Distritos",
-    tooltip=folium.GeoJsonTooltip(fields=["NOME_DIST"], aliases=["Distrito: "]),
-    on_click=on_click_distrito
-).add_to(mapa_distritos)
-
 ####################################
 # CHATBOT COM RAG - Versão Híbrida
 ####################################
@@ -818,56 +1022,77 @@ folium.GeoJson(
 # Lê a chave da OpenAI das variáveis de ambiente do Github
 openai_api_key = os.getenv('OPENAI_API_KEY')
 
-# Define a chave na biblioteca da OpenAI
-openai.api_key = openai_api_key
+# Cliente único da OpenAI para o processo (conexões reaproveitadas, prazos, tentativas e disjuntor)
+@st.cache_resource(show_spinner=False)
+def carregar_cliente_llm():
+    """Cria o cliente resiliente da OpenAI compartilhado por todas as sessões."""
+    return ClienteLLM(api_key=openai_api_key)
+
+cliente_llm = carregar_cliente_llm()
 
 # ================== Funções com Cache ======================================================
 #''' função st.cache_data no Streamlit serve para otimizar o desempenho de aplicativos web e
 #armazenando em cache. Isso evita que essas funções sejam executadas repetidamente, 
 #economizando tempo e recursos computacionais.'''
 # ================== Carregar FAQ ==================
-@st.cache_data(show_spinner=True)
+@st.cache_resource(show_spinner=True)
 def carregar_faq():
-    """Carrega o arquivo Parquet de perguntas e respostas do FAQ, se existirem."""
-    file_path = "data/faq_data.parquet"  # Caminho relativo
-
-    if os.path.exists(file_path):
-        faq_data = pd.read_parquet(file_path)  # Mudar para Parquet
-
-        # Se a coluna 'embedding' estiver armazenada como string, converter para lista
-        if 'embedding' in faq_data.columns:
-            faq_data['embedding'] = faq_data['embedding'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-    else:
-        st.error(f"O arquivo FAQ não foi encontrado no caminho: {file_path}")
-        faq_data = pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
-
-    return faq_data
-
-# ================== Carregar Embeddings ==================
-@st.cache_data(show_spinner=True)
-def carregar_embeddings():
-    """Carrega os embeddings pré-computados do FAQ, se existirem."""
+    """Abre a base de perguntas e respostas do FAQ, compartilhada (somente leitura) por todas as sessões."""
     try:
-        with open("data/faq_embeddings.json", "r", encoding="utf-8") as f:  # Caminho relativo
-            return json.load(f)
-    except FileNotFoundError:
+        return BaseFAQ.abrir()
+    except FileNotFoundError as e:
+        st.error(f"O arquivo FAQ não foi encontrado no caminho: {e}")
         return None
 
 # ================== Carregar FAISS Index ==================
 @st.cache_resource(show_spinner=True)
 def carregar_faiss_index(caminho):
-    """Carrega o índice FAISS, se existir."""
+    """Carrega o índice FAISS, se existir, aplicando os parâmetros de busca gravados pelo indice_faq.py."""
     if os.path.exists(caminho):
         index = faiss.read_index(caminho)  # Carrega o índice FAISS
+        aplicar_parametros_busca(index, ler_metadados_indice(caminho).get("parametros_busca"))
         return index
     else:
         return None
 # ================== Gerar Embeddings ==================
-@st.cache_data(show_spinner=True)
-def gerar_embedding(texto):
-    """Gera embeddings para um determinado texto usando OpenAI."""
-    response = openai.embeddings.create(input=texto, model="text-embedding-3-small")
-    return response.data[0].embedding
+@st.cache_resource(show_spinner=False)
+def carregar_provedor_embedding(nome):
+    """Instancia (uma vez por processo) o provedor de embedding configurado em PROVEDOR_EMBEDDING.
+       Provedores remotos recebem os pedidos de todas as sessões agrupados em lotes."""
+    provedor = obter_provedor(nome, cliente_llm)
+    return AgrupadorEmbeddings(provedor) if provedor.remoto else provedor
+
+provedor_embedding = carregar_provedor_embedding(PROVEDOR_PADRAO)
+
+@st.cache_resource(show_spinner=False)
+def carregar_cache_chatbot():
+    """Abre o cache persistente (SQLite) de embeddings e respostas, compartilhado entre as sessões."""
+    return CacheChatbot()
+
+cache_chatbot = carregar_cache_chatbot()
+
+@st.cache_resource(show_spinner=False)
+def carregar_cache_semantico(provedor):
+    """Abre o cache semântico de respostas do GPT (índice vetorial compartilhado entre as sessões)."""
+    return CacheSemantico(provedor)
+
+cache_semantico = carregar_cache_semantico(PROVEDOR_PADRAO)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def carregar_nomes_lugares(_escolas, versao):
+    """Lugares (DRE, subprefeitura, distrito, bairro) que precisam coincidir para reutilizar uma resposta."""
+    return nomes_lugares(_escolas)
+
+lugares_escolas = carregar_nomes_lugares(escolas, versao_escolas)
+
+def gerar_embedding(texto, provedor=PROVEDOR_PADRAO):
+    """Gera o embedding de um texto com o provedor configurado (OpenAI ou local),
+       reaproveitando o cache persistente para perguntas já vistas (forma normalizada)."""
+    embedding = cache_chatbot.obter_embedding(texto, provedor)
+    if embedding is None:
+        embedding = carregar_provedor_embedding(provedor).gerar([texto])[0]
+        cache_chatbot.salvar_embedding(texto, provedor, embedding)
+    return embedding
 # ================== Limitar Resposta ==================
 @st.cache_data(show_spinner=True)
 def limitar_resposta(resposta, max_palavras):
@@ -875,58 +1100,131 @@ def limitar_resposta(resposta, max_palavras):
     palavras = resposta.split()
     return ' '.join(palavras[:max_palavras]) + ('...' if len(palavras) > max_palavras else '')
 
-# ================== Inicialização do Session State ==================
-if "faq_data" not in st.session_state:
-    st.session_state.faq_data = carregar_faq() # Carrega o FAQ e armazena no session_state
+def limitar_stream(fragmentos, max_palavras):
+    """Versão em streaming de limitar_resposta: repassa os fragmentos até atingir max_palavras
+       e então encerra (o chamador fecha o stream, cancelando o restante da geração)."""
+    texto = ""
+    enviado = 0
+    for fragmento in fragmentos:
+        texto += fragmento
+        palavras = list(re.finditer(r"\S+", texto))
+        if len(palavras) > max_palavras:
+            # A palavra max_palavras + 1 começou: corta antes dela e encerra
+            corte = palavras[max_palavras].start()
+            yield texto[enviado:corte].rstrip() + '...'
+            return
+        # Segura a última palavra (pode estar incompleta) e os espaços finais até o próximo fragmento
+        if not palavras:
+            continue
+        limite = palavras[-1].end() if texto[-1].isspace() else palavras[-1].start()
+        if limite > enviado:
+            yield texto[enviado:limite]
+            enviado = limite
+    if len(texto) > enviado:
+        yield texto[enviado:]
 
-if "faq_embeddings" not in st.session_state:
-    st.session_state.faq_embeddings = carregar_embeddings()
+# ================== Inicialização do Session State ==================
+# A base do FAQ é um recurso do processo: todas as sessões leem o mesmo objeto, sem cópias
+faq_data = carregar_faq()
 
 if "faq_index" not in st.session_state:
-    faq_index_path = "data/faq_index.faiss"  # Caminho relativo
+    faq_index_path = caminho_por_provedor("data/faq_index.faiss", provedor_embedding.nome)  # Um índice por provedor
     st.session_state.faq_index = carregar_faiss_index(faq_index_path)
 
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    # O índice precisa ter sido construído com o mesmo provedor usado nas consultas
+    metadados_indice = ler_metadados_indice(faq_index_path)
+    provedor_indice = metadados_indice.get("provedor", "openai")
+    if st.session_state.faq_index is not None and provedor_indice != provedor_embedding.nome:
+        st.error(f"O índice FAISS foi construído com o provedor '{provedor_indice}', mas o chatbot usa '{provedor_embedding.nome}'.")
+        st.session_state.faq_index = None
+
+    # A pergunta é normalizada antes da busca e o limiar supõe vetores unitários (L2 ou produto interno)
+    st.session_state.faq_metrica = metadados_indice.get("metrica", "l2")
+    if st.session_state.faq_index is not None and not metadados_indice.get("normalizado", True):
+        st.error("O índice FAISS foi construído sem normalizar os vetores (--sem-normalizar). Reconstrua o índice normalizado.")
+        st.session_state.faq_index = None
+
+    # As respostas são lidas pela posição (id do FAISS); índice e base precisam estar alinhados
+    if faq_data is not None and st.session_state.faq_index is not None and not faq_data.alinhada_com(st.session_state.faq_index):
+        st.error("O índice FAISS não corresponde à base do FAQ (número de linhas diferente). Reconstrua o índice.")
+        st.session_state.faq_index = None
+
+# ================== Índice Léxico (BM25) ==================
+@st.cache_resource(show_spinner=True)
+def carregar_indice_lexico():
+    """Constrói, uma vez por processo, o índice BM25 sobre as perguntas do FAQ."""
+    if faq_data is None:
+        return None
+    return IndiceBM25(faq_data.tabela.column("pergunta").to_pylist())
+
+indice_lexico = carregar_indice_lexico()
+
+# ================== Recuperação de Passagens do FAQ ==================
+def recuperar_passagens_faq(pergunta_usuario, k=K_PADRAO):
+    """Busca os k vizinhos mais próximos da pergunta no FAQ (uma única busca no FAISS) e funde
+       o resultado com o ranking léxico (RRF). Retorna as passagens sem duplicatas."""
+    if faq_data is None:
+        return []
+
+    vetoriais = []
+    if st.session_state.faq_index is not None:
+        try:
+            embedding_pergunta = np.array(gerar_embedding(pergunta_usuario)).reshape(1, -1).astype(np.float32)
+        except ErroLLM:
+            embedding_pergunta = None  # API indisponível: segue apenas com a busca léxica
+        if embedding_pergunta is not None:
+            faiss.normalize_L2(embedding_pergunta)  # Normaliza o embedding da pergunta do usuário
+            vetoriais = buscar_passagens(st.session_state.faq_index, faq_data, embedding_pergunta, k,
+                                         st.session_state.faq_metrica)[0]
+
+    lexicos = indice_lexico.buscar(pergunta_usuario, k) if indice_lexico is not None else []
+
+    # Passagens só encontradas pela busca léxica não têm distância vetorial
+    por_id = {p['id']: p for p in vetoriais}
+    ordem = fundir_rrf([p['id'] for p in vetoriais], [i for i, _ in lexicos])[:k]
+    passagens = [
+        por_id.get(i) or {"id": i, "pergunta": faq_data.pergunta(i), "resposta": faq_data.resposta(i), "distancia": None}
+        for i in ordem
+    ]
+    return deduplicar_passagens(passagens)
+
+# ================== Busca Léxica no FAQ ==================
+def buscar_resposta_lexica(pergunta_usuario, max_palavras=150):
+    """Responde direto do FAQ quando a pergunta é quase idêntica a uma pergunta cadastrada,
+       sem nenhuma chamada à API de embeddings. Retorna None caso contrário."""
+    if indice_lexico is None:
+        return None
 
-if "embedding_cache" not in st.session_state:
-    st.session_state.embedding_cache = {}
+    id_faq = indice_lexico.correspondencia_confiante(pergunta_usuario)
+    if id_faq is None:
+        return None
 
-if "resposta_cache" not in st.session_state:
-    st.session_state.resposta_cache = {}
+    return limitar_resposta(faq_data.resposta(id_faq), max_palavras)
 
 # ================== Busca no FAQ com Similaridade ==================
-def buscar_resposta_faq(pergunta_usuario, max_palavras=150, limiar_distancia=0.3):
-    """Busca a resposta mais similar no FAQ com base em embeddings.
-       Retorna None se a distância for maior que o limiar."""
-    if pergunta_usuario in st.session_state.resposta_cache:
-        return st.session_state.resposta_cache[pergunta_usuario]
-
-    embedding_pergunta = np.array(gerar_embedding(pergunta_usuario)).reshape(1, -1).astype(np.float32)
-    faiss.normalize_L2(embedding_pergunta)  # Normaliza o embedding da pergunta do usuário
-
-    distancias, indices = st.session_state.faq_index.search(embedding_pergunta, k=1)  # Busca no índice FAISS
+def buscar_resposta_faq(pergunta_usuario, max_palavras=150, limiar_distancia=0.3, passagens=None):
+    """Busca a resposta mais similar no FAQ, primeiro pela busca léxica e depois por embeddings.
+       Retorna None se a distância for maior que o limiar (distância L2 ao quadrado entre vetores
+       unitários; em índices de produto interno, a similaridade já chega convertida)."""
+    if passagens is None:
+        resposta_lexica = buscar_resposta_lexica(pergunta_usuario, max_palavras)
+        if resposta_lexica:
+            return resposta_lexica
+        passagens = recuperar_passagens_faq(pergunta_usuario)
 
     # Se a distância for maior que o limiar, não há correspondência adequada no FAQ.
-    if distancias[0][0] > limiar_distancia:
-        st.session_state.resposta_cache[pergunta_usuario] = None
+    vetoriais = [p for p in passagens if p['distancia'] is not None]
+    melhor = min(vetoriais, key=lambda p: p['distancia'], default=None)
+    if melhor is None or melhor['distancia'] > limiar_distancia:
         return None
 
-    melhor_pergunta = st.session_state.faq_data.iloc[indices[0][0]]['pergunta']
-    melhor_resposta = st.session_state.faq_data[st.session_state.faq_data['pergunta'] == melhor_pergunta]['resposta'].values[0]
-    resposta_limitada = limitar_resposta(melhor_resposta, max_palavras)
-
-    st.session_state.resposta_cache[pergunta_usuario] = resposta_limitada
-    return resposta_limitada
+    melhor_resposta = melhor['resposta']  # Lida diretamente pelo id do FAISS
+    return limitar_resposta(melhor_resposta, max_palavras)
 
-# ================== Busca Híbrida ==================
-def buscar_resposta_hibrida(pergunta_usuario, max_palavras=150):
-    """Busca uma resposta híbrida, primeiro no FAQ e depois no GPT-3.5-Turbo."""
-    resposta_faq = buscar_resposta_faq(pergunta_usuario, max_palavras)
-    if resposta_faq:
-        return resposta_faq  # Se a similaridade for alta, retorna a resposta do FAQ
-    
-    # Se não encontrar uma correspondência adequada, consulta o GPT-3.5-Turbo
+# ================== Mensagens para o GPT ==================
+def montar_mensagens_gpt(pergunta_usuario, passagens, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO, memoria=None):
+    """Monta as mensagens da chamada ao GPT: instruções do assistente, passagens do FAQ (RAG),
+       a memória da conversa (resumo + turnos recentes) e a pergunta."""
     contexto = (
     "Você é um assistente educacional especializado em infraestrutura de internet escolar e educação em São Paulo. "
     "Sua missão é fornecer respostas precisas, detalhadas e fundamentadas em dados reais e referências confiáveis. "
@@ -951,16 +1249,161 @@ def buscar_resposta_hibrida(pergunta_usuario, max_palavras=150):
     "Utilize essas informações para elaborar respostas que esclareçam os desafios e avanços na conectividade das escolas de São Paulo, considerando tanto os aspectos técnicos quanto as necessidades e inovações na área da educação."
     )
 
-    resposta_gpt = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": contexto},
-            {"role": "user", "content": pergunta_usuario}
-        ],
-        max_tokens=max_palavras * 2
-    )
-    
-    return limitar_resposta(resposta_gpt.choices[0].message.content, max_palavras)
+    mensagens = [{"role": "system", "content": contexto}]
+
+    # Passagens recuperadas do FAQ (RAG), limitadas pelo orçamento de tokens
+    contexto_faq = montar_contexto(passagens, orcamento_tokens)
+    if contexto_faq:
+        mensagens.append({
+            "role": "system",
+            "content": "Trechos do FAQ relacionados à pergunta (use-os como base quando forem pertinentes):\n\n" + contexto_faq
+        })
+    # Conversa anterior, com tamanho limitado pelo orçamento da memória
+    if memoria is not None:
+        mensagens.extend(memoria.mensagens())
+    mensagens.append({"role": "user", "content": pergunta_usuario})
+    return mensagens
+
+def criar_stream_gpt(mensagens, max_palavras=150, cancelado=None):
+    """Abre a chamada em streaming ao GPT-3.5-Turbo (pelo cliente resiliente).
+       `cancelado`: evento que interrompe as tentativas (geração especulativa descartada)."""
+    return cliente_llm.criar_chat_stream(mensagens, modelo="gpt-3.5-turbo", max_tokens=max_palavras * 2,
+                                         cancelado=cancelado)
+
+def resposta_somente_faq(passagens, max_palavras=150):
+    """Resposta de contingência quando o GPT está indisponível (disjuntor aberto ou falha)."""
+    if passagens:
+        return ("O assistente está temporariamente indisponível. A resposta mais próxima no FAQ é: "
+                + limitar_resposta(passagens[0]['resposta'], max_palavras))
+    return "O assistente está temporariamente indisponível. Tente novamente em alguns instantes."
+
+def fragmentos_stream(stream):
+    """Extrai o texto de cada chunk do stream, fechando-o ao final (ou ao ser interrompido)."""
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    finally:
+        stream.close()  # Cancela a geração ao atingir o limite de palavras (ou se a sessão for interrompida)
+
+# ================== Consultas aos Dados do Painel ==================
+@st.cache_resource(show_spinner=False, max_entries=2)
+def carregar_motor_consultas(_escolas, versao):
+    """Motor de consultas sobre o snapshot de escolas (recriado quando a versão do snapshot muda)."""
+    return MotorConsultas(_escolas)
+
+motor_consultas = carregar_motor_consultas(escolas, versao_escolas)
+
+# ================== Busca Híbrida ==================
+def buscar_resposta_hibrida(pergunta_usuario, max_palavras=150, k=K_PADRAO, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO,
+                            politica_especulacao=POLITICA_PADRAO, memoria=None):
+    """Busca uma resposta híbrida, primeiro no FAQ e depois no GPT-3.5-Turbo,
+       enviando ao GPT as passagens mais próximas do FAQ como contexto.
+       Conforme a política, a chamada ao GPT começa em paralelo com a busca no FAQ (especulação)
+       e é cancelada se o FAQ responder.
+       Com `memoria`, o GPT recebe também o resumo e os turnos recentes da conversa.
+       É um gerador: produz a resposta em fragmentos, à medida que o GPT a gera (streaming)."""
+    # Pergunta de continuação ("e na zona sul?"): a resposta depende da conversa
+    continuacao = memoria is not None and len(memoria) > 0 and eh_continuacao(pergunta_usuario)
+
+    # Perguntas sobre as métricas do painel são respondidas com os próprios dados (sem FAQ nem GPT);
+    # uma continuação parte da consulta da pergunta anterior ("e na zona sul?" troca só a zona)
+    base = memoria.consulta_dados if continuacao else None
+    consulta_dados = motor_consultas.interpretar(pergunta_usuario, base)
+    if consulta_dados is None and base is not None:
+        consulta_dados = motor_consultas.interpretar(pergunta_usuario)  # Pergunta completa por si só
+    if memoria is not None:
+        memoria.consulta_dados = consulta_dados
+    if consulta_dados is not None:
+        # Com filtros aplicados no painel, a resposta considera só as escolas filtradas (e avisa)
+        yield motor_consultas.responder_consulta(consulta_dados, None if mascara_aplicada.all() else mascara_aplicada)
+        return
+
+    # Continuações não passam pelos caches de respostas nem pelas respostas diretas do FAQ,
+    # e a busca de passagens usa a pergunta completada pela anterior
+    consulta_faq = memoria.consulta_contextualizada(pergunta_usuario) if continuacao else pergunta_usuario
+
+    if not continuacao:
+        # Respostas já dadas (em qualquer sessão) saem do cache persistente, sem chamadas à API
+        resposta_cache = cache_chatbot.obter_resposta(pergunta_usuario, max_palavras)
+        if resposta_cache is not None:
+            yield resposta_cache
+            return
+
+        # Caminho rápido: pergunta quase idêntica a uma do FAQ, sem chamar a API de embeddings
+        resposta_lexica = buscar_resposta_lexica(pergunta_usuario, max_palavras)
+        if resposta_lexica:
+            cache_chatbot.salvar_resposta(pergunta_usuario, max_palavras, resposta_lexica)
+            yield resposta_lexica
+            return
+
+    # Especulação: inicia o GPT já com as passagens léxicas, sem esperar o embedding
+    # (sem nenhuma passagem léxica, o GPT espera as passagens da busca completa)
+    especulacao = None
+    falha_lexica = continuacao or indice_lexico is None or indice_lexico.falha_lexica(pergunta_usuario)
+    if not cliente_llm.indisponivel and deve_especular(politica_especulacao, falha_lexica):
+        passagens_lexicas = [
+            {"id": i, "pergunta": faq_data.pergunta(i), "resposta": faq_data.resposta(i), "distancia": None}
+            for i, _ in (indice_lexico.buscar(consulta_faq, k) if indice_lexico is not None else [])
+        ]
+        if passagens_lexicas:
+            mensagens = montar_mensagens_gpt(pergunta_usuario, passagens_lexicas, orcamento_tokens, memoria)
+            especulacao = GeracaoEspeculativa(
+                lambda cancelado: criar_stream_gpt(mensagens, max_palavras, cancelado), mensagens
+            )
+
+    try:
+        passagens = recuperar_passagens_faq(consulta_faq, k)
+        resposta_pronta = None
+        if not continuacao:
+            resposta_pronta = buscar_resposta_faq(pergunta_usuario, max_palavras, passagens=passagens)
+        embedding_pergunta = None
+        if not resposta_pronta and not continuacao:
+            # Pergunta parecida com outra já respondida pelo GPT: reutiliza a resposta (cache semântico)
+            try:
+                embedding_pergunta = gerar_embedding(pergunta_usuario)
+                resposta_pronta = cache_semantico.buscar(embedding_pergunta, pergunta_usuario, lugares_escolas)
+            except ErroLLM:
+                pass  # Sem embedding não há busca semântica; o GPT (ou o FAQ) responde
+    except Exception:
+        if especulacao is not None:
+            especulacao.cancelar()
+        raise
+
+    if resposta_pronta:
+        # FAQ ou cache semântico responderam: a geração especulativa é descartada
+        if especulacao is not None:
+            especulacao.cancelar()
+        cache_chatbot.salvar_resposta(pergunta_usuario, max_palavras, resposta_pronta)
+        yield resposta_pronta
+        return
+
+    # Se não encontrar uma correspondência adequada, consulta o GPT-3.5-Turbo
+    partes = []
+    deltas = None
+    try:
+        if especulacao is not None:
+            deltas = especulacao.fragmentos()  # Já em andamento (ou concluída) desde o início da busca
+        else:
+            mensagens = montar_mensagens_gpt(pergunta_usuario, passagens, orcamento_tokens, memoria)
+            deltas = fragmentos_stream(criar_stream_gpt(mensagens, max_palavras))
+        for fragmento in limitar_stream(deltas, max_palavras):
+            partes.append(fragmento)
+            yield fragmento
+    except ErroLLM:
+        # GPT indisponível (disjuntor aberto, prazo ou falhas seguidas): degrada para o FAQ
+        yield ("\n\n" if partes else "") + resposta_somente_faq(passagens, max_palavras)
+        return
+    finally:
+        if deltas is not None:
+            deltas.close()  # Encerra o stream se o limite de palavras foi atingido antes do fim
+
+    if continuacao:
+        return  # Resposta dependente do contexto desta conversa: não vai para os caches
+    resposta = "".join(partes)
+    cache_chatbot.salvar_resposta(pergunta_usuario, max_palavras, resposta)
+    if embedding_pergunta is not None:
+        cache_semantico.adicionar(pergunta_usuario, embedding_pergunta, resposta)
 
 # ================== CSS Consolidado ==================
 st.markdown(f"""
@@ -1063,54 +1506,102 @@ st.title("🤖Assistente analítico do painel")
 st.markdown('<div class="subtitulo">Este chatbot tem como objetivo fornecer informações e auxiliar na pesquisa sobre infraestrutura digital educacional.</div>', unsafe_allow_html=True)
 
 '''Este script cria a interface deo chatbot que atualiza apenas o container do chat (para maior responsividade), sem recarregar a página inteira.
-A mágica está no st.session_state (para armazenar o histórico) e no st.empty() (para atualizações dinâmicas).
-Quando o usuário envia uma pergunta, o chat exibe "Processando..." imediatamente e, após a resposta ser gerada, atualiza o conteúdo sem recarregar nada. '''
+A mágica está no st.fragment (só a seção do chat é reexecutada), no st.session_state (para armazenar o histórico) e no st.empty() (para atualizações dinâmicas).
+Quando o usuário envia uma pergunta, só o novo turno é desenhado (em streaming) abaixo da página mais recente do histórico, sem recarregar nada. '''
+
+# Inicializa o histórico do chat no session_state (limitado em turnos e bytes)
+if "historico_chat" not in st.session_state:
+    st.session_state.historico_chat = HistoricoChat()
+if "paginas_chat" not in st.session_state:
+    st.session_state.paginas_chat = 1  # Páginas de turnos antigos exibidas
+# Memória da conversa enviada ao GPT (resumo incremental guardado na sessão)
+if "memoria_conversa" not in st.session_state:
+    st.session_state.memoria_conversa = MemoriaConversa(
+        resumidor=criar_resumidor_llm(cliente_llm) if RESUMO_LLM else None
+    )
 
-# Inicializa o histórico do chat no session_state
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+def exibir_turno(user_message, bot_response):
+    st.write(f"**Você:** {user_message}")
+    st.write(f"**Chatbot:** {bot_response}")
+    st.write("---")
+
+def exibir_desempenho():
+    """Contadores do processo (todas as sessões), para acompanhar o custo e a eficácia do assistente
+       e dos caches."""
+    with st.expander("Desempenho do assistente"):
+        esp = estatisticas_especulacao.resumo()
+        st.caption(
+            f"Especulação do GPT: {esp['iniciadas']} iniciadas, {esp['aproveitadas']} aproveitadas, "
+            f"{esp['canceladas']} canceladas (~{esp['tokens_desperdicados']} tokens desperdiçados, "
+            f"{esp['tokens_por_cancelada']:.0f} por cancelamento)."
+        )
+        for tipo, dados in cache_chatbot.estatisticas().items():
+            st.caption(f"Cache de {tipo}s: {dados['taxa_acerto']:.0%} de acertos "
+                       f"({dados['acertos']} acertos, {dados['erros']} erros, {dados['remocoes']} remoções).")
+        mapas = cache_mapas.estatisticas()
+        st.caption(f"Cache de mapas: {mapas['taxa_acerto']:.0%} de acertos ({mapas['acertos']} acertos, "
+                   f"{mapas['erros']} erros, {mapas['remocoes']} remoções; {mapas['entradas']} mapas, "
+                   f"{mapas['bytes'] / 2**20:.1f} MB).")
+        disjuntor = cliente_llm.disjuntor.estado()
+        st.caption(f"API da OpenAI: disjuntor {disjuntor['situacao']} "
+                   f"({disjuntor['falhas_seguidas']} falhas seguidas).")
+        for operacao, dados in cliente_llm.metricas.resumo().items():
+            st.caption(
+                f"{operacao}: {dados['chamadas']} chamadas, {dados['erros']} erros, "
+                f"{dados['tentativas_extras']} tentativas extras, "
+                f"{dados['tokens_prompt']} + {dados['tokens_resposta']} tokens, latência p95 ≤ {dados['p95_ms']} ms."
+            )
 
-# Placeholder para o chat (posicionado em cima)
-chat_placeholder = st.empty()
+# O chat é um fragmento: "Enviar" reexecuta só esta seção, sem redesenhar mapas, gráficos e filtros
+@st.fragment
+def secao_chatbot():
+    historico = st.session_state.historico_chat
 
-# Entrada do usuário e botão (posicionados abaixo)
-user_input = st.text_area("Digite sua pergunta:", key="user_input", height=80)
-submit_button = st.button("Enviar")
+    # Área do chat (posicionada em cima), preenchida depois de ler a entrada do usuário
+    area_chat = st.container()
 
-# Processar a pergunta do usuário
-if submit_button and user_input:
-    # Adiciona a pergunta ao histórico
-    st.session_state.chat_history.append((user_input, "Processando..."))
-    
-    # Atualiza o placeholder do chat imediatamente (para mostrar "Processando...")
-    with chat_placeholder.container():
-        st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-        for user_message, bot_response in st.session_state.chat_history:
-            st.write(f"**Você:** {user_message}")
-            st.write(f"**Chatbot:** {bot_response}")
-            st.write("---")
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Simula o processamento da resposta (substitua pelo seu método real)
-    resposta = buscar_resposta_hibrida(user_input)  # Sua função aqui
-    
-    # Atualiza o histórico com a resposta final
-    st.session_state.chat_history[-1] = (user_input, resposta)
+    # Entrada do usuário e botão (posicionados abaixo)
+    user_input = st.text_area("Digite sua pergunta:", key="user_input", height=80)
+    submit_button = st.button("Enviar")
 
-    # Atualiza o placeholder do chat novamente (para mostrar a resposta final)
-    with chat_placeholder.container():
+    with area_chat:
         st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-        for user_message, bot_response in st.session_state.chat_history:
-            st.write(f"**Você:** {user_message}")
-            st.write(f"**Chatbot:** {bot_response}")
+
+        resumo = historico.resumo_arquivado()
+        if resumo:
+            st.caption(resumo)
+
+        # Só a página mais recente do histórico é desenhada; as anteriores, sob demanda
+        turnos, ocultos = historico.pagina(st.session_state.paginas_chat)
+        if ocultos and st.button(f"Mostrar mensagens anteriores ({ocultos})", key="mostrar_anteriores"):
+            st.session_state.paginas_chat += 1
+            turnos, ocultos = historico.pagina(st.session_state.paginas_chat)
+        for user_message, bot_response in turnos:
+            exibir_turno(user_message, bot_response)
+
+        # Processar a pergunta do usuário: apenas o novo turno é acrescentado abaixo do histórico
+        if submit_button and user_input:
+            partes_resposta = []
+
+            def fluxo_resposta():
+                """Repassa os fragmentos da resposta para a tela, guardando o texto completo."""
+                yield "**Chatbot:** "
+                for fragmento in buscar_resposta_hibrida(user_input, memoria=st.session_state.memoria_conversa):
+                    partes_resposta.append(fragmento)
+                    yield fragmento
+
+            # Exibe a nova resposta sendo escrita palavra a palavra (streaming)
+            st.write(f"**Você:** {user_input}")
+            st.write_stream(fluxo_resposta())
             st.write("---")
+
+            # Atualiza o histórico e a memória da conversa com a resposta final
+            resposta = "".join(partes_resposta)
+            historico.adicionar(user_input, resposta)
+            st.session_state.memoria_conversa.adicionar(user_input, resposta)
+
         st.markdown('</div>', unsafe_allow_html=True)
 
-# Renderização inicial do chat (fora do bloco de submit)
-with chat_placeholder.container():
-    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-    for user_message, bot_response in st.session_state.chat_history:
-        st.write(f"**Você:** {user_message}")
-        st.write(f"**Chatbot:** {bot_response}")
-        st.write("---")
-    st.markdown('</div>', unsafe_allow_html=True)
+    exibir_desempenho()
+
+secao_chatbot()
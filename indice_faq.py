@@ -0,0 +1,241 @@
+# Construção do índice FAISS do FAQ a partir da matriz de embeddings (data/faq_embeddings.npy).
+# Permite escolher o tipo de índice (Flat, IVF, HNSW ou IVF-PQ), grava os metadados de versão
+# ao lado do índice e compara recall@k e latência de cada tipo com a busca exata.
+#
+# Uso:
+#     python indice_faq.py --tipos flat ivf hnsw ivfpq --tipo-final hnsw
+#     python indice_faq.py --provedor local   # gera os embeddings locais e o índice correspondente
+import argparse  # Interface de linha de comando.
+import hashlib  # Hash do arquivo de origem dos embeddings.
+import json  # Metadados do índice.
+import os  # Manipulação de caminhos e troca atômica de arquivos.
+import time  # Medição de latência.
+from datetime import datetime, timezone
+
+import faiss  # Biblioteca para busca eficiente de vetores.
+import numpy as np  # Computação numérica.
+
+from base_faq import CAMINHO_EMBEDDINGS_NPY, BaseFAQ, carregar_matriz_embeddings, escrever_atomico
+from provedores_embedding import PROVEDOR_PADRAO, PROVEDORES, caminho_por_provedor, obter_provedor
+
+CAMINHO_INDICE = "data/faq_index.faiss"  # Caminho relativo
+TIPOS_INDICE = ["flat", "ivf", "hnsw", "ivfpq"]
+METRICAS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+PQ_NBITS = 8  # Bits por subquantizador (IVF-PQ): o treino exige pelo menos 2**nbits vetores
+
+
+# ================== Metadados ==================
+def caminho_metadados_indice(caminho_indice=CAMINHO_INDICE):
+    """Caminho do JSON de metadados gravado ao lado do índice."""
+    return os.path.splitext(caminho_indice)[0] + ".json"
+
+
+def ler_metadados_indice(caminho_indice=CAMINHO_INDICE):
+    """Lê os metadados de versão do índice. Retorna {} se não existirem."""
+    try:
+        with open(caminho_metadados_indice(caminho_indice), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def aplicar_parametros_busca(index, parametros):
+    """Aplica parâmetros de busca (nprobe, efSearch) gravados nos metadados."""
+    espaco = faiss.ParameterSpace()
+    for nome, valor in (parametros or {}).items():
+        espaco.set_index_parameter(index, nome, valor)
+
+
+def hash_arquivo(caminho, bloco=1 << 20):
+    """SHA-256 do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+# ================== Geração dos Embeddings ==================
+def gerar_matriz_embeddings(provedor, faq, caminho, lote=256):
+    """Gera com o provedor os embeddings de todas as perguntas do FAQ (na ordem das linhas)
+       e grava a matriz float32 em `caminho` (.npy), lote a lote."""
+    matriz = None
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    for inicio in range(0, len(faq), lote):
+        fim = min(inicio + lote, len(faq))
+        vetores = provedor.gerar([faq.pergunta(i) for i in range(inicio, fim)])
+        if matriz is None:
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            matriz = np.lib.format.open_memmap(caminho_tmp, mode="w+", dtype=np.float32,
+                                               shape=(len(faq), vetores.shape[1]))
+        matriz[inicio:fim] = vetores
+    matriz.flush()
+    del matriz
+    os.replace(caminho_tmp, caminho)
+
+
+# ================== Construção ==================
+def parametros_ivf(n, nlist=None, nbits=PQ_NBITS):
+    """(nlist, nbits) ajustados ao número de vetores: o k-means do IVF precisa de pelo menos
+       `nlist` vetores e o do PQ de pelo menos 2**nbits. Bases pequenas reduzem os dois."""
+    nlist = min(nlist or max(1, min(4096, int(4 * np.sqrt(n)))), n)
+    nbits = min(nbits, int(np.log2(n))) if n > 1 else 0
+    return nlist, nbits
+
+
+def construir_indice(vetores, tipo, metrica="l2", nlist=None, hnsw_m=32, pq_m=16):
+    """Constrói e treina um índice FAISS do tipo indicado sobre `vetores` (float32).
+       Lança ValueError se o tipo não puder ser construído com esses vetores."""
+    n, d = vetores.shape
+    metrica_faiss = METRICAS[metrica]
+    nlist, nbits = parametros_ivf(n, nlist)
+
+    if tipo == "flat":
+        index = faiss.IndexFlat(d, metrica_faiss)
+    elif tipo == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlat(d, metrica_faiss), d, nlist, metrica_faiss)
+    elif tipo == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m, metrica_faiss)
+    elif tipo == "ivfpq":
+        if d % pq_m != 0:
+            raise ValueError(f"A dimensão {d} precisa ser múltipla de pq_m={pq_m}.")
+        if nbits < 1:
+            raise ValueError(f"São necessários pelo menos 2 vetores para o IVF-PQ ({n} na base).")
+        index = faiss.IndexIVFPQ(faiss.IndexFlat(d, metrica_faiss), d, nlist, pq_m, nbits, metrica_faiss)
+    else:
+        raise ValueError(f"Tipo de índice desconhecido: {tipo}")
+
+    if not index.is_trained:
+        index.train(vetores)
+    index.add(vetores)
+    return index
+
+
+# ================== Avaliação ==================
+def avaliar_indice(index, consultas, vizinhos_exatos, k):
+    """Mede recall@k (contra a busca exata) e latência p50/p99 de consultas individuais."""
+    latencias = []
+    acertos = 0
+    for i in range(len(consultas)):
+        inicio = time.perf_counter()
+        _, indices = index.search(consultas[i:i + 1], k)
+        latencias.append(time.perf_counter() - inicio)
+        acertos += len(set(indices[0]) & set(vizinhos_exatos[i]))
+
+    latencias_ms = np.array(latencias) * 1000
+    return {
+        "recall": acertos / (len(consultas) * k),
+        "p50_ms": float(np.percentile(latencias_ms, 50)),
+        "p99_ms": float(np.percentile(latencias_ms, 99)),
+        "tamanho_mb": faiss.serialize_index(index).nbytes / 1e6,
+    }
+
+
+# ================== Gravação ==================
+def salvar_indice(index, caminho, metadados):
+    """Grava o índice e os metadados de versão (ambos por troca atômica, com temporários únicos:
+       construções simultâneas não disputam o mesmo arquivo)."""
+    escrever_atomico(caminho, lambda tmp: faiss.write_index(index, tmp))
+
+    def escrever_metadados(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(metadados, f, indent=2)
+
+    escrever_atomico(caminho_metadados_indice(caminho), escrever_metadados)
+
+
+# ================== Linha de Comando ==================
+def main():
+    parser = argparse.ArgumentParser(description="Constrói o índice FAISS do FAQ e compara tipos de índice.")
+    parser.add_argument("--provedor", choices=sorted(PROVEDORES), default=PROVEDOR_PADRAO,
+                        help="Provedor de embedding (cada provedor tem seu próprio índice)")
+    parser.add_argument("--embeddings", default=None,
+                        help="Matriz .npy de embeddings (padrão: a do provedor; gerada se não existir)")
+    parser.add_argument("--saida", default=None, help="Arquivo do índice FAISS (padrão: o do provedor)")
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS_INDICE, default=TIPOS_INDICE,
+                        help="Tipos de índice a avaliar")
+    parser.add_argument("--tipo-final", choices=TIPOS_INDICE, default="flat",
+                        help="Tipo de índice gravado em --saida")
+    parser.add_argument("--metrica", choices=sorted(METRICAS), default="l2")
+    parser.add_argument("--sem-normalizar", action="store_true", help="Não normaliza os vetores (L2); o chatbot só aceita índices normalizados")
+    parser.add_argument("--k", type=int, default=10, help="k usado no recall@k")
+    parser.add_argument("--consultas", type=int, default=1000, help="Número de consultas de avaliação")
+    parser.add_argument("--ruido", type=float, default=0.3,
+                        help="Perturbação das consultas de avaliação (norma do ruído / norma do vetor)")
+    parser.add_argument("--nlist", type=int, default=None, help="Listas invertidas (IVF/IVF-PQ)")
+    parser.add_argument("--nprobe", type=int, default=16, help="Listas visitadas na busca (IVF/IVF-PQ)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Vizinhos por nó (HNSW)")
+    parser.add_argument("--ef-search", type=int, default=64, help="Largura da busca (HNSW)")
+    parser.add_argument("--pq-m", type=int, default=16, help="Subquantizadores (IVF-PQ)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.embeddings = args.embeddings or caminho_por_provedor(CAMINHO_EMBEDDINGS_NPY, args.provedor)
+    args.saida = args.saida or caminho_por_provedor(CAMINHO_INDICE, args.provedor)
+
+    if not os.path.exists(args.embeddings):
+        print(f"Gerando embeddings das perguntas do FAQ com o provedor '{args.provedor}'...")
+        gerar_matriz_embeddings(obter_provedor(args.provedor), BaseFAQ.abrir(), args.embeddings)
+    matriz = carregar_matriz_embeddings(args.embeddings)
+
+    vetores = np.array(matriz, dtype=np.float32, order="C")  # Cópia em memória (o FAISS normaliza in-place)
+    normalizar = not args.sem_normalizar
+    if normalizar:
+        faiss.normalize_L2(vetores)
+
+    # Consultas de avaliação: vetores da base perturbados com ruído gaussiano, comparados à busca
+    # exata. Consultas idênticas a vetores indexados inflariam o recall (o próprio vetor é sempre achado).
+    rng = np.random.default_rng(args.seed)
+    amostra = rng.choice(len(vetores), size=min(args.consultas, len(vetores)), replace=False)
+    ruido = rng.standard_normal((len(amostra), vetores.shape[1])).astype(np.float32)
+    ruido *= args.ruido * np.linalg.norm(vetores[amostra], axis=1, keepdims=True) / np.linalg.norm(ruido, axis=1, keepdims=True)
+    consultas = vetores[amostra] + ruido
+    if normalizar:
+        faiss.normalize_L2(consultas)
+    k = min(args.k, len(vetores))
+    exato = faiss.IndexFlat(vetores.shape[1], METRICAS[args.metrica])
+    exato.add(vetores)
+    _, vizinhos_exatos = exato.search(consultas, k)
+
+    parametros = {
+        "ivf": {"nprobe": args.nprobe},
+        "ivfpq": {"nprobe": args.nprobe},
+        "hnsw": {"efSearch": args.ef_search},
+    }
+
+    nlist, nbits = parametros_ivf(len(vetores), args.nlist)
+    if (args.nlist and nlist < args.nlist) or nbits < PQ_NBITS:
+        print(f"Base com {len(vetores)} vetores: IVF com nlist={nlist} e IVF-PQ com {nbits} bits por código.")
+
+    print(f"{'tipo':<8}{'recall@' + str(k):>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'tamanho (MB)':>15}")
+    indice_final = None
+    for tipo in dict.fromkeys(args.tipos + [args.tipo_final]):
+        try:
+            index = construir_indice(vetores, tipo, args.metrica, args.nlist, args.hnsw_m, args.pq_m)
+        except ValueError as erro:
+            if tipo == args.tipo_final:
+                parser.error(f"não foi possível construir o índice '{tipo}': {erro}")
+            print(f"{tipo:<8}ignorado: {erro}")
+            continue
+        aplicar_parametros_busca(index, parametros.get(tipo))
+        r = avaliar_indice(index, consultas, vizinhos_exatos, k)
+        print(f"{tipo:<8}{r['recall']:>12.4f}{r['p50_ms']:>12.3f}{r['p99_ms']:>12.3f}{r['tamanho_mb']:>15.1f}")
+        if tipo == args.tipo_final:
+            indice_final = index  # Os demais são descartados para não acumular memória
+
+    metadados = {
+        "tipo": args.tipo_final,
+        "provedor": args.provedor,
+        "dimensao": int(vetores.shape[1]),
+        "metrica": args.metrica,
+        "normalizado": normalizar,
+        "linhas": int(vetores.shape[0]),
+        "hash_origem": hash_arquivo(args.embeddings),
+        "parametros_busca": parametros.get(args.tipo_final, {}),
+        "criado_em": datetime.now(timezone.utc).isoformat(),
+    }
+    salvar_indice(indice_final, args.saida, metadados)
+    print(f"Índice '{args.tipo_final}' gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Agrupamento de pedidos de embedding entre sessões concorrentes.
+# Os pedidos que chegam dentro de uma janela curta (alguns milissegundos) são enviados em uma
+# única chamada `embeddings.create(input=[...])`, e perguntas idênticas em andamento compartilham
+# o mesmo pedido (singleflight). Reduz o número de requisições e os erros de limite de taxa no pico.
+# Até MAX_LOTES_SIMULTANEOS lotes ficam em voo ao mesmo tempo; enquanto todos estão ocupados, os
+# novos pedidos se acumulam no próximo lote.
+import os  # Variáveis de ambiente.
+import threading  # Thread de despacho dos lotes.
+import time  # Janela de agrupamento.
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as TempoEsgotado
+
+from cache_chatbot import normalizar_pergunta
+from cliente_llm import PRAZO_EMBEDDING, ErroLLM
+
+JANELA_MS = float(os.getenv("JANELA_LOTE_EMBEDDINGS_MS", "5"))
+MAX_LOTE = 64  # Máximo de textos por chamada
+MAX_LOTES_SIMULTANEOS = int(os.getenv("LOTES_EMBEDDINGS_SIMULTANEOS", "4"))  # Chamadas em voo ao mesmo tempo
+TEMPO_MAXIMO = PRAZO_EMBEDDING + 5.0  # Segundos que uma sessão espera pelo seu vetor (fila + chamada)
+
+
+class AgrupadorEmbeddings:
+    """Envolve um provedor de embedding e agrupa os pedidos concorrentes em lotes."""
+
+    def __init__(self, provedor, janela_ms=JANELA_MS, max_lote=MAX_LOTE,
+                 max_simultaneos=MAX_LOTES_SIMULTANEOS, tempo_maximo=TEMPO_MAXIMO):
+        self.provedor = provedor
+        self.nome = provedor.nome
+        self.janela = janela_ms / 1000
+        self.max_lote = max_lote
+        self.tempo_maximo = tempo_maximo
+        self._vagas = threading.BoundedSemaphore(max_simultaneos)  # Lotes em voo
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneos, thread_name_prefix="lote-embeddings-envio")
+        self._condicao = threading.Condition()
+        self._pendentes = []  # [(chave, texto)] aguardando o próximo lote
+        self._em_andamento = {}  # chave -> Future (pendentes ou no lote sendo enviado)
+        self._thread = None
+        self.chamadas = 0  # Chamadas efetivas ao provedor
+        self.pedidos = 0  # Pedidos recebidos das sessões
+
+    def _iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._despachar, name="lote-embeddings", daemon=True)
+            self._thread.start()
+
+    def gerar(self, textos):
+        """Mesma interface do provedor: devolve os embeddings dos textos (lista de vetores)."""
+        futuros = [self._pedir(texto) for texto in textos]
+        limite = time.monotonic() + self.tempo_maximo
+        try:
+            return [futuro.result(timeout=max(0.0, limite - time.monotonic())) for futuro in futuros]
+        except TempoEsgotado as erro:
+            raise ErroLLM(f"Embedding não retornado em {self.tempo_maximo:.0f} s.") from erro
+
+    def _pedir(self, texto):
+        chave = normalizar_pergunta(texto)
+        with self._condicao:
+            self.pedidos += 1
+            futuro = self._em_andamento.get(chave)
+            if futuro is None:  # Ninguém pediu este texto ainda: entra no próximo lote
+                futuro = Future()
+                self._em_andamento[chave] = futuro
+                self._pendentes.append((chave, texto))
+                self._iniciar()
+                self._condicao.notify()
+            return futuro
+
+    def _despachar(self):
+        while True:
+            with self._condicao:
+                while not self._pendentes:
+                    self._condicao.wait()
+            time.sleep(self.janela)  # Espera outros pedidos chegarem para o mesmo lote
+            self._vagas.acquire()  # Todos os lotes em voo: os pedidos seguem se acumulando
+            with self._condicao:
+                lote = self._pendentes[:self.max_lote]
+                del self._pendentes[:self.max_lote]
+            self._executor.submit(self._enviar, lote)
+
+    def _enviar(self, lote):
+        resultados = []
+        try:
+            vetores = self.provedor.gerar([texto for _, texto in lote])
+            with self._condicao:
+                self.chamadas += 1
+            if len(vetores) != len(lote):
+                raise ErroLLM(f"O provedor devolveu {len(vetores)} embeddings para {len(lote)} textos.")
+            resultados = [(chave, vetor, None) for (chave, _), vetor in zip(lote, vetores)]
+        except Exception as erro:
+            resultados = [(chave, None, erro) for chave, _ in lote]
+        finally:
+            self._vagas.release()
+            # Nenhum pedido do lote fica sem resposta (nem preso em _em_andamento)
+            respondidas = {chave for chave, _, _ in resultados}
+            resultados += [(chave, None, ErroLLM("Lote de embeddings interrompido."))
+                           for chave, _ in lote if chave not in respondidas]
+            with self._condicao:
+                futuros = [(self._em_andamento.pop(chave, None), vetor, erro) for chave, vetor, erro in resultados]
+            for futuro, vetor, erro in futuros:
+                if futuro is None:
+                    continue
+                if erro is not None:
+                    futuro.set_exception(erro)
+                else:
+                    futuro.set_result(vetor)
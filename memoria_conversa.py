@@ -0,0 +1,178 @@
+# Memória da conversa para perguntas de continuação ("e na zona sul?"): os turnos mais recentes
+# vão ao GPT na íntegra e os mais antigos são condensados em um resumo acumulado, sempre dentro
+# de um orçamento de tokens. O resumo é atualizado de forma incremental (resumo anterior + turno
+# que saiu da janela), nunca refazendo o histórico inteiro, e fica guardado na sessão.
+# O resumo pelo GPT roda em segundo plano, fora do caminho da resposta: enquanto ele não fica
+# pronto, os turnos pendentes entram no prompt em forma extrativa.
+import logging
+import os  # Variáveis de ambiente.
+import re  # Detecção de perguntas de continuação e extração da primeira frase.
+import threading  # Resumo em segundo plano.
+from collections import deque
+
+from busca_lexica import remover_acentos
+from recuperacao_faq import estimar_tokens
+
+ORCAMENTO_TOKENS = int(os.getenv("MEMORIA_ORCAMENTO_TOKENS", "600"))  # Turnos recentes + resumo
+FRACAO_RESUMO = 0.3  # Parte do orçamento reservada ao resumo
+RESUMO_LLM = os.getenv("MEMORIA_RESUMO", "extrativo") == "llm"  # Resumo pelo GPT (uma chamada por turno arquivado)
+
+# Perguntas que dependem da anterior: começam com um conectivo ("e na zona sul?", "então...")
+# ou retomam o assunto com um pronome anafórico ("e a velocidade dela?", "por que isso acontece?")
+_CONECTIVO = re.compile(r"^(e|mas|entao|tambem|e quanto|e sobre|e para|e nas?|e nos?|e em|e as?|e os?)\b")
+_ANAFORA = re.compile(
+    r"\b(isso|disso|nisso|isto|disto|nisto|esse|essa|esses|essas|desse|dessa|desses|dessas|"
+    r"nesse|nessa|nesses|nessas|deles|delas|dele|dela)\b"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def eh_continuacao(pergunta):
+    """Heurística: a pergunta só faz sentido com o contexto da conversa (conectivo inicial ou
+       pronome que retoma o assunto anterior). Acentos e pontuação são ignorados ("Então...")."""
+    texto = " ".join(re.findall(r"\w+", remover_acentos(pergunta.lower())))
+    return bool(_CONECTIVO.search(texto) or _ANAFORA.search(texto))
+
+
+def _cortar(texto, max_tokens):
+    """Corta o texto para caber em `max_tokens` (estimados)."""
+    max_caracteres = max_tokens * 4
+    if len(texto) <= max_caracteres:
+        return texto
+    return texto[:max_caracteres].rsplit(" ", 1)[0] + "..."
+
+
+# ================== Resumidores ==================
+def resumir_extrativo(resumo, pergunta, resposta, max_tokens):
+    """Acrescenta ao resumo uma linha com a pergunta e a primeira frase da resposta,
+       descartando as linhas mais antigas quando o resumo passa do orçamento."""
+    primeira_frase = re.split(r"(?<=[.!?])\s", resposta.strip(), maxsplit=1)[0]
+    linha = f"- Usuário perguntou: {_cortar(pergunta, 40)} | Resposta: {_cortar(primeira_frase, 60)}"
+    linhas = (resumo.splitlines() if resumo else []) + [linha]
+    while len(linhas) > 1 and estimar_tokens("\n".join(linhas)) > max_tokens:
+        linhas.pop(0)
+    return _cortar("\n".join(linhas), max_tokens)
+
+
+def criar_resumidor_llm(cliente_llm, modelo="gpt-3.5-turbo"):
+    """Resumidor que pede ao GPT para incorporar o turno ao resumo anterior.
+       Em caso de falha da API, recorre ao resumo extrativo."""
+    from cliente_llm import ErroLLM  # Importação tardia: o resumo extrativo não depende da OpenAI
+
+    def resumir(resumo, pergunta, resposta, max_tokens):
+        mensagens = [
+            {"role": "system", "content": (
+                "Atualize o resumo de uma conversa incorporando o novo trecho. Mantenha fatos, números, "
+                "regiões e filtros citados pelo usuário. Responda apenas com o resumo, em português, "
+                f"com no máximo {max_tokens * 3 // 4} palavras."
+            )},
+            {"role": "user", "content": (
+                f"Resumo atual:\n{resumo or '(vazio)'}\n\nNovo trecho:\n"
+                f"Usuário: {pergunta}\nAssistente: {_cortar(resposta, 300)}"
+            )},
+        ]
+        try:
+            stream = cliente_llm.criar_chat_stream(mensagens, modelo=modelo, max_tokens=max_tokens)
+            try:
+                texto = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+            finally:
+                stream.close()
+            return _cortar(texto.strip(), max_tokens)
+        except ErroLLM:
+            logger.warning("Resumo da conversa pelo GPT indisponível; usando o resumo extrativo.")
+            return resumir_extrativo(resumo, pergunta, resposta, max_tokens)
+
+    return resumir
+
+
+# ================== Memória ==================
+class MemoriaConversa:
+    """Janela de turnos recentes + resumo acumulado dos anteriores, dentro de `orcamento_tokens`.
+       Com `em_segundo_plano` (padrão para resumidores próprios, como o do GPT), os turnos que saem
+       da janela são resumidos em uma thread, sem atrasar a resposta."""
+
+    def __init__(self, orcamento_tokens=ORCAMENTO_TOKENS, resumidor=None, em_segundo_plano=None):
+        self.orcamento_resumo = int(orcamento_tokens * FRACAO_RESUMO)
+        self.orcamento_recentes = orcamento_tokens - self.orcamento_resumo
+        self.em_segundo_plano = resumidor is not None if em_segundo_plano is None else em_segundo_plano
+        self.resumidor = resumidor or resumir_extrativo
+        self.resumo = ""
+        self._recentes = deque()  # [(pergunta, resposta, tokens)]
+        self._tokens_recentes = 0
+        self._pendentes = deque()  # Turnos fora da janela ainda não incorporados ao resumo
+        self._trava = threading.Lock()
+        self._tarefa = None  # Thread do resumo em andamento
+        self.resumos_feitos = 0
+        self.consulta_dados = None  # Última consulta aos dados do painel (base das continuações)
+
+    def __len__(self):
+        return len(self._recentes)
+
+    @property
+    def ultima_pergunta(self):
+        return self._recentes[-1][0] if self._recentes else None
+
+    def adicionar(self, pergunta, resposta):
+        """Registra um turno; os que saem da janela são incorporados ao resumo, um de cada vez."""
+        resposta = _cortar(resposta, self.orcamento_recentes // 2)  # Um turno nunca ocupa a janela toda
+        tokens = estimar_tokens(pergunta) + estimar_tokens(resposta)
+        self._recentes.append((pergunta, resposta, tokens))
+        self._tokens_recentes += tokens
+        with self._trava:
+            while len(self._recentes) > 1 and self._tokens_recentes > self.orcamento_recentes:
+                antiga, resposta_antiga, tokens_antigos = self._recentes.popleft()
+                self._tokens_recentes -= tokens_antigos
+                self._pendentes.append((antiga, resposta_antiga))
+            if not self._pendentes or self._tarefa is not None:
+                return  # Nada a resumir, ou a thread em andamento pega os novos turnos
+            if self.em_segundo_plano:
+                self._tarefa = threading.Thread(target=self._resumir_pendentes, daemon=True)
+                self._tarefa.start()
+                return
+        self._resumir_pendentes()
+
+    def _resumir_pendentes(self):
+        """Incorpora ao resumo, em ordem, os turnos pendentes (o resumidor roda fora da trava)."""
+        while True:
+            with self._trava:
+                if not self._pendentes:
+                    self._tarefa = None
+                    return
+                pergunta, resposta = self._pendentes[0]
+                resumo = self.resumo
+            novo = self.resumidor(resumo, pergunta, resposta, self.orcamento_resumo)
+            with self._trava:
+                self.resumo = novo
+                self._pendentes.popleft()
+                self.resumos_feitos += 1
+
+    def resumo_atual(self):
+        """Resumo para o prompt: o acumulado mais, em forma extrativa, os turnos ainda pendentes."""
+        with self._trava:
+            resumo, pendentes = self.resumo, list(self._pendentes)
+        for pergunta, resposta in pendentes:
+            resumo = resumir_extrativo(resumo, pergunta, resposta, self.orcamento_resumo)
+        return resumo
+
+    def consulta_contextualizada(self, pergunta):
+        """Pergunta de continuação completada com a anterior, para a busca no FAQ."""
+        if self.ultima_pergunta is None:
+            return pergunta
+        return f"{self.ultima_pergunta} {pergunta}"
+
+    def mensagens(self):
+        """Mensagens de chat com o resumo (se houver) e os turnos recentes, em ordem cronológica."""
+        mensagens = []
+        resumo = self.resumo_atual()
+        if resumo:
+            mensagens.append({"role": "system", "content": "Resumo da conversa até aqui:\n" + resumo})
+        for pergunta, resposta, _ in self._recentes:
+            mensagens.append({"role": "user", "content": pergunta})
+            mensagens.append({"role": "assistant", "content": resposta})
+        return mensagens
+
+    def tokens(self):
+        """Tokens (estimados) que a memória acrescenta ao prompt."""
+        resumo = self.resumo_atual()
+        return self._tokens_recentes + (estimar_tokens(resumo) if resumo else 0)
@@ -0,0 +1,137 @@
+# Geração especulativa do GPT: a chamada ao LLM começa em paralelo com o embedding e a busca
+# no FAQ e é cancelada se o FAQ (ou o cache semântico) produzir uma resposta confiável.
+# Nas perguntas que não estão no FAQ (a maior parte do tráfego), o tempo do embedding e da
+# busca deixa de somar ao tempo até o primeiro token.
+# O prompt especulativo usa só as passagens da busca léxica (BM25), as únicas disponíveis antes
+# do embedding; quando ela não traz nenhuma passagem, não há especulação e o GPT recebe as
+# passagens da busca completa.
+import logging
+import os  # Variáveis de ambiente.
+import queue  # Fragmentos recebidos pela thread de geração.
+import threading  # Cancelamento e contadores.
+import time  # Intervalo dos logs periódicos.
+from concurrent.futures import ThreadPoolExecutor
+
+from recuperacao_faq import estimar_tokens
+
+POLITICA_SEMPRE = "sempre"  # Sempre especula
+POLITICA_NUNCA = "nunca"  # Fluxo sequencial (FAQ primeiro, GPT só em caso de falha)
+POLITICA_LEXICA = "lexica"  # Especula apenas quando a busca léxica indica que a pergunta não está no FAQ
+POLITICAS = (POLITICA_SEMPRE, POLITICA_NUNCA, POLITICA_LEXICA)
+POLITICA_PADRAO = os.getenv("POLITICA_ESPECULACAO", POLITICA_LEXICA)
+INTERVALO_LOG = float(os.getenv("ESPECULACAO_INTERVALO_LOG", "300"))  # Segundos entre logs do resumo
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()  # Marca o fim do stream na fila
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gpt-especulativo")
+
+
+def deve_especular(politica, falha_lexica):
+    """Decide se a chamada ao GPT deve começar antes do resultado do FAQ."""
+    if politica not in POLITICAS:
+        raise ValueError(f"Política de especulação desconhecida: {politica} (opções: {', '.join(POLITICAS)})")
+    if politica == POLITICA_SEMPRE:
+        return True
+    if politica == POLITICA_LEXICA:
+        return falha_lexica
+    return False
+
+
+# ================== Estatísticas ==================
+class EstatisticasEspeculacao:
+    """Contadores do processo: especulações iniciadas, aproveitadas, canceladas e tokens desperdiçados.
+       O resumo vai para o log a cada `intervalo_log` segundos (e é exibido no painel de desempenho)."""
+
+    def __init__(self, intervalo_log=INTERVALO_LOG):
+        self._lock = threading.Lock()
+        self.intervalo_log = intervalo_log
+        self._ultimo_log = time.monotonic()
+        self.iniciadas = 0
+        self.aproveitadas = 0
+        self.canceladas = 0
+        self.tokens_desperdicados = 0
+
+    def registrar(self, evento, tokens=0):
+        with self._lock:
+            setattr(self, evento, getattr(self, evento) + 1)
+            self.tokens_desperdicados += tokens
+            registrar_log = time.monotonic() - self._ultimo_log >= self.intervalo_log
+            if registrar_log:
+                self._ultimo_log = time.monotonic()
+        if registrar_log:
+            resumo = self.resumo()
+            logger.info("Especulação: %(iniciadas)d iniciadas, %(aproveitadas)d aproveitadas, "
+                        "%(canceladas)d canceladas, ~%(tokens_desperdicados)d tokens desperdiçados "
+                        "(%(tokens_por_cancelada).0f por cancelamento).", resumo)
+
+    def resumo(self):
+        with self._lock:
+            return {
+                "iniciadas": self.iniciadas,
+                "aproveitadas": self.aproveitadas,
+                "canceladas": self.canceladas,
+                "tokens_desperdicados": self.tokens_desperdicados,
+                "tokens_por_cancelada": self.tokens_desperdicados / self.canceladas if self.canceladas else 0.0,
+            }
+
+
+estatisticas = EstatisticasEspeculacao()
+
+
+# ================== Geração Especulativa ==================
+class GeracaoEspeculativa:
+    """Consome um stream de chat do GPT em segundo plano, guardando os fragmentos até que
+       sejam usados (`fragmentos`) ou descartados (`cancelar`).
+       `criar_stream(cancelado)` recebe o evento de cancelamento, para desistir das tentativas
+       ainda não feitas enquanto o primeiro fragmento não chega."""
+
+    def __init__(self, criar_stream, mensagens):
+        self._fila = queue.Queue()
+        self._cancelado = threading.Event()
+        self._tokens_prompt = sum(estimar_tokens(m["content"]) for m in mensagens)
+        self.fragmentos_recebidos = 0  # ~1 token por fragmento do stream
+        estatisticas.registrar("iniciadas")
+        self._futuro = _executor.submit(self._executar, criar_stream)
+
+    def _executar(self, criar_stream):
+        stream = None
+        try:
+            stream = criar_stream(self._cancelado)
+            if self._cancelado.is_set():
+                return  # Cancelada enquanto a chamada era aberta: fecha sem ler nenhum fragmento
+            for chunk in stream:
+                if self._cancelado.is_set():
+                    break
+                if chunk.choices:
+                    self.fragmentos_recebidos += 1
+                    self._fila.put(chunk.choices[0].delta.content or "")
+        except Exception as erro:  # Repassado a quem consumir os fragmentos
+            self._fila.put(erro)
+        finally:
+            if stream is not None:
+                stream.close()  # Interrompe a geração no servidor
+            self._fila.put(_FIM)
+
+    def cancelar(self):
+        """Descarta a geração (o FAQ respondeu). Contabiliza os tokens já gastos."""
+        if self._cancelado.is_set():
+            return
+        self._cancelado.set()
+        tokens = self._tokens_prompt + self.fragmentos_recebidos
+        estatisticas.registrar("canceladas", tokens)
+        logger.info("Geração especulativa cancelada (~%d tokens gastos).", tokens)
+
+    def fragmentos(self):
+        """Entrega os fragmentos do GPT (já recebidos e os próximos) à medida que chegam."""
+        estatisticas.registrar("aproveitadas")
+        try:
+            while True:
+                item = self._fila.get()
+                if item is _FIM:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._cancelado.set()  # Consumidor parou (ex.: limite de palavras): encerra o stream
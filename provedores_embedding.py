@@ -0,0 +1,100 @@
+# Provedores de embedding usados pelo chatbot e pelo construtor do índice (indice_faq.py).
+# Cada provedor tem seu próprio índice FAISS e sua própria matriz de embeddings, pois os
+# vetores de provedores diferentes não são comparáveis entre si.
+import os  # Variáveis de ambiente e caminhos.
+import re  # Tokenização.
+import zlib  # Hash estável (crc32) para o provedor local.
+
+import numpy as np  # Computação numérica.
+
+from busca_lexica import remover_acentos
+
+PROVEDOR_PADRAO = os.getenv("PROVEDOR_EMBEDDING", "openai")
+
+
+# ================== Interface ==================
+class ProvedorEmbedding:
+    """Interface comum: `gerar(textos)` devolve uma matriz float32 (n x dimensao)."""
+
+    nome = None
+    remoto = False  # Provedores remotos passam pelo agrupamento de pedidos (lote_embeddings.py)
+
+    def gerar(self, textos):
+        raise NotImplementedError
+
+
+# ================== OpenAI ==================
+class ProvedorOpenAI(ProvedorEmbedding):
+    """Embeddings da API da OpenAI (padrão: text-embedding-3-small)."""
+
+    nome = "openai"
+    remoto = True
+
+    def __init__(self, modelo="text-embedding-3-small", cliente=None):
+        self.modelo = modelo
+        self._cliente = cliente  # ClienteLLM (criado na primeira chamada se não for informado)
+
+    def gerar(self, textos):
+        if self._cliente is None:
+            from cliente_llm import ClienteLLM  # Importação tardia: o provedor local não depende da OpenAI
+            self._cliente = ClienteLLM()
+        response = self._cliente.criar_embeddings(list(textos), self.modelo)
+        dados = sorted(response.data, key=lambda d: d.index)
+        return np.array([d.embedding for d in dados], dtype=np.float32)
+
+
+# ================== Local (CPU) ==================
+class ProvedorLocalHash(ProvedorEmbedding):
+    """Projeção por hashing de palavras e n-gramas de caracteres (sem rede, sub-milissegundo).
+       Captura sobreposição léxica e variações de grafia, não sinônimos."""
+
+    nome = "local"
+
+    def __init__(self, dimensao=512, ngramas=(3, 4, 5)):
+        self.dimensao = dimensao
+        self.ngramas = ngramas
+
+    def _atributos(self, texto):
+        palavras = re.findall(r"[a-z0-9]+", remover_acentos(texto.lower()))
+        atributos = list(palavras)
+        for palavra in palavras:
+            marcada = f"<{palavra}>"
+            for n in self.ngramas:
+                atributos.extend(marcada[i:i + n] for i in range(len(marcada) - n + 1))
+        return atributos
+
+    def gerar(self, textos):
+        matriz = np.zeros((len(textos), self.dimensao), dtype=np.float32)
+        for linha, texto in enumerate(textos):
+            for atributo in self._atributos(texto or ""):
+                h = zlib.crc32(atributo.encode("utf-8"))
+                sinal = 1.0 if (h >> 31) & 1 else -1.0  # Hash com sinal reduz colisões
+                matriz[linha, h % self.dimensao] += sinal
+        # tf sublinear e normalização L2
+        matriz = np.sign(matriz) * np.log1p(np.abs(matriz))
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        return matriz / np.maximum(normas, 1e-12)
+
+
+# ================== Registro ==================
+PROVEDORES = {
+    ProvedorOpenAI.nome: ProvedorOpenAI,
+    ProvedorLocalHash.nome: ProvedorLocalHash,
+}
+
+
+def obter_provedor(nome=PROVEDOR_PADRAO, cliente_llm=None):
+    """Instancia o provedor de embedding pelo nome ('openai' ou 'local').
+       Provedores remotos usam o `cliente_llm` informado (ClienteLLM compartilhado)."""
+    if nome not in PROVEDORES:
+        raise ValueError(f"Provedor de embedding desconhecido: {nome} (opções: {', '.join(PROVEDORES)})")
+    classe = PROVEDORES[nome]
+    return classe(cliente=cliente_llm) if classe.remoto else classe()
+
+
+def caminho_por_provedor(caminho, nome):
+    """Caminho do artefato (índice ou matriz) do provedor. O provedor 'openai' mantém os nomes originais."""
+    if nome == ProvedorOpenAI.nome:
+        return caminho
+    base, extensao = os.path.splitext(caminho)
+    return f"{base}.{nome}{extensao}"
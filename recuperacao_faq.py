@@ -0,0 +1,68 @@
+# Etapa de recuperação do chatbot (RAG): busca os k vizinhos do FAQ em uma única consulta
+# ao FAISS, remove duplicatas e monta o contexto enviado ao GPT dentro de um orçamento de tokens.
+import numpy as np  # Computação numérica.
+
+K_PADRAO = 5  # Vizinhos buscados por pergunta
+ORCAMENTO_TOKENS_PADRAO = 1200  # Tokens reservados para as passagens do FAQ no prompt
+
+
+# ================== Tokens ==================
+def estimar_tokens(texto):
+    """Estimativa simples de tokens (~4 caracteres por token), suficiente para o orçamento."""
+    return max(1, len(texto) // 4)
+
+
+# ================== Busca ==================
+def buscar_passagens(index, faq, embeddings, k=K_PADRAO, metrica="l2"):
+    """Busca os k vizinhos de cada embedding (matriz n x d, já normalizada) em uma única chamada
+       ao FAISS. Retorna, para cada consulta, a lista de passagens ordenadas pela distância.
+       Em índices de produto interno ("ip"), a similaridade s vira a distância L2 equivalente
+       entre vetores unitários (2 - 2s), para que o mesmo limiar valha nas duas métricas."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    k = min(k, index.ntotal)
+    if k <= 0:
+        return [[] for _ in range(len(embeddings))]
+
+    distancias, indices = index.search(embeddings, k)
+    resultados = []
+    for linha_dist, linha_ids in zip(distancias, indices):
+        passagens = [
+            {
+                "id": int(i),
+                "pergunta": faq.pergunta(i),
+                "resposta": faq.resposta(i),
+                "distancia": float(2 - 2 * d if metrica == "ip" else d),
+            }
+            for d, i in zip(linha_dist, linha_ids)
+            if i >= 0  # O FAISS devolve -1 quando há menos de k resultados
+        ]
+        resultados.append(deduplicar_passagens(passagens))
+    return resultados
+
+
+def deduplicar_passagens(passagens):
+    """Remove passagens repetidas (mesma resposta), mantendo a mais próxima."""
+    vistas = set()
+    unicas = []
+    for p in passagens:
+        chave = " ".join(p["resposta"].lower().split())
+        if chave not in vistas:
+            vistas.add(chave)
+            unicas.append(p)
+    return unicas
+
+
+# ================== Contexto ==================
+def montar_contexto(passagens, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO):
+    """Concatena as melhores passagens (pergunta + resposta) sem ultrapassar o orçamento de tokens.
+       Retorna uma string vazia se nenhuma passagem couber."""
+    blocos = []
+    usados = 0
+    for n, p in enumerate(passagens, start=1):
+        bloco = f"[{n}] Pergunta: {p['pergunta']}\nResposta: {p['resposta']}"
+        custo = estimar_tokens(bloco)
+        if usados + custo > orcamento_tokens:
+            break
+        blocos.append(bloco)
+        usados += custo
+    return "\n\n".join(blocos)
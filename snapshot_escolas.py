@@ -0,0 +1,230 @@
+# Snapshot local (Parquet/Arrow) do cadastro de escolas da Prefeitura de São Paulo.
+# Evita baixar e interpretar o CSV inteiro a cada cold start: a primeira leitura é
+# gravada em disco com colunas tipadas e as seguintes apenas mapeiam o arquivo em memória.
+import hashlib  # Hash do conteúdo baixado.
+import json  # Metadados do snapshot (ETag/Last-Modified/hash).
+import logging
+import os  # Manipulação de caminhos e troca atômica de arquivos.
+import tempfile  # Arquivos temporários para escrita atômica do snapshot.
+import threading  # Atualização do snapshot fora do caminho da requisição.
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np  # Geração dos dados simulados (IDEB e velocidade).
+import pandas as pd  # Manipulação e análise de dados tabulares (DataFrames).
+import pyarrow as pa  # Formato colunar Arrow.
+import pyarrow.parquet as pq  # Leitura/escrita de arquivos Parquet.
+import requests
+
+URL_ESCOLAS = ("http://dados.prefeitura.sp.gov.br/dataset/8da55b0e-b385-4b54-9296-d0000014ddd5/"
+               "resource/533188c6-1949-4976-ac4e-acd313415cd1/download/escolas122024.csv")
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/114.0.0.0 Safari/537.36"
+}
+
+CAMINHO_SNAPSHOT = "data/cache/escolas.parquet"  # Caminho relativo
+TIMEOUT_DOWNLOAD = (5, 60)  # (conexão, leitura) em segundos
+INTERVALO_ATUALIZACAO = 6 * 60 * 60  # Revalida a fonte a cada 6 horas
+
+logger = logging.getLogger(__name__)
+
+# Colunas com poucos valores distintos, armazenadas como categóricas
+COLUNAS_CATEGORICAS = ["DRE", "SUBPREF", "TIPOESC", "BAIRRO", "DISTRITO"]
+
+# DataFrame publicado e a sua versão, trocados juntos em uma única atribuição
+Snapshot = namedtuple("Snapshot", ["escolas", "versao"])
+
+
+class FonteIndisponivel(RuntimeError):
+    """Não há snapshot local e o portal de dados abertos não respondeu."""
+
+
+# ================== Download e Conversão ==================
+def baixar_csv_escolas(timeout=TIMEOUT_DOWNLOAD, etag=None, last_modified=None):
+    """Baixa o CSV de escolas do portal de dados abertos com GET condicional.
+       Retorna (conteudo, validadores); conteudo é None se a fonte não mudou (HTTP 304)."""
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = requests.get(URL_ESCOLAS, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, {"etag": etag, "last_modified": last_modified}
+    response.raise_for_status()  # Caso haja erro HTTP, lança exceção
+
+    validadores = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(response.content).hexdigest(),  # Detecta reenvios do mesmo arquivo
+    }
+    return response.content, validadores
+
+
+def converter_csv_escolas(conteudo):
+    """Converte os bytes do CSV em um DataFrame tipado (coordenadas já escaladas)."""
+    df = pd.read_csv(BytesIO(conteudo), sep=";", encoding="ISO-8859-1", on_bad_lines='skip')
+    df.columns = df.columns.str.strip()
+
+    df['LATITUDE'] = df['LATITUDE'] / 1_000_000
+    df['LONGITUDE'] = df['LONGITUDE'] / 1_000_000
+
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+# ================== Leitura e Escrita do Snapshot ==================
+def _caminho_metadados(caminho):
+    return os.path.splitext(caminho)[0] + ".meta.json"
+
+
+def _escrever_atomico(caminho, escrever):
+    """Escreve em um arquivo temporário e o move para o destino (os.replace)."""
+    pasta = os.path.dirname(caminho) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, caminho_tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(caminho_tmp)
+        os.replace(caminho_tmp, caminho)  # Leitores nunca enxergam um arquivo pela metade
+    except BaseException:
+        os.remove(caminho_tmp)
+        raise
+
+
+def salvar_snapshot(df, caminho=CAMINHO_SNAPSHOT, validadores=None):
+    """Grava o snapshot em Parquet e os validadores HTTP de forma atômica."""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    _escrever_atomico(caminho, lambda tmp: pq.write_table(tabela, tmp))
+    salvar_metadados(validadores, caminho)
+
+
+def salvar_metadados(validadores, caminho=CAMINHO_SNAPSHOT):
+    """Grava só os validadores HTTP (ETag/Last-Modified/hash) do snapshot, de forma atômica."""
+    def escrever_metadados(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(validadores or {}, f)
+    _escrever_atomico(_caminho_metadados(caminho), escrever_metadados)
+
+
+def ler_snapshot(caminho=CAMINHO_SNAPSHOT):
+    """Lê o snapshot com memory-map. Retorna None se o arquivo não existir."""
+    if not os.path.exists(caminho):
+        return None
+    tabela = pq.read_table(caminho, memory_map=True)
+    return tabela.to_pandas()
+
+
+def ler_metadados(caminho=CAMINHO_SNAPSHOT):
+    """Lê os validadores HTTP (ETag/Last-Modified) e o hash do conteúdo salvos com o snapshot."""
+    try:
+        with open(_caminho_metadados(caminho), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+# ================== Dados Simulados ==================
+def simular_indicadores(df):
+    """Acrescenta as colunas simuladas de IDEB e velocidade de internet."""
+    df = df.copy()
+    np.random.seed(42)
+    df['IDEB'] = np.random.uniform(3.0, 7.0, len(df))
+    df['Velocidade_Internet'] = np.random.uniform(1.0, 100.0, len(df))
+    return df
+
+
+# ================== Carregamento ==================
+def carregar_escolas_base(caminho=CAMINHO_SNAPSHOT):
+    """Retorna o cadastro de escolas a partir do snapshot local.
+       Só acessa a rede quando ainda não existe snapshot em disco."""
+    df = ler_snapshot(caminho)
+    if df is None:
+        try:
+            conteudo, validadores = baixar_csv_escolas()
+        except requests.RequestException as erro:
+            raise FonteIndisponivel(
+                "Não foi possível baixar o cadastro de escolas do portal de dados abertos da Prefeitura "
+                f"e ainda não há um snapshot local ({erro}). Tente novamente em alguns minutos."
+            ) from erro
+        df = converter_csv_escolas(conteudo)
+        salvar_snapshot(df, caminho, validadores)
+    return df
+
+
+# ================== Atualização em Segundo Plano ==================
+class AtualizadorEscolas:
+    """Mantém o último DataFrame válido de escolas e o revalida em segundo plano
+       (stale-while-revalidate). As sessões sempre leem o snapshot atual sem bloquear."""
+
+    def __init__(self, caminho=CAMINHO_SNAPSHOT, intervalo=INTERVALO_ATUALIZACAO):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        # A versão é incrementada a cada snapshot publicado (chave dos artefatos derivados)
+        self._snapshot = Snapshot(simular_indicadores(carregar_escolas_base(caminho)), 0)
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        """Último Snapshot(escolas, versao) publicado. Lido uma única vez por execução, garante
+           que os artefatos derivados sejam chaveados pela versão do próprio DataFrame."""
+        return self._snapshot
+
+    @property
+    def escolas(self):
+        """Último DataFrame derivado válido (somente leitura)."""
+        return self._snapshot.escolas
+
+    @property
+    def versao(self):
+        return self._snapshot.versao
+
+    def atualizar(self):
+        """Revalida a fonte com GET condicional e troca o DataFrame se houver mudança.
+           Uma resposta 200 com o mesmo conteúdo (mesmo hash) só atualiza os validadores,
+           sem nova versão. Retorna True se um novo snapshot foi publicado."""
+        anteriores = ler_metadados(self.caminho)
+        conteudo, validadores = baixar_csv_escolas(
+            etag=anteriores.get("etag"), last_modified=anteriores.get("last_modified")
+        )
+        if conteudo is None:
+            return False
+        if validadores["sha256"] == anteriores.get("sha256"):
+            salvar_metadados(validadores, self.caminho)  # Servidor sem GET condicional: mesmo arquivo
+            return False
+
+        base = converter_csv_escolas(conteudo)
+        escolas = simular_indicadores(base)  # Deriva o DataFrame fora do caminho da requisição
+        salvar_snapshot(base, self.caminho, validadores)
+        self._snapshot = Snapshot(escolas, self._snapshot.versao + 1)  # Troca atômica (dados e versão juntos)
+        return True
+
+    def _executar(self):
+        # Revalida logo ao iniciar (o snapshot em disco pode ser de um deploy antigo)
+        while not self._parar.is_set():
+            try:
+                if self.atualizar():
+                    logger.info("Snapshot de escolas atualizado.")
+            except Exception:
+                # Fonte lenta ou fora do ar: continua servindo o último snapshot válido
+                logger.exception("Falha ao atualizar o snapshot de escolas.")
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        """Inicia a thread de atualização (daemon), se ainda não estiver rodando."""
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name="atualizador-escolas", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        """Sinaliza a thread de atualização para encerrar."""
+        self._parar.set()
@@ -0,0 +1,62 @@
+# Índice espacial em grade: a consulta por retângulo deve coincidir com a busca por força bruta.
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregacao_espacial import IndiceEspacial
+
+
+@pytest.fixture(scope="module")
+def escolas():
+    rng = np.random.default_rng(7)
+    n = 2000
+    latitudes = rng.uniform(-24.0, -23.35, n)
+    longitudes = rng.uniform(-46.83, -46.36, n)
+    latitudes[::97] = np.nan  # Escolas sem coordenadas nunca aparecem
+    longitudes[::89] = np.nan
+    return pd.DataFrame({"LATITUDE": latitudes, "LONGITUDE": longitudes})
+
+
+def _forca_bruta(escolas, limites, mascara=None):
+    sul, oeste, norte, leste = limites
+    lat, lon = escolas["LATITUDE"].to_numpy(), escolas["LONGITUDE"].to_numpy()
+    dentro = (lat >= sul) & (lat <= norte) & (lon >= oeste) & (lon <= leste)
+    if mascara is not None:
+        dentro &= mascara
+    return np.flatnonzero(dentro)
+
+
+@pytest.mark.parametrize("celula", [0.005, 0.01, 0.2])
+def test_retangulos_aleatorios(escolas, celula):
+    indice = IndiceEspacial(escolas, celula_graus=celula)
+    rng = np.random.default_rng(11)
+    for _ in range(200):
+        sul, norte = np.sort(rng.uniform(-24.1, -23.3, 2))
+        oeste, leste = np.sort(rng.uniform(-46.9, -46.3, 2))
+        limites = (sul, oeste, norte, leste)
+        np.testing.assert_array_equal(indice.consultar(limites), _forca_bruta(escolas, limites))
+
+
+def test_mascara(escolas):
+    indice = IndiceEspacial(escolas)
+    mascara = np.random.default_rng(3).random(len(escolas)) < 0.3
+    limites = (-23.8, -46.7, -23.5, -46.5)
+    np.testing.assert_array_equal(indice.consultar(limites, mascara), _forca_bruta(escolas, limites, mascara))
+
+
+@pytest.mark.parametrize("limites", [
+    (-90.0, -180.0, 90.0, 180.0),  # Mundo todo
+    (-10.0, -40.0, -9.0, -39.0),  # Fora da cidade
+    (-25.0, -46.6, -24.5, -46.5),  # Ao sul de todos os pontos
+    (-23.7, -46.6, -23.7, -46.6),  # Retângulo degenerado
+])
+def test_limites_extremos(escolas, limites):
+    indice = IndiceEspacial(escolas)
+    np.testing.assert_array_equal(indice.consultar(limites), _forca_bruta(escolas, limites))
+
+
+def test_pontos_na_borda_sao_incluidos():
+    escolas = pd.DataFrame({"LATITUDE": [-23.5, -23.6, -23.7], "LONGITUDE": [-46.5, -46.6, -46.7]})
+    indice = IndiceEspacial(escolas)
+    np.testing.assert_array_equal(indice.consultar((-23.7, -46.7, -23.5, -46.5)), [0, 1, 2])
+    np.testing.assert_array_equal(indice.consultar((-23.6, -46.6, -23.6, -46.6)), [1])
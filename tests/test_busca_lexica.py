@@ -0,0 +1,29 @@
+# Fusão de rankings (RRF) da busca híbrida.
+from busca_lexica import fundir_rrf
+
+
+def test_documento_presente_nas_duas_listas_sobe():
+    assert fundir_rrf(["a", "b"], ["c", "b"])[0] == "b"
+
+
+def test_ordem_pelas_pontuacoes_somadas():
+    # 1: 1/61 + 1/62; 3: 1/63 + 1/61; 2: 1/62
+    assert fundir_rrf([1, 2, 3], [3, 1]) == [1, 3, 2]
+
+
+def test_uniao_sem_repeticoes():
+    fundido = fundir_rrf([1, 2], [2, 3], [4])
+    assert sorted(fundido) == [1, 2, 3, 4]
+
+
+def test_uma_lista_preserva_a_ordem():
+    assert fundir_rrf([5, 3, 9]) == [5, 3, 9]
+    assert fundir_rrf() == []
+    assert fundir_rrf([], [7]) == [7]
+
+
+def test_k_controla_o_peso_do_topo():
+    # Com k pequeno, o 1º lugar de uma lista vale mais que o 3º lugar em duas listas
+    rankings = (["x", "a", "b"], ["y", "c", "b"])
+    assert fundir_rrf(*rankings, k=0)[0] == "x"
+    assert fundir_rrf(*rankings, k=60)[0] == "b"
@@ -0,0 +1,84 @@
+# Cache semântico: reaproveitamento por similaridade, entidades citadas, TTL, LRU e invalidação.
+import time
+
+import numpy as np
+import pytest
+
+from cache_semantico import CacheSemantico
+
+
+def _vetor(*valores):
+    vetor = np.zeros(8, dtype=np.float32)
+    vetor[:len(valores)] = valores
+    return vetor
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def test_reaproveita_pergunta_semelhante(caminho):
+    cache = CacheSemantico("openai", caminho)
+    cache.adicionar("Como está a internet das escolas?", _vetor(1, 0.1), "Resposta A")
+
+    assert cache.buscar(_vetor(1, 0.12), "Como anda a internet das escolas?") == "Resposta A"
+    assert cache.buscar(_vetor(0, 1), "Outra pergunta") is None  # Abaixo do limiar
+
+
+def test_exige_os_mesmos_numeros_e_lugares(caminho):
+    cache = CacheSemantico("openai", caminho)
+    nomes = frozenset({"penha"})
+    cache.adicionar("escolas abaixo de 10 Mbps na zona leste", _vetor(1), "Resposta 10")
+
+    assert cache.buscar(_vetor(1), "escolas abaixo de 50 Mbps na zona leste", nomes) is None
+    assert cache.buscar(_vetor(1), "escolas abaixo de 10 Mbps na zona sul", nomes) is None
+    assert cache.buscar(_vetor(1), "escolas abaixo de 10 Mbps na zona leste", nomes) == "Resposta 10"
+
+
+def test_limiar_por_provedor(caminho):
+    assert CacheSemantico("local", caminho).limiar > CacheSemantico("openai", caminho).limiar
+    assert CacheSemantico("openai", caminho, limiar=0.5).limiar == 0.5
+
+
+def test_entradas_expiradas_nao_sao_reaproveitadas(caminho):
+    cache = CacheSemantico("openai", caminho, ttl=0.05)
+    cache.adicionar("pergunta", _vetor(1), "resposta")
+    time.sleep(0.1)
+
+    assert cache.buscar(_vetor(1), "pergunta") is None
+    assert len(cache) == 0
+    assert len(CacheSemantico("openai", caminho, ttl=0.05)) == 0  # Também removida do SQLite
+
+
+def test_remocao_lru_por_capacidade(caminho):
+    cache = CacheSemantico("openai", caminho, capacidade=2)
+    cache.adicionar("primeira", _vetor(1), "r1")
+    cache.adicionar("segunda", _vetor(0, 1), "r2")
+    time.sleep(0.01)
+    assert cache.buscar(_vetor(1), "primeira") == "r1"  # A primeira passa a ser a mais recente
+    cache.adicionar("terceira", _vetor(0, 0, 1), "r3")
+
+    assert len(cache) == 2
+    assert cache.buscar(_vetor(0, 1), "segunda") is None
+    assert cache.buscar(_vetor(1), "primeira") == "r1"
+
+
+def test_invalidacao(caminho):
+    cache = CacheSemantico("openai", caminho)
+    cache.adicionar("internet na Penha", _vetor(1), "r1")
+    cache.adicionar("IDEB em Perus", _vetor(0, 1), "r2")
+    cache.adicionar("internet em Perus", _vetor(0, 0, 1), "r3")
+
+    assert cache.invalidar("perus") == 2
+    assert cache.buscar(_vetor(0, 1), "IDEB em Perus") is None
+    assert cache.buscar(_vetor(1), "internet na Penha") == "r1"
+    assert len(CacheSemantico("openai", caminho)) == 1  # A invalidação persiste
+
+    assert cache.invalidar() == 1
+    assert len(cache) == 0
+
+
+def test_provedores_nao_compartilham_entradas(caminho):
+    CacheSemantico("openai", caminho).adicionar("pergunta", _vetor(1), "resposta")
+    assert CacheSemantico("local", caminho).buscar(_vetor(1), "pergunta") is None
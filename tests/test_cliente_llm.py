@@ -0,0 +1,129 @@
+# Cliente resiliente contra um servidor HTTP local (OPENAI_BASE_URL): tentativas, disjuntor e
+# fechamento do stream.
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import cliente_llm
+from cliente_llm import CircuitoAberto, ClienteLLM, Disjuntor, ErroLLM
+
+MENSAGENS = [{"role": "user", "content": "Olá"}]
+
+
+def _chunk(texto):
+    return {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "delta": {"content": texto}, "finish_reason": None}]}
+
+
+class Servidor:
+    """Servidor de chat em streaming: responde `falhas` vezes com HTTP 500 e depois envia `fragmentos`."""
+
+    def __init__(self, falhas=0, fragmentos=("Olá", " mundo"), intervalo=0.0):
+        self.falhas = falhas
+        self.fragmentos = fragmentos
+        self.intervalo = intervalo
+        self.requisicoes = 0
+        self.desconectado = threading.Event()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                servidor.requisicoes += 1
+                if servidor.requisicoes <= servidor.falhas:
+                    corpo = json.dumps({"error": {"message": "falha", "type": "server_error"}}).encode()
+                    self.send_response(500)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    for texto in servidor.fragmentos:
+                        self.wfile.write(f"data: {json.dumps(_chunk(texto))}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(servidor.intervalo)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except OSError:
+                    servidor.desconectado.set()  # O cliente fechou o stream
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._http.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+@pytest.fixture(autouse=True)
+def backoff_curto(monkeypatch):
+    monkeypatch.setattr(cliente_llm, "BACKOFF_BASE", 0.01)
+    monkeypatch.setenv("OPENAI_API_KEY", "teste")
+
+
+def _texto(stream):
+    return "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+
+
+def test_falhas_transitorias_sao_repetidas(monkeypatch):
+    with Servidor(falhas=2) as servidor:
+        monkeypatch.setenv("OPENAI_BASE_URL", servidor.url)
+        cliente = ClienteLLM()
+        assert _texto(cliente.criar_chat_stream(MENSAGENS, prazo=5)) == "Olá mundo"
+
+    assert servidor.requisicoes == 3
+    metricas = cliente.metricas.resumo()["chat"]
+    assert metricas["tentativas_extras"] == 2
+    assert metricas["chamadas"] == 1 and metricas["erros"] == 0
+    assert cliente.disjuntor.estado() == {"situacao": "fechado", "falhas_seguidas": 0}
+
+
+def test_disjuntor_abre_e_suspende_as_chamadas(monkeypatch):
+    with Servidor(falhas=100) as servidor:
+        monkeypatch.setenv("OPENAI_BASE_URL", servidor.url)
+        cliente = ClienteLLM(tentativas=2, disjuntor=Disjuntor(falhas_para_abrir=2, tempo_aberto=60))
+        for _ in range(2):
+            with pytest.raises(ErroLLM):
+                cliente.criar_chat_stream(MENSAGENS, prazo=5)
+        assert servidor.requisicoes == 4  # Duas tentativas por chamada
+        assert cliente.disjuntor.estado()["situacao"] == "aberto"
+        assert cliente.indisponivel
+
+        with pytest.raises(CircuitoAberto):
+            cliente.criar_chat_stream(MENSAGENS, prazo=5)
+        assert servidor.requisicoes == 4  # Com o disjuntor aberto, a chamada nem chega ao servidor
+    assert cliente._semaforo._value == cliente._max_concorrencia
+
+
+def test_fechar_o_stream_encerra_a_conexao_e_libera_o_semaforo(monkeypatch):
+    with Servidor(fragmentos=["x"] * 200, intervalo=0.01) as servidor:
+        monkeypatch.setenv("OPENAI_BASE_URL", servidor.url)
+        cliente = ClienteLLM(max_concorrencia=1)
+        stream = cliente.criar_chat_stream(MENSAGENS, prazo=5)
+        assert cliente._semaforo._value == 0  # Ocupado enquanto o stream está aberto
+        primeiro = next(iter(stream))
+        assert primeiro.choices[0].delta.content == "x"
+        stream.close()
+
+        assert cliente._semaforo._value == 1
+        assert servidor.desconectado.wait(5)  # O servidor para de gerar
+    metricas = cliente.metricas.resumo()["chat"]
+    assert metricas["chamadas"] == 1 and metricas["tokens_resposta"] == 1
@@ -0,0 +1,75 @@
+# Interpretação das perguntas sobre os dados do painel e respostas do motor de consultas.
+import numpy as np
+import pandas as pd
+import pytest
+
+from consulta_painel import MotorConsultas
+
+
+@pytest.fixture(scope="module")
+def motor():
+    # Base sintética pequena, com as colunas usadas pelo motor
+    escolas = pd.DataFrame({
+        "NOMES": ["EMEF PROFESSOR JOSE DA SILVA", "EMEI MARIA DE SOUZA LIMA", "EMEF CARLOS DRUMMOND ANDRADE",
+                  "EMEF JOAO CABRAL DE MELO"],
+        "TIPOESC": ["EMEF", "EMEI", "EMEF", "EMEF"],
+        "DRE": ["PENHA", "SANTO AMARO", "PIRITUBA", "ITAQUERA"],
+        "SUBPREF": ["PENHA", "SANTO AMARO", "PIRITUBA", "ITAQUERA"],
+        "DISTRITO": ["PENHA", "SANTO AMARO", "PIRITUBA", "ITAQUERA"],
+        "Velocidade_Internet": [5.0, 80.0, 40.0, 12.0],
+        "IDEB": [4.8, 6.1, 5.5, 5.0],
+    })
+    return MotorConsultas(escolas)
+
+
+# Pergunta e atributos esperados da ConsultaPainel
+@pytest.mark.parametrize("pergunta, esperado", [
+    ("escolas com internet lenta na zona leste", {"metrica": "velocidade", "ordem": "asc", "zonas": ["leste"]}),
+    ("quais escolas têm a internet mais rápida?", {"metrica": "velocidade", "ordem": "desc"}),
+    ("escolas com IDEB baixo", {"metrica": "ideb", "ordem": "asc"}),
+    ("escolas com velocidade acima de 50", {"limites": [("velocidade", ">", 50.0)]}),
+    ("escolas com IDEB maior que 5 e velocidade abaixo de 20",
+     {"limites": [("velocidade", "<", 20.0), ("ideb", ">", 5.0)]}),
+    ("escolas acima de 30 mbps na zona sul", {"limites": [("velocidade", ">", 30.0)], "zonas": ["sul"]}),
+    ("escolas com nota acima de 5 no IDEB", {"limites": [("ideb", ">", 5.0)]}),
+    ("quantas escolas há no distrito Penha?", {"operacao": "contar", "filtros": {"DISTRITO": ["PENHA"]}}),
+])
+def test_interpretacao(motor, pergunta, esperado):
+    consulta = motor.interpretar(pergunta)
+    assert consulta is not None
+    assert {atributo: getattr(consulta, atributo) for atributo in esperado} == esperado
+
+
+# Perguntas que ficam com o FAQ/GPT
+@pytest.mark.parametrize("pergunta", [
+    "Quais escolas têm mais de 2 laboratórios de informática?",
+    "distritos com mais de 50 escolas",
+    "quantos alunos tem a escola EMEF Professor José da Silva?",
+    "por que a internet é importante para o IDEB?",
+])
+def test_fora_do_motor(motor, pergunta):
+    assert motor.interpretar(pergunta) is None
+    assert motor.responder(pergunta) is None
+
+
+def test_contagem(motor):
+    assert "Há **1 escola**" in motor.responder("quantas escolas há no distrito Penha?")
+
+
+def test_continuacao_troca_so_a_zona(motor):
+    anterior = motor.interpretar("Quais escolas na zona leste têm internet abaixo de 10Mbps?")
+    consulta = motor.interpretar("e na zona sul?", anterior)
+    assert consulta.zonas == ["sul"]
+    assert consulta.limites == anterior.limites == [("velocidade", "<", 10.0)]
+    assert anterior.zonas == ["leste"]  # A consulta anterior não é alterada
+    assert motor.interpretar("e o que mais?", anterior) is None
+
+
+def test_filtros_do_painel(motor):
+    consulta = motor.interpretar("quantas escolas têm velocidade abaixo de 50 mbps?")
+    assert "**3 escolas**" in motor.responder_consulta(consulta)
+
+    mascara = np.array([True, True, False, False])  # Filtros aplicados no painel
+    resposta = motor.responder_consulta(consulta, mascara)
+    assert resposta.startswith("_Considerando só as 2 escolas dos filtros aplicados no painel._")
+    assert "**1 escola**" in resposta and "das 2 escolas filtradas" in resposta
@@ -0,0 +1,48 @@
+# Histórico do chat: limites de turnos e de bytes, paginação e resumo arquivado.
+from historico_chat import HistoricoChat
+
+
+def _bytes(historico):
+    return sum(len(p.encode("utf-8")) + len(r.encode("utf-8")) for p, r in historico)
+
+
+def test_limite_de_bytes():
+    historico = HistoricoChat(max_turnos=100, max_bytes=200)
+    for i in range(50):
+        historico.adicionar(f"pergunta {i} sobre conexão", "resposta com acentuação: ç, ã, é " * (i % 3 + 1))
+        assert historico.bytes == _bytes(historico)  # Contagem em UTF-8, não em caracteres
+        assert historico.bytes <= 200 or len(historico) == 1
+    assert historico.total_turnos == 50
+    assert historico.arquivados == 50 - len(historico)
+
+
+def test_turno_maior_que_o_limite_fica_sozinho():
+    historico = HistoricoChat(max_bytes=50)
+    historico.adicionar("curta", "ok")
+    historico.adicionar("longa", "x" * 500)
+    assert list(historico) == [("longa", "x" * 500)]
+    assert historico.bytes == 505
+
+
+def test_limite_de_turnos_e_paginacao():
+    historico = HistoricoChat(max_turnos=5, max_bytes=10_000)
+    for i in range(8):
+        historico.adicionar(f"p{i}", f"r{i}")
+    assert [p for p, _ in historico] == ["p3", "p4", "p5", "p6", "p7"]
+
+    turnos, ocultos = historico.pagina(1, por_pagina=2)
+    assert [p for p, _ in turnos] == ["p6", "p7"] and ocultos == 3
+    turnos, ocultos = historico.pagina(5, por_pagina=2)
+    assert len(turnos) == 5 and ocultos == 0
+
+
+def test_resumo_arquivado():
+    historico = HistoricoChat(max_turnos=1)
+    assert historico.resumo_arquivado() is None
+    historico.adicionar("a" * 200, "r")
+    historico.adicionar("segunda", "r")
+    resumo = historico.resumo_arquivado()
+    assert resumo.startswith("1 pergunta(s) anterior(es) arquivada(s)")
+    assert "a" * 80 + "..." in resumo
+
+    assert HistoricoChat(max_turnos=1, arquivar_resumo=False).resumo_arquivado() is None
@@ -0,0 +1,97 @@
+# Agrupamento dos pedidos de embedding: lotes, singleflight e prazo de espera.
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from cliente_llm import ErroLLM
+from lote_embeddings import AgrupadorEmbeddings
+
+
+class ProvedorFalso:
+    """Provedor que registra as chamadas; `liberar` segura a resposta até ser sinalizado."""
+
+    nome = "falso"
+
+    def __init__(self, atraso=0.0, liberar=None, erro=None):
+        self.atraso = atraso
+        self.liberar = liberar
+        self.erro = erro
+        self.chamadas = []
+
+    def gerar(self, textos):
+        self.chamadas.append(list(textos))
+        if self.liberar is not None:
+            self.liberar.wait(5)
+        time.sleep(self.atraso)
+        if self.erro is not None:
+            raise self.erro
+        return [np.full(4, len(texto), dtype=np.float32) for texto in textos]
+
+
+def _em_paralelo(funcao, argumentos):
+    resultados = [None] * len(argumentos)
+
+    def executar(i):
+        try:
+            resultados[i] = funcao(argumentos[i])
+        except Exception as erro:
+            resultados[i] = erro
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(len(argumentos))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return resultados
+
+
+def test_pedidos_iguais_compartilham_uma_chamada():
+    provedor = ProvedorFalso(atraso=0.05)
+    agrupador = AgrupadorEmbeddings(provedor, janela_ms=20)
+    perguntas = ["Qual a velocidade?", "qual a velocidade", "QUAL A VELOCIDADE?!"] * 4
+
+    resultados = _em_paralelo(lambda p: agrupador.gerar([p])[0], perguntas)
+
+    assert len(provedor.chamadas) == 1 and len(provedor.chamadas[0]) == 1  # Singleflight: um único texto
+    assert all(np.array_equal(r, resultados[0]) for r in resultados)
+    assert agrupador.pedidos == len(perguntas) and agrupador.chamadas == 1
+    assert not agrupador._em_andamento
+
+
+def test_pedidos_distintos_na_janela_formam_um_lote():
+    provedor = ProvedorFalso()
+    agrupador = AgrupadorEmbeddings(provedor, janela_ms=50)
+    perguntas = [f"pergunta {i}" for i in range(6)]
+
+    resultados = _em_paralelo(lambda p: agrupador.gerar([p])[0], perguntas)
+
+    assert len(provedor.chamadas) == 1 and sorted(provedor.chamadas[0]) == perguntas
+    for pergunta, vetor in zip(perguntas, resultados):
+        assert vetor[0] == len(pergunta)  # Cada sessão recebe o vetor do seu texto
+
+
+def test_prazo_esgotado_gera_erro_e_nao_prende_o_pedido():
+    liberar = threading.Event()
+    agrupador = AgrupadorEmbeddings(ProvedorFalso(liberar=liberar), janela_ms=1, tempo_maximo=0.2)
+
+    inicio = time.monotonic()
+    with pytest.raises(ErroLLM):
+        agrupador.gerar(["pergunta lenta"])
+    assert time.monotonic() - inicio < 2
+
+    liberar.set()  # O provedor responde depois do prazo: o pedido sai de _em_andamento
+    limite = time.monotonic() + 5
+    while agrupador._em_andamento and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not agrupador._em_andamento
+
+
+def test_falha_do_provedor_chega_a_todos_os_pedidos():
+    agrupador = AgrupadorEmbeddings(ProvedorFalso(erro=ErroLLM("falhou")), janela_ms=20)
+
+    resultados = _em_paralelo(lambda p: agrupador.gerar([p]), ["a", "b", "a"])
+
+    assert all(isinstance(r, ErroLLM) for r in resultados)
+    assert not agrupador._em_andamento
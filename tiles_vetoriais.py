@@ -0,0 +1,370 @@
+# Tiles vetoriais (Mapbox Vector Tiles) dos distritos e das escolas, pré-gerados de z8 a z16 e servidos
+# por um pequeno servidor HTTP local. O navegador baixa só os tiles da área visível e o estilo que
+# depende dos filtros (cores, destaques, escolas ocultas) é aplicado no próprio navegador, então os
+# tiles não dependem da sessão. Cada conjunto de tiles fica em uma pasta identificada pelo conteúdo
+# (hash dos dados de origem): as URLs nunca mudam de conteúdo e podem ser guardadas indefinidamente
+# pelo navegador e por uma CDN.
+#
+# Uso (gera os tiles a partir dos arquivos originais e do snapshot local de escolas):
+#     python tiles_vetoriais.py
+# No app, ative com MAPA_TILES_VETORIAIS=1 e TILES_URL (endereço dos tiles visto pelo navegador: a CDN,
+# o proxy ou, em desenvolvimento, http://localhost:8765). Sem TILES_URL os mapas usam as camadas GeoJSON.
+import argparse  # Interface de linha de comando do build.
+import hashlib  # Identificação dos conjuntos de tiles pelo conteúdo.
+import json  # Filtros e cores embutidos no JavaScript de estilo.
+import logging
+import os  # Variáveis de ambiente, caminhos e troca atômica de pastas.
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import mapbox_vector_tile  # Codificação dos tiles (protobuf MVT).
+import numpy as np  # Atribuição vetorizada dos pontos aos tiles.
+import pandas as pd  # Hash do conteúdo das escolas.
+import shapely  # Recorte dos polígonos por tile.
+from branca.element import MacroElement
+from folium.plugins import VectorGridProtobuf
+from folium.template import Template
+
+from agregacao_espacial import CIRCUNFERENCIA, projetar_mercator
+from camada_escolas import CORES_CATEGORIA
+from geometrias_mapa import carregar_nivel
+
+PASTA_TILES = "data/cache/tiles"  # Caminho relativo
+ZOOM_MIN_TILES = 8
+ZOOM_MAX_TILES = 16
+EXTENSAO = 4096  # Resolução interna de cada tile (padrão MVT)
+MARGEM = 64  # Margem (em unidades do tile) incluída além da borda, para não cortar círculos e contornos
+
+PORTA_TILES = int(os.getenv("TILES_PORTA", "8765"))
+HOST_TILES = os.getenv("TILES_HOST", "127.0.0.1")  # Só a própria máquina (o proxy/CDN na frente expõe os tiles)
+URL_TILES = os.getenv("TILES_URL", "").rstrip("/")  # Sem padrão: "localhost" só vale com o navegador no servidor
+TILES_VETORIAIS = os.getenv("MAPA_TILES_VETORIAIS", "0") == "1" and bool(URL_TILES)
+
+# Colunas das escolas levadas aos tiles (propriedades usadas no estilo e no popup)
+COLUNAS_FILTRO_TILES = ["DRE", "SUBPREF", "TIPOESC", "BAIRRO", "DISTRITO"]
+
+logger = logging.getLogger(__name__)
+
+if os.getenv("MAPA_TILES_VETORIAIS", "0") == "1" and not URL_TILES:
+    logger.warning("MAPA_TILES_VETORIAIS=1 sem TILES_URL: os mapas usam as camadas GeoJSON.")
+
+
+# ================== Geometria dos tiles ==================
+def limites_tile(z, x, y):
+    """(minx, miny, maxx, maxy) do tile em metros Web Mercator."""
+    lado = CIRCUNFERENCIA / 2 ** z
+    minx = -CIRCUNFERENCIA / 2 + x * lado
+    maxy = CIRCUNFERENCIA / 2 - y * lado
+    return minx, maxy - lado, minx + lado, maxy
+
+
+def _posicao_tile(x, y, z):
+    """Posição (fracionária) em unidades de tile no zoom z, a partir de metros Web Mercator."""
+    lado = CIRCUNFERENCIA / 2 ** z
+    return (np.asarray(x) + CIRCUNFERENCIA / 2) / lado, (CIRCUNFERENCIA / 2 - np.asarray(y)) / lado
+
+
+def _codificar(camada, features, limites):
+    return mapbox_vector_tile.encode(
+        [{"name": camada, "features": features}],
+        default_options={"quantize_bounds": limites, "extents": EXTENSAO},
+    )
+
+
+def _gravar(pasta, z, x, y, conteudo):
+    caminho = os.path.join(pasta, str(z), str(x))
+    os.makedirs(caminho, exist_ok=True)
+    with open(os.path.join(caminho, f"{y}.pbf"), "wb") as f:
+        f.write(conteudo)
+
+
+# ================== Geração ==================
+def chave_conteudo(*partes):
+    """Identificador curto e estável do conteúdo de origem de um conjunto de tiles."""
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(parte if isinstance(parte, bytes) else str(parte).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def chave_escolas(escolas):
+    colunas = ["NOMES", "LATITUDE", "LONGITUDE", "Velocidade_Internet", "IDEB"] + COLUNAS_FILTRO_TILES
+    return chave_conteudo(pd.util.hash_pandas_object(escolas[colunas], index=False).to_numpy().tobytes())
+
+
+def chave_distritos():
+    distritos = carregar_nivel("distritos", ZOOM_MAX_TILES)
+    return chave_conteudo(b"".join(shapely.to_wkb(distritos.geometry.values)), "|".join(distritos["NOME_DIST"]))
+
+
+def caminho_conjunto(camada, chave, pasta=PASTA_TILES):
+    return os.path.join(pasta, camada, chave)
+
+
+def tiles_prontos(camada, chave, pasta=PASTA_TILES):
+    return os.path.exists(os.path.join(caminho_conjunto(camada, chave, pasta), ".completo"))
+
+
+def _gerar_conjunto(camada, chave, gerar, pasta=PASTA_TILES):
+    """Gera os tiles em uma pasta temporária e a publica de uma vez (nunca há conjunto pela metade)."""
+    destino = caminho_conjunto(camada, chave, pasta)
+    if tiles_prontos(camada, chave, pasta):
+        return destino
+    temporaria = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    total = gerar(temporaria)
+    with open(os.path.join(temporaria, ".completo"), "w") as f:
+        f.write(str(total))
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporaria, destino)
+    logger.info("Tiles de '%s' gerados em %s (%d tiles).", camada, destino, total)
+    return destino
+
+
+def gerar_tiles_escolas(escolas, quartis, chave=None, pasta=PASTA_TILES):
+    """Um tile por área com escolas, de z8 a z16; cada ponto leva nome, IDEB, velocidade, categoria
+       e as colunas de filtro. Devolve a chave do conjunto."""
+    chave = chave or chave_escolas(escolas)
+    escolas = escolas.dropna(subset=["LATITUDE", "LONGITUDE"])
+    x, y = projetar_mercator(escolas["LATITUDE"], escolas["LONGITUDE"])
+    velocidades = escolas["Velocidade_Internet"].to_numpy(dtype=float)
+    categorias = np.array(list(CORES_CATEGORIA))[np.searchsorted(np.asarray(quartis, dtype=float), velocidades)]
+    propriedades = [
+        {"n": nome, "i": None if pd.isna(ideb) else round(float(ideb), 2), "v": round(float(vel), 2), "c": cat,
+         **{col: str(valor) for col, valor in zip(COLUNAS_FILTRO_TILES, filtros)}}
+        for nome, ideb, vel, cat, *filtros in zip(
+            escolas["NOMES"].astype(str), escolas["IDEB"], velocidades, categorias,
+            *(escolas[col] for col in COLUNAS_FILTRO_TILES),
+        )
+    ]
+    margem = MARGEM / EXTENSAO
+
+    def gerar(destino):
+        total = 0
+        for z in range(ZOOM_MIN_TILES, ZOOM_MAX_TILES + 1):
+            fx, fy = _posicao_tile(x, y, z)
+            tx, ty = np.floor(fx).astype(np.int64), np.floor(fy).astype(np.int64)
+            # Cada ponto entra no seu tile e nos vizinhos cuja margem o alcança
+            pares = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    vx, vy = tx + dx, ty + dy
+                    dentro = (fx >= vx - margem) & (fx < vx + 1 + margem) & (fy >= vy - margem) & (fy < vy + 1 + margem)
+                    pares.append(np.stack([vx[dentro], vy[dentro], np.flatnonzero(dentro)], axis=1))
+            pares = np.concatenate(pares)
+            if not len(pares):
+                continue
+            pares = pares[np.lexsort((pares[:, 2], pares[:, 1], pares[:, 0]))]
+            quebras = np.flatnonzero(np.any(np.diff(pares[:, :2], axis=0) != 0, axis=1)) + 1
+            for grupo in np.split(pares, quebras):
+                tile_x, tile_y = int(grupo[0, 0]), int(grupo[0, 1])
+                features = [
+                    {"geometry": shapely.Point(x[i], y[i]), "properties": propriedades[i]} for i in grupo[:, 2]
+                ]
+                _gravar(destino, z, tile_x, tile_y, _codificar("escolas", features, limites_tile(z, tile_x, tile_y)))
+                total += 1
+        return total
+
+    _gerar_conjunto("escolas", chave, gerar, pasta)
+    return chave
+
+
+def gerar_tiles_distritos(chave=None, pasta=PASTA_TILES):
+    """Tiles dos polígonos de distritos de z8 a z16, recortados por tile a partir do nível de
+       detalhe (geometrias_mapa) adequado a cada zoom. Devolve a chave do conjunto."""
+    chave = chave or chave_distritos()
+
+    def gerar(destino):
+        total = 0
+        for z in range(ZOOM_MIN_TILES, ZOOM_MAX_TILES + 1):
+            distritos = carregar_nivel("distritos", z).to_crs(epsg=3857)
+            geometrias = distritos.geometry.values
+            nomes = distritos["NOME_DIST"].astype(str).tolist()
+            minx, miny, maxx, maxy = distritos.total_bounds
+            (x0, x1), (y1, y0) = (np.floor(v).astype(int) for v in _posicao_tile([minx, maxx], [miny, maxy], z))
+            for tile_x in range(x0, x1 + 1):
+                for tile_y in range(y0, y1 + 1):
+                    limites = limites_tile(z, tile_x, tile_y)
+                    folga = (limites[2] - limites[0]) * MARGEM / EXTENSAO
+                    recorte = (limites[0] - folga, limites[1] - folga, limites[2] + folga, limites[3] + folga)
+                    indices = distritos.sindex.query(shapely.box(*recorte))
+                    features = []
+                    for i in indices:
+                        parte = shapely.clip_by_rect(geometrias[i], *recorte)
+                        if not parte.is_empty:
+                            features.append({"geometry": parte, "properties": {"NOME_DIST": nomes[i]}})
+                    if features:
+                        _gravar(destino, z, tile_x, tile_y, _codificar("distritos", features, limites))
+                        total += 1
+        return total
+
+    _gerar_conjunto("distritos", chave, gerar, pasta)
+    return chave
+
+
+def url_tiles(camada, chave, base=URL_TILES):
+    return f"{base}/{camada}/{chave}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+# ================== Servidor ==================
+class _ManipuladorTiles(SimpleHTTPRequestHandler):
+    """Arquivos .pbf com cabeçalhos de cache longo (as URLs são imutáveis) e CORS liberado."""
+
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, ".pbf": "application/x-protobuf"}
+
+    def end_headers(self):
+        if self.path.endswith(".pbf"):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def list_directory(self, path):
+        self.send_error(404)
+
+    def log_message(self, formato, *args):
+        logger.debug("tiles: " + formato, *args)
+
+
+def iniciar_servidor(pasta=PASTA_TILES, porta=PORTA_TILES, em_segundo_plano=True, host=HOST_TILES):
+    """Sobe o servidor de tiles (por padrão em uma thread de fundo) e devolve o objeto do servidor.
+       Escuta só em `host` (padrão 127.0.0.1, TILES_HOST para expor em outra interface)."""
+    os.makedirs(pasta, exist_ok=True)
+    servidor = ThreadingHTTPServer((host, porta), partial(_ManipuladorTiles, directory=pasta))
+    logger.info("Servidor de tiles em http://%s:%d (%s).", host, porta, pasta)
+    if not em_segundo_plano:
+        servidor.serve_forever()
+    threading.Thread(target=servidor.serve_forever, name="servidor-tiles", daemon=True).start()
+    return servidor
+
+
+# ================== Camadas (folium) ==================
+def _js(valor):
+    """Literal JavaScript (JSON) seguro para embutir em um <script>."""
+    return json.dumps(valor, ensure_ascii=False).replace("</", "<\\/")
+
+
+class PopupTilesVetoriais(MacroElement):
+    """Abre um popup ao clicar em uma feição da camada VectorGrid, com o conteúdo de `funcao_js`
+       (função JavaScript que recebe as propriedades e devolve um elemento DOM)."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this.camada.get_name() }}.on("click", function(e) {
+            L.popup({maxWidth: 300})
+                .setLatLng(e.latlng)
+                .setContent(({{ this.funcao_js }})(e.layer.properties))
+                .openOn({{ this._parent.get_name() }});
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, camada, funcao_js):
+        super().__init__()
+        self._name = "PopupTilesVetoriais"
+        self.camada = camada
+        self.funcao_js = funcao_js
+
+
+_POPUP_ESCOLA_JS = """
+function(p) {
+    var div = document.createElement("div");
+    var nome = document.createElement("b");
+    nome.textContent = p.n;
+    div.appendChild(nome);
+    div.appendChild(document.createElement("br"));
+    div.appendChild(document.createTextNode("IDEB: " + (p.i === undefined || p.i === null ? "-" : p.i.toFixed(2))));
+    div.appendChild(document.createElement("br"));
+    div.appendChild(document.createTextNode("Velocidade: " + p.v.toFixed(2) + " Mbps"));
+    return div;
+}
+"""
+
+
+def camada_tiles_escolas(url, filtros, colunas_filtro):
+    """Camada VectorGrid das escolas; os filtros aplicados viram um teste no estilo de cada ponto
+       (escolas fora do filtro não são desenhadas), com raio e cores do modo GeoJSON."""
+    filtros_js = _js({
+        "velocidade": [float(v) for v in filtros["speed_range"]],
+        "categorias": list(filtros["selected_categories"]),
+        "colunas": {col: [str(v) for v in filtros[col]] for col in colunas_filtro if col != "NOMES" and filtros[col]},
+        "nomes": [str(v) for v in filtros.get("NOMES") or []],
+    })
+    opcoes = f"""{{
+        interactive: true,
+        maxNativeZoom: {ZOOM_MAX_TILES},
+        vectorTileLayerStyles: {{
+            escolas: (function() {{
+                var f = {filtros_js};
+                var cores = {_js(CORES_CATEGORIA)};
+                return function(p) {{
+                if (p.v < f.velocidade[0] || p.v > f.velocidade[1]) {{ return []; }}
+                if (f.categorias.length && f.categorias.indexOf(p.c) < 0) {{ return []; }}
+                if (f.nomes.length && f.nomes.indexOf(p.n) < 0) {{ return []; }}
+                for (var col in f.colunas) {{
+                    if (f.colunas[col].indexOf(p[col]) < 0) {{ return []; }}
+                }}
+                return {{radius: (p.v / 10) * 1.01, stroke: false, fill: true,
+                         fillColor: cores[p.c], fillOpacity: 0.5}};
+                }};
+            }})()
+        }}
+    }}"""
+    return VectorGridProtobuf(url, "Escolas", opcoes)
+
+
+def camada_tiles_distritos(url, cores, destacados):
+    """Camada VectorGrid dos distritos, com cor por distrito e destaque dos distritos filtrados."""
+    opcoes = f"""{{
+        interactive: true,
+        maxNativeZoom: {ZOOM_MAX_TILES},
+        vectorTileLayerStyles: {{
+            distritos: (function() {{
+                var cores = {_js(cores)};
+                var destacados = {_js(list(destacados))};
+                return function(p) {{
+                var destaque = destacados.indexOf(p.NOME_DIST) >= 0;
+                return {{fill: true, fillColor: cores[p.NOME_DIST] || "#cccccc", color: "black",
+                         weight: destaque ? 2 : 0.5, fillOpacity: destaque ? 0.9 : 0.5}};
+                }};
+            }})()
+        }}
+    }}"""
+    return VectorGridProtobuf(url, "Distritos", opcoes)
+
+
+def popup_tiles_escolas(camada):
+    return PopupTilesVetoriais(camada, _POPUP_ESCOLA_JS)
+
+
+def popup_tiles_distritos(camada, velocidades):
+    """Popup com o nome e a velocidade média do distrito (`velocidades`: {NOME_DIST: Mbps})."""
+    velocidades_js = _js({k: round(float(v), 2) for k, v in velocidades.items()})
+    return PopupTilesVetoriais(camada, f"""
+function(p) {{
+    var velocidades = {velocidades_js};
+    var div = document.createElement("div");
+    div.textContent = "Distrito: " + p.NOME_DIST + " | Velocidade Média (Mbps): " +
+        (p.NOME_DIST in velocidades ? velocidades[p.NOME_DIST] : "-");
+    return div;
+}}
+""")
+
+
+# ================== Linha de Comando ==================
+if __name__ == "__main__":
+    from snapshot_escolas import AtualizadorEscolas
+
+    parser = argparse.ArgumentParser(description="Gera os tiles vetoriais (MVT, z8–z16) de distritos e escolas.")
+    parser.add_argument("--pasta", default=PASTA_TILES, help="Pasta de saída")
+    parser.add_argument("--servir", action="store_true", help="Depois de gerar, serve a pasta na TILES_PORTA")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print("distritos:", gerar_tiles_distritos(pasta=args.pasta))
+    escolas = AtualizadorEscolas().escolas
+    quartis = np.percentile(escolas["Velocidade_Internet"], [25, 50, 75])
+    print("escolas:", gerar_tiles_escolas(escolas, quartis, pasta=args.pasta))
+    if args.servir:
+        iniciar_servidor(args.pasta, em_segundo_plano=False)